@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#   Region Fixer.
+#   Fix your region files with a backup copy of your Minecraft world.
+#   Copyright (C) 2020  Alejandro Aguilera (Fenixin)
+#   https://github.com/Fenixin/Minecraft-Region-Fixer
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+""" Measures the start up time of region fixer.
+
+Usage:
+    python benchmarks/startup.py [--runs N] [--save FILE] [--compare FILE] [world ...]
+
+Three things are measured, every one of them in a new python process:
+ - help: running 'regionfixer.py --help', the fixed cost of every run.
+ - import: importing the modules imported by regionfixer.py.
+ - world: creating the World objects of the given worlds, the part of the
+   cost of a run that grows with the size of the world.
+
+The minimum and the median of the runs are shown. The results can be saved
+to a JSON file and compared with a previous run to track the start up time
+between changes.
+
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from time import perf_counter
+from statistics import median
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_CODE = "import regionfixer"
+
+WORLD_CODE = """
+import sys
+from regionfixer_core import world
+for path in sys.argv[1:]:
+    world.World(path)
+"""
+
+
+def time_command(args, runs):
+    """ Runs a command in a new process several times.
+
+    Inputs:
+     - args -- List with the arguments of the command
+     - runs -- Integer, number of times to run it
+
+    Return:
+     - times -- List of floats, the wall time of every run in seconds
+
+    """
+
+    times = []
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    for i in range(runs):
+        start = perf_counter()
+        subprocess.run(args, cwd=ROOT, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the start up time of region fixer.')
+    parser.add_argument('--runs', type=int, default=10,
+                        help='Number of times every measure is repeated (default = 10)')
+    parser.add_argument('--save', default=None,
+                        help='Save the results in this JSON file')
+    parser.add_argument('--compare', default=None,
+                        help='Compare with the results saved in this JSON file')
+    parser.add_argument('worlds', nargs='*',
+                        help='Worlds used to measure the creation of World objects')
+    args = parser.parse_args()
+
+    # Warm up, the first run compiles the .pyc files
+    time_command([sys.executable, "-c", IMPORT_CODE], 1)
+
+    measures = [('help', [sys.executable, "regionfixer.py", "--help"]),
+                ('import', [sys.executable, "-c", IMPORT_CODE])]
+    if args.worlds:
+        worlds = [os.path.abspath(w) for w in args.worlds]
+        measures.append(('world', [sys.executable, "-c", WORLD_CODE] + worlds))
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    results = {}
+    print("{0:<8} {1:>10} {2:>10} {3:>10}".format("Measure", "Min (ms)", "Median", "Change"))
+    for name, command in measures:
+        times = time_command(command, args.runs)
+        results[name] = {'min': min(times), 'median': median(times)}
+        change = ""
+        if name in previous:
+            old = previous[name]['median']
+            change = "{0:+.1f}%".format((median(times) - old) / old * 100)
+        print("{0:<8} {1:>10.1f} {2:>10.1f} {3:>10}".format(
+            name, min(times) * 1000, median(times) * 1000, change))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1)
+        print("Results saved in '{0}'.".format(args.save))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,8 +7,7 @@ from os.path import split, abspath
 from os import name as os_name
 
 from .backups import BackupsWindow
-from regionfixer_core.scan import AsyncWorldRegionScanner, AsyncDataScanner,\
-    ChildProcessException
+from regionfixer_core.scan import AsyncWorldScanner, ChildProcessException
 from regionfixer_core import world
 from regionfixer_core.world import World
 
@@ -84,7 +83,7 @@ class MainWindow(wx.Frame):
         self.proc_info_text = wx.StaticText(panel, label="Processes to use: ")
         self.proc_text = wx.TextCtrl(panel, value="1", size=(30, 24), style=wx.TE_CENTER)
         self.el_info_text = wx.StaticText(panel, label="Entity limit: " )
-        self.el_text = wx.TextCtrl(panel, value="150", size=(50, 24), style=wx.TE_CENTER)
+        self.el_text = wx.TextCtrl(panel, value="150", size=(50, 24), style=wx.TE_CENTER | wx.TE_PROCESS_ENTER)
         self.secondrow_sizer = wx.BoxSizer(wx.HORIZONTAL)
         self.secondrow_sizer.Add(self.proc_info_text, flag=wx.ALIGN_CENTER)
         self.secondrow_sizer.Add(self.proc_text, 0, flag=wx.RIGHT | wx.ALIGN_LEFT, border=15)
@@ -143,6 +142,7 @@ class MainWindow(wx.Frame):
         self.Bind(wx.EVT_MENU, self.OnBackups, menuBackups)
         self.Bind(wx.EVT_MENU, self.OnExit, menuExit)
         self.Bind(wx.EVT_BUTTON, self.OnScan, self.scan_button)
+        self.Bind(wx.EVT_TEXT_ENTER, self.OnEntityLimit, self.el_text)
         self.Bind(wx.EVT_BUTTON, self.OnOpen, self.open_button)
         self.Bind(wx.EVT_BUTTON, self.OnDeleteChunks, self.delete_all_chunks_button)
         self.Bind(wx.EVT_BUTTON, self.OnReplaceChunks, self.replace_all_chunks_button)
@@ -195,47 +195,38 @@ class MainWindow(wx.Frame):
         entity_limit = int(self.el_text.GetValue())
         delete_entities = False
 
-        ps = AsyncDataScanner(self.world.players, processes)
-        ops = AsyncDataScanner(self.world.old_players, processes)
-        ds = AsyncDataScanner(self.world.data_files, processes)
-        ws = AsyncWorldRegionScanner(self.world, processes, entity_limit,
-                       delete_entities)
-
-        things_to_scan = [ws, ops, ps, ds]
-        dialog_texts = ["Scanning region files",
-                        "Scanning old format player files",
-                        "Scanning players",
-                        "Scanning data files"]
+        # Player files, data files and all the region sets are scanned at once
+        # in the same pool, like console_scan_world() does
+        scanner = AsyncWorldScanner(self.world, processes, entity_limit,
+                                    delete_entities)
+        progressdlg = wx.ProgressDialog(
+                    "Scanning the world",
+                    "Last scanned:\n starting...",
+                    len(scanner), self,
+                    style=wx.PD_ELAPSED_TIME | wx.PD_ESTIMATED_TIME |
+                          wx.PD_REMAINING_TIME | wx.PD_CAN_ABORT |
+                          wx.PD_AUTO_HIDE | wx.PD_SMOOTH)
         try:
-            for scanner, dialog_title in zip(things_to_scan, dialog_texts):
-                progressdlg = wx.ProgressDialog(
-                            dialog_title,
-                            "Last scanned:\n starting...",
-                            len(scanner), self,
-                            style=wx.PD_ELAPSED_TIME | wx.PD_ESTIMATED_TIME |
-                                  wx.PD_REMAINING_TIME | wx.PD_CAN_ABORT |
-                                  wx.PD_AUTO_HIDE | wx.PD_SMOOTH)
-                scanner.scan()
-                counter = 0
-                # NOTE TO SELF: ShowModal behaves different in windows and Linux!
-                # Use it with care.
-                progressdlg.Show()
-                while not scanner.finished:
-                    sleep(0.001)
-                    result = scanner.get_last_result()
-
-                    if result:
-                        counter += 1
-                    not_cancelled, not_skipped = progressdlg.Update(counter,
-                                       "Last scanned:\n" + scanner.str_last_scanned)
-                    if not not_cancelled:
-                        # User pressed cancel
-                        scanner.terminate()
-                        break
-                progressdlg.Destroy()
+            scanner.scan()
+            counter = 0
+            not_cancelled = True
+            # NOTE TO SELF: ShowModal behaves different in windows and Linux!
+            # Use it with care.
+            progressdlg.Show()
+            while not scanner.finished:
+                sleep(0.001)
+                result = scanner.get_last_result()
+
+                if result:
+                    counter += 1
+                not_cancelled, not_skipped = progressdlg.Update(counter,
+                                   "Last scanned:\n" + scanner.str_last_scanned)
                 if not not_cancelled:
+                    # User pressed cancel
+                    scanner.terminate()
                     break
-            else:
+            progressdlg.Destroy()
+            if not_cancelled:
                 # The scan finished successfully
                 self.world.scanned = True
                 self.results_text.SetValue(self.world.generate_report(True))
@@ -262,6 +253,20 @@ class MainWindow(wx.Frame):
             # error.ShowModal()
             #===================================================================
 
+    def OnEntityLimit(self, e):
+        """ Called when enter is pressed in the entity limit. Updates the
+        results of the last scan without scanning again. """
+        if not self.world or not self.world.scanned:
+            return
+        try:
+            entity_limit = int(self.el_text.GetValue())
+        except ValueError:
+            return
+        if entity_limit < 0:
+            return
+        self.world.set_entity_limit(entity_limit)
+        self.results_text.SetValue(self.world.generate_report(True))
+
     def OnDeleteChunks(self, e):
         progressdlg = wx.ProgressDialog("Removing chunks", "This may take a while", 
             self.world.count_regions(), self,
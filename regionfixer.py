@@ -26,13 +26,11 @@ from getpass import getpass
 from multiprocessing import freeze_support
 import sys
 
-
-from regionfixer_core.bug_reporter import BugReporter
+# NOTE: Only the modules needed by every run are imported here. The rest
+# (scan, bug reporter, cache, journal, results files, remote workers,
+# interactive mode) are imported when they are used, region fixer is often
+# run once per world from scripts and the start up time adds up.
 import regionfixer_core.constants as c
-from regionfixer_core.interactive import InteractiveLoop
-from regionfixer_core.scan import (console_scan_world,
-                                   console_scan_regionset,
-                                   ChildProcessException)
 from regionfixer_core.util import entitle, is_bare_console
 from regionfixer_core.version import version_string
 from regionfixer_core import world
@@ -75,6 +73,35 @@ def fix_bad_chunks(options, scanned_obj):
                 print(("No chunks to fix with status: {0}".format(status)))
 
 
+def trim_bad_chunks(options, scanned_obj):
+    """ Empties the lists that make chunks too heavy, see TRIMMABLE_CHUNK_PROBLEMS.
+
+    Inputs:
+    options -- argparse arguments, the whole argparse.ArgumentParser() object
+    scanned_obj -- this can be a RegionSet or World objects from world.py
+
+    Returns nothing.
+    """
+
+    print("")
+    # In the same order as in TRIMMABLE_CHUNK_PROBLEMS
+    options_trim = [options.trim_block_entities,
+                    options.trim_ticks]
+    trimming = list(zip(options_trim, c.TRIMMABLE_CHUNK_PROBLEMS))
+    for trim, problem in trimming:
+        status = c.CHUNK_STATUS_TEXT[problem]
+        total = scanned_obj.count_chunks(problem)
+        if trim:
+            if total:
+                text = ' Trimming chunks with status: {0} '.format(status)
+                print(("\n{0:#^60}".format(text)))
+                counter = scanned_obj.trim_problematic_chunks(problem)
+                print(("\nRemoved {0} items from {1} chunks with status: {2}".format(
+                    counter, total, status)))
+            else:
+                print(("No chunks to trim with status: {0}".format(status)))
+
+
 def delete_bad_chunks(options, scanned_obj):
     """ Takes a scanned object and deletes all the bad chunks.
 
@@ -142,6 +169,152 @@ def delete_bad_regions(options, scanned_obj):
                 print(("No regions to delete with status: {0}".format(status)))
 
 
+def parse_shard(text):
+    """ Parses the argument of --shard, 'i/N' with i from 1 to N.
+
+    Returns a tuple (index, count) with the index starting at 0.
+    """
+
+    try:
+        i, n = [int(t) for t in text.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("'{0}' is not a shard like 1/4".format(text))
+    if not 1 <= i <= n:
+        raise argparse.ArgumentTypeError("The shard in '{0}' must be between 1 and {1}".format(text, n))
+    return i - 1, n
+
+
+def parse_address_arg(text):
+    """ Parses the argument of --listen, 'host:port'. """
+
+    from regionfixer_core.remote import parse_address
+
+    try:
+        return parse_address(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_address_list(text):
+    """ Parses the argument of --remote-workers, 'host:port,host:port,...'. """
+
+    return [parse_address_arg(t.strip()) for t in text.split(',') if t.strip()]
+
+
+def print_census(census):
+    """ Prints the report of an EntityCensus, see census.py. """
+
+    from regionfixer_core.census import generate_census_report, EntityCensus
+    print(generate_census_report(census if census is not None else EntityCensus()))
+
+
+def print_chunk_sizes(regionsets, verbose=False):
+    """ Prints the statistics of the chunk sizes of some region sets, see sizes.py.
+
+    Inputs:
+    regionsets -- List of RegionSet objects
+    verbose -- Boolean, if True a table with the sizes of every region file is
+               printed too
+
+    """
+
+    from regionfixer_core.sizes import generate_size_report, generate_region_size_table
+    for rs in regionsets:
+        stats = rs.get_size_stats()
+        if not stats.chunks:
+            continue
+        print("\n{0:-^60}".format(' Chunk sizes of {0} '.format(rs.get_name() or "separate region files")))
+        print(generate_size_report(stats))
+        if verbose:
+            print(generate_region_size_table(rs._get_list()))
+
+
+def print_sector_usage(regionsets, verbose=False):
+    """ Prints the sectors used and wasted in the region files of some region
+    sets, and in all of them, see SectorUsage in sizes.py.
+
+    Inputs:
+    regionsets -- List of RegionSet objects
+    verbose -- Boolean, if True a table with the usage of every region file is
+               printed too
+
+    """
+
+    from regionfixer_core.sizes import (SectorUsage, generate_usage_report,
+                                        generate_region_usage_table)
+    total = SectorUsage()
+    shown = 0
+    for rs in regionsets:
+        usage = rs.get_sector_usage()
+        if not usage.regions:
+            continue
+        print("\n{0:-^60}".format(' Region file usage of {0} '.format(rs.get_name() or "separate region files")))
+        print(generate_usage_report(usage))
+        if verbose:
+            print(generate_region_usage_table(rs._get_list()))
+        total.merge(usage)
+        shown += 1
+    if shown > 1:
+        print("\n{0:-^60}".format(' Region file usage of all the region sets '))
+        print(generate_usage_report(total))
+
+
+def print_merged_results(options, world_list, regionset):
+    """ Prints the reports of the results files merged with --merge.
+
+    Inputs:
+    options -- argparse arguments, the whole argparse.ArgumentParser() object
+    world_list -- List of World objects from results.load_results()
+    regionset -- RegionSet object from results.load_results()
+
+    Returns the return value of region fixer.
+    """
+
+    summary_text = ""
+    found_problems = False
+    if len(regionset) > 0:
+        print((entitle("Scan results for: separate region files", 0)))
+        print((regionset.generate_report(True)))
+        census = regionset.get_entity_census()
+        if census is not None:
+            print_census(census)
+        if options.chunk_sizes:
+            print_chunk_sizes([regionset], options.verbose)
+        if options.waste:
+            print_sector_usage([regionset], options.verbose)
+        if options.summary:
+            summary_text += "\n" + entitle("Separate region files") + "\n"
+            summary_text += regionset.summary() or "No problems found.\n\n"
+        found_problems = found_problems or regionset.has_problems
+
+    for w in world_list:
+        print((entitle('Scan results for: {0}'.format(w.get_name()), 0)))
+        print((w.generate_report(True)))
+        if any(r.sample is not None for rs in w.regionsets for r in rs._get_list()):
+            print(w.generate_sample_report())
+        census = w.get_entity_census()
+        if census is not None:
+            print_census(census)
+        if options.chunk_sizes:
+            print_chunk_sizes(w.regionsets, options.verbose)
+        if options.waste:
+            print_sector_usage(w.regionsets, options.verbose)
+        if options.summary:
+            summary_text += w.summary()
+        found_problems = found_problems or w.has_problems
+
+    if options.summary == '-':
+        print("\nPrinting log:\n")
+        print(summary_text)
+    elif options.summary is not None:
+        with open(options.summary, 'w') as f:
+            f.write(summary_text)
+            f.write('\n')
+        print(("Log file saved in \'{0}\'.".format(options.summary)))
+
+    return c.RV_BAD_WORLD if found_problems else c.RV_OK
+
+
 def main():
     usage = ('%(prog)s [options] <world-path> '
              '<other-world-path> ... <region-files> ...')
@@ -201,6 +374,14 @@ def main():
                                 'using backup directories.'.format(c.CHUNK_STATUS_TEXT[solvable_status]),
                                 action='store_true',
                                 default=False)
+        if c.CHUNK_SOLUTION_TRIM in c.CHUNK_PROBLEMS_SOLUTIONS[solvable_status]:
+            parser.add_argument('--trim-' + c.CHUNK_PROBLEMS_ARGS[solvable_status],
+                                '--t' + c.CHUNK_PROBLEMS_ABBR[solvable_status],
+                                help='[WARNING!] This option deletes! Empty the lists that '
+                                'make the chunks with status "{0}" too heavy, the rest of '
+                                'the chunk is kept.'.format(c.CHUNK_STATUS_TEXT[solvable_status]),
+                                action='store_true',
+                                default=False)
         if c.CHUNK_SOLUTION_RELOCATE_USING_DATA in c.CHUNK_PROBLEMS_SOLUTIONS[solvable_status]:
             parser.add_argument('--relocate-' + c.CHUNK_PROBLEMS_ARGS[solvable_status],
                                 '--rl' + c.CHUNK_PROBLEMS_ABBR[solvable_status],
@@ -274,6 +455,28 @@ def main():
                         action='store',
                         type=int)
 
+    parser.add_argument('--block-entity-limit',
+                        '--bel',
+                        help='Chunks with more block entities (chests, furnaces, '
+                             'hoppers...) than this get the status "{0}". They are '
+                             'not checked by default. Only with a full scan.'.format(
+                                 c.CHUNK_STATUS_TEXT[c.CHUNK_TOO_MANY_BLOCK_ENTITIES]),
+                        dest='block_entity_limit',
+                        default=None,
+                        action='store',
+                        type=int)
+
+    parser.add_argument('--tick-limit',
+                        '--tl',
+                        help='Chunks with more scheduled block and fluid ticks than '
+                             'this get the status "{0}". They are not checked by '
+                             'default. Only with a full scan.'.format(
+                                 c.CHUNK_STATUS_TEXT[c.CHUNK_TOO_MANY_TICKS]),
+                        dest='tick_limit',
+                        default=None,
+                        action='store',
+                        type=int)
+
     parser.add_argument('--processes',
                         '-p',
                         help='Set the number of workers to use for scanning. (default '
@@ -282,6 +485,167 @@ def main():
                         type=int,
                         default=1)
 
+    parser.add_argument('--executor',
+                        help='How the files are scanned at the same time. \'process\' '
+                             'uses child processes, \'thread\' uses threads, which '
+                             'start faster and are good enough for small worlds, '
+                             '\'inline\' scans the files one by one without '
+                             'concurrency. (default = process)',
+                        choices=c.EXECUTORS,
+                        default=None,
+                        dest='executor')
+
+    depth_args = [c.SCAN_DEPTH_ARGS[d] for d in c.SCAN_DEPTHS]
+    parser.add_argument('--scan-depth',
+                        help='How deep the chunks are scanned. \'header\' only reads '
+                             'the region and chunk headers, \'decompress\' also '
+                             'decompresses the chunks to check their data is not '
+                             'broken, \'full\' also parses the chunks and finds '
+                             'all the problems. (default = full)',
+                        choices=depth_args,
+                        default=c.SCAN_DEPTH_ARGS[c.SCAN_DEPTH_FULL],
+                        dest='scan_depth')
+
+    parser.add_argument('--quick',
+                        help='Quick scan, the same as --scan-depth header. Only read '
+                             'the region and chunk headers, no chunk is decompressed. '
+                             'Finds the chunks that the headers prove corrupted or '
+                             'sharing offset, but not the rest of the problems. '
+                             'Useful to check a lot of worlds fast.',
+                        action='store_const',
+                        const=c.SCAN_DEPTH_ARGS[c.SCAN_DEPTH_HEADER],
+                        dest='scan_depth')
+
+    parser.add_argument('--sample',
+                        help='Scan only this fraction (between 0 and 1) of the chunks '
+                             'of every region file, chosen at random. The chunks with '
+                             'a suspicious header are always scanned. At the end an '
+                             'estimate of the chunks with problems is shown. Useful '
+                             'to know which worlds need a full scan.',
+                        type=float,
+                        default=None,
+                        dest='sample')
+
+    parser.add_argument('--census',
+                        help='Count the entities of every chunk by type while '
+                             'scanning, and show the number of entities of every '
+                             'type and the chunks with most entities. Useful to '
+                             'find what is making a server lag. Only with a full scan.',
+                        action='store_true',
+                        default=False,
+                        dest='census')
+
+    parser.add_argument('--chunk-sizes',
+                        help='Show the sizes of the chunks of every dimension: a '
+                             'histogram of their compressed and uncompressed sizes '
+                             'and the biggest chunks. With --verbose also the sizes '
+                             'of every region file. The chunks that need {0} sectors '
+                             'or more of the {1} allowed by the region format are '
+                             'listed too.'.format(
+                                 c.CHUNK_SECTOR_WARNING, c.CHUNK_SECTOR_LIMIT),
+                        action='store_true',
+                        default=False,
+                        dest='chunk_sizes')
+
+    parser.add_argument('--waste',
+                        help='Show how the sectors of the region files of every '
+                             'dimension are used: the chunk data, the padding, '
+                             'the free sectors between chunks and at the end of '
+                             'the files, and how much disk would be saved '
+                             'compacting them. With --verbose also the usage of '
+                             'every region file. It only needs the region headers, '
+                             'it works with any scan depth.',
+                        action='store_true',
+                        default=False,
+                        dest='waste')
+
+    parser.add_argument('--shard',
+                        help='Scan only a part of the region files, given as i/N '
+                             '(from 1/N to N/N). Every region file is in only one '
+                             'of the N shards, so N machines can scan a world at '
+                             'the same time. Use it with --results and merge the '
+                             'results files with --merge.',
+                        type=parse_shard,
+                        default=None,
+                        dest='shard')
+
+    parser.add_argument('--results',
+                        help='Save the results of the scan in this file. The results '
+                             'of several shards can be merged with --merge.',
+                        type=str,
+                        default=None,
+                        dest='results')
+
+    parser.add_argument('--merge',
+                        help='Don\'t scan anything, the paths are results files '
+                             'saved with --results. Merge them and show the '
+                             'results as if they were one scan.',
+                        action='store_true',
+                        default=False)
+
+    parser.add_argument('--worker',
+                        help='Don\'t scan anything, wait for the files to scan sent '
+                             'by other region fixer using --remote-workers. Needs '
+                             '--listen and --secret-file. Only the files inside the '
+                             'paths given are scanned, the worker never modifies '
+                             'them. The option --processes sets how many files '
+                             'are scanned at the same time.',
+                        action='store_true',
+                        default=False)
+
+    parser.add_argument('--listen',
+                        help='Address to wait for tasks in worker mode, as host:port. '
+                             'Without host (:port) only this machine can connect. '
+                             'Use the address of a network interface to accept '
+                             'connections from other machines, only in trusted '
+                             'networks: the messages are not encrypted.',
+                        type=parse_address_arg,
+                        default=None,
+                        dest='listen')
+
+    parser.add_argument('--secret-file',
+                        help='File with the secret shared by the workers and the '
+                             'region fixer using them, any text. Needed by --worker '
+                             'and --remote-workers. The secret is never sent, both '
+                             'sides prove they know it.',
+                        type=str,
+                        default=None,
+                        dest='secret_file')
+
+    parser.add_argument('--remote-workers',
+                        help='Scan the files in these workers (started with --worker) '
+                             'instead of in this machine. A comma separated list of '
+                             'host:port. The workers need to see the worlds in the '
+                             'same paths as this machine, for example in a shared '
+                             'folder. If a worker is lost its files are scanned by '
+                             'the rest.',
+                        type=parse_address_list,
+                        default=None,
+                        dest='remote_workers')
+
+    parser.add_argument('--cache',
+                        help='Store the results of the scan in this file and use '
+                             'them in the next scans. Only the region files that '
+                             'changed since the last scan are scanned again.',
+                        type=str,
+                        default=None,
+                        dest='cache')
+
+    parser.add_argument('--journal',
+                        help='Write the results of the scan to this file as they '
+                             'arrive. If the scan is interrupted it can be resumed '
+                             'with --resume. The file is deleted when the scan '
+                             'finishes.',
+                        type=str,
+                        default=None,
+                        dest='journal')
+
+    parser.add_argument('--resume',
+                        help='Resume an interrupted scan using the file given in '
+                             '--journal. Only the files not found in it are scanned.',
+                        action='store_true',
+                        default=False)
+
     status_abbr = ""
     for status in c.CHUNK_PROBLEMS: 
         status_abbr += "{0}: {1}; ".format(c.CHUNK_PROBLEMS_ABBR[status], c.CHUNK_STATUS_TEXT[status])
@@ -358,13 +722,53 @@ def main():
         except:
             print("Something went wrong while reading the text file input!")
 
-    # Parse all the paths, from text file and command input
-    world_list, regionset = world.parse_paths(args.paths + path_lines)
-
     # print greetings an version number
     print("\nWelcome to Region Fixer!")
     print(("(v {0})".format(version_string)))
 
+    secret = None
+    if args.worker or args.remote_workers:
+        if not args.secret_file:
+            parser.error("Error: The options --worker and --remote-workers need "
+                         "the --secret-file option")
+        from regionfixer_core.remote import load_secret
+        try:
+            secret = load_secret(args.secret_file)
+        except (OSError, ValueError) as e:
+            parser.error("Error: Can't read the secret: {0}".format(e))
+
+    if args.worker:
+        if not args.listen:
+            parser.error("Error: The option --worker needs the --listen option")
+        if args.processes < 1:
+            parser.error("Error: The worker needs at least one process!")
+        roots = args.paths + path_lines
+        if not roots:
+            parser.error("Error: The option --worker needs the paths of the worlds "
+                         "it can scan")
+        from regionfixer_core.remote import serve_worker
+        serve_worker(args.listen, args.processes, secret, roots)
+        return c.RV_OK
+
+    if args.merge:
+        if args.shard or args.results:
+            parser.error("Error: The option --merge can't be used with --shard or --results")
+        from regionfixer_core.results import load_results, ResultsFileError
+        try:
+            world_list, regionset = load_results(args.paths + path_lines)
+        except ResultsFileError as e:
+            print("Error: {0}".format(e))
+            return c.RV_CRASH
+        return print_merged_results(args, world_list, regionset)
+
+    # Parse all the paths, from text file and command input
+    world_list, regionset = world.parse_paths(args.paths + path_lines)
+
+    if args.shard:
+        for w in world_list:
+            w.keep_shard(*args.shard)
+        regionset.keep_shard(*args.shard)
+
     # Check if there are valid worlds to scan
     if not (world_list or regionset):
         print('Error: No worlds or region files to scan! Use '
@@ -375,7 +779,10 @@ def main():
     any_chunk_replace_option = args.replace_corrupted or \
         args.replace_wrong_located or \
         args.replace_entities or \
-        args.replace_shared_offset
+        args.replace_shared_offset or \
+        args.replace_missing_tag or \
+        args.replace_block_entities or \
+        args.replace_ticks
     any_region_replace_option = args.replace_too_small
 
     if False or args.summary: # removed interactive mode args.interactive
@@ -407,6 +814,48 @@ def main():
     if args.entity_limit < 0:
         parser.error("Error: The entity limit must be at least 0!")
 
+    depths = dict((arg, d) for d, arg in c.SCAN_DEPTH_ARGS.items())
+    scan_depth = depths[args.scan_depth]
+    if scan_depth != c.SCAN_DEPTH_FULL and (args.delete_entities or
+                                            args.delete_shared_offset or
+                                            args.replace_shared_offset):
+        parser.error("Error: The options --quick and --scan-depth can't be used with "
+                     "--delete-entities or the --*-shared-offset options. Only a full "
+                     "scan counts entities and can tell which of the chunks sharing "
+                     "offset is the good one.")
+
+    for limit, name in ((args.block_entity_limit, 'block entity'),
+                        (args.tick_limit, 'tick')):
+        if limit is not None and limit < 0:
+            parser.error("Error: The {0} limit must be at least 0!".format(name))
+        if limit is not None and scan_depth != c.SCAN_DEPTH_FULL:
+            parser.error("Error: The options --block-entity-limit and --tick-limit can't "
+                         "be used with --quick or --scan-depth, only a full scan parses "
+                         "the chunks.")
+
+    if args.trim_block_entities and args.block_entity_limit is None:
+        parser.error("Error: The option --trim-block-entities needs the --block-entity-limit option")
+
+    if args.trim_ticks and args.tick_limit is None:
+        parser.error("Error: The option --trim-ticks needs the --tick-limit option")
+
+    if args.census and scan_depth != c.SCAN_DEPTH_FULL:
+        parser.error("Error: The option --census can't be used with --quick or --scan-depth, "
+                     "only a full scan reads the entities.")
+
+    if args.sample is not None and not 0 < args.sample <= 1:
+        parser.error("Error: The sample must be a fraction greater than 0 and up to 1!")
+
+    if args.executor and args.remote_workers:
+        parser.error("Error: The option --executor can't be used with --remote-workers")
+
+    if args.delete_entities and args.remote_workers:
+        parser.error("Error: The remote workers can't delete entities, they only read "
+                     "the files.")
+
+    if args.resume and not args.journal:
+        parser.error("Error: The option --resume needs the --journal option")
+
     # Do things with the option options args
     # Create a list of worlds containing the backups of the region files
     if args.backups:
@@ -421,125 +870,206 @@ def main():
     found_problems_in_regionsets = False
     found_problems_in_worlds = False
     if False: # removed args.interactive
+        from regionfixer_core.interactive import InteractiveLoop
         ci = InteractiveLoop(world_list, regionset, args, backup_worlds)
         ci.cmdloop()
         return c.RV_OK
     else:
         summary_text = ""
-        # Scan the separate region files
-
-        if len(regionset) > 0:
-
-            console_scan_regionset(regionset, args.processes, args.entity_limit,
-                                   args.delete_entities, args.verbose)
-            print((regionset.generate_report(True)))
-
-            # Delete chunks
-            delete_bad_chunks(args, regionset)
-
-            # Delete region files
-            delete_bad_regions(args, regionset)
 
-            # fix chunks
-            fix_bad_chunks(args, regionset)
+        from regionfixer_core.scan import (console_scan_world,
+                                           console_scan_regionset,
+                                           ScanPool)
 
-            # Verbose log
-            if args.summary:
-                summary_text += "\n"
-                summary_text += entitle("Separate region files")
-                summary_text += "\n"
-                t = regionset.summary()
-                if t:
-                    summary_text += t
-                else:
-                    summary_text += "No problems found.\n\n"
-
-            # Check if problems have been found
-            if regionset.has_problems:
-                found_problems_in_regionsets = True
-
-        # scan all the world folders
-
-        for w in world_list:
-            w_name = w.get_name()
-            print((entitle(' Scanning world: {0} '.format(w_name), 0)))
-
-            console_scan_world(w, args.processes, args.entity_limit,
-                               args.delete_entities, args.verbose)
-
-            print("")
-            print((entitle('Scan results for: {0}'.format(w_name), 0)))
-            print((w.generate_report(True)))
-            print("")
-
-            # Replace chunks
-            if backup_worlds and len(world_list) <= 1:
-                del_ent = args.delete_entities
-                ent_lim = args.entity_limit
-                options_replace = [args.replace_corrupted,
-                                   args.replace_wrong_located,
-                                   args.replace_entities,
-                                   args.replace_shared_offset]
-                replacing = list(zip(options_replace, c.CHUNK_PROBLEMS_ITERATOR))
-                for replace, (problem, status, arg) in replacing:
-                    if replace:
-                        total = w.count_chunks(problem)
-                        if total:
-                            text = " Replacing chunks with status: {0} ".format(status)
-                            print(("{0:#^60}".format(text)))
-                            fixed = w.replace_problematic_chunks(backup_worlds, problem, ent_lim, del_ent)
-                            print(("\n{0} replaced of a total of {1} chunks with status: {2}".format(fixed, total, status)))
-                        else:
-                            print(("No chunks to replace with status: {0}".format(status)))
-
-            elif any_chunk_replace_option and not backup_worlds:
-                print("Info: Won't replace any chunk.")
-                print("No backup worlds found, won't replace any chunks/region files!")
-            elif any_chunk_replace_option and backup_worlds and len(world_list) > 1:
-                print("Info: Won't replace any chunk.")
-                print("Can't use the replace options while scanning more than one world!")
-
-            # replace region files
-            if backup_worlds and len(world_list) <= 1:
-                del_ent = args.delete_entities
-                ent_lim = args.entity_limit
-                options_replace = [args.replace_too_small]
-                replacing = list(zip(options_replace, c.REGION_PROBLEMS_ITERATOR))
-                for replace, (problem, status, arg) in replacing:
-                    if replace:
-                        total = w.count_regions(problem)
-                        if total:
-                            text = " Replacing regions with status: {0} ".format(status)
-                            print(("{0:#^60}".format(text)))
-                            fixed = w.replace_problematic_regions(backup_worlds, problem, ent_lim, del_ent)
-                            print(("\n{0} replaced of a total of {1} regions with status: {2}".format(fixed, total, status)))
-                        else:
-                            print(("No region to replace with status: {0}".format(status)))
-
-            elif any_region_replace_option and not backup_worlds:
-                print("Info: Won't replace any regions.")
-                print("No valid backup worlds found, won't replace any chunks/region files!")
-                print("Note: You probably inserted some backup worlds with the backup option but they are probably no valid worlds, the most common issue is wrong path.")
-            elif any_region_replace_option and backup_worlds and len(world_list) > 1:
-                print("Info: Won't replace any regions.")
-                print("Can't use the replace options while scanning more than one world!")
-
-            # delete chunks
-            delete_bad_chunks(args, w)
-
-            # delete region files
-            delete_bad_regions(args, w)
-
-            # fix chunks
-            fix_bad_chunks(args, w)
-
-            # print a summary for this world
-            if args.summary:
-                summary_text += w.summary()
-
-            # check if problems have been found
-            if w.has_problems:
-                found_problems_in_worlds = True
+        # The same child processes are used for all the scans, creating
+        # them for every world and region set is slow
+        if args.remote_workers:
+            from regionfixer_core.remote import RemoteScanPool, RemoteWorkerError
+            try:
+                pool = RemoteScanPool(args.remote_workers, secret, args.entity_limit,
+                                      scan_depth, args.sample, args.census,
+                                      args.block_entity_limit, args.tick_limit)
+            except RemoteWorkerError as e:
+                print("Error: {0}".format(e))
+                return c.RV_CRASH
+            print("Scanning in {0} remote processes.".format(pool.processes))
+        else:
+            pool = ScanPool(args.processes, args.entity_limit, args.delete_entities,
+                            scan_depth, args.sample,
+                            args.executor or c.EXECUTOR_PROCESS, args.census,
+                            args.block_entity_limit, args.tick_limit)
+
+        # The pool is closed at the end, or terminated if something fails
+        with pool:
+            cache = None
+            if args.cache:
+                from regionfixer_core.cache import ScanCache
+                cache = ScanCache(args.cache)
+
+            journal = None
+            if args.journal:
+                from regionfixer_core.journal import ScanJournal
+                journal = ScanJournal(args.journal, pool.scan_params, args.resume)
+
+            # Scan the separate region files
+
+            if len(regionset) > 0:
+
+                try:
+                    console_scan_regionset(regionset, args.processes, args.entity_limit,
+                                           args.delete_entities, args.verbose, pool, cache,
+                                           journal)
+                finally:
+                    if cache is not None:
+                        cache.save()
+                print((regionset.generate_report(True)))
+                if args.sample is not None:
+                    print(regionset.generate_sample_report())
+                if args.census:
+                    print_census(regionset.get_entity_census())
+                if args.chunk_sizes:
+                    print_chunk_sizes([regionset], args.verbose)
+                if args.waste:
+                    print_sector_usage([regionset], args.verbose)
+
+                # Delete chunks
+                delete_bad_chunks(args, regionset)
+
+                # Delete region files
+                delete_bad_regions(args, regionset)
+
+                # fix chunks
+                fix_bad_chunks(args, regionset)
+
+                # trim chunks
+                trim_bad_chunks(args, regionset)
+
+                # Verbose log
+                if args.summary:
+                    summary_text += "\n"
+                    summary_text += entitle("Separate region files")
+                    summary_text += "\n"
+                    t = regionset.summary()
+                    if t:
+                        summary_text += t
+                    else:
+                        summary_text += "No problems found.\n\n"
+
+                # Check if problems have been found
+                if regionset.has_problems:
+                    found_problems_in_regionsets = True
+
+            # scan all the world folders
+
+            for w in world_list:
+                w_name = w.get_name()
+                print((entitle(' Scanning world: {0} '.format(w_name), 0)))
+
+                try:
+                    console_scan_world(w, args.processes, args.entity_limit,
+                                       args.delete_entities, args.verbose, pool, cache,
+                                       journal)
+                finally:
+                    if cache is not None:
+                        cache.save()
+
+                print("")
+                print((entitle('Scan results for: {0}'.format(w_name), 0)))
+                print((w.generate_report(True)))
+                if args.sample is not None:
+                    print(w.generate_sample_report())
+                if args.census:
+                    print_census(w.get_entity_census())
+                if args.chunk_sizes:
+                    print_chunk_sizes(w.regionsets, args.verbose)
+                if args.waste:
+                    print_sector_usage(w.regionsets, args.verbose)
+                print("")
+
+                # Replace chunks
+                if backup_worlds and len(world_list) <= 1:
+                    del_ent = args.delete_entities
+                    ent_lim = args.entity_limit
+                    options_replace = [args.replace_corrupted,
+                                       args.replace_wrong_located,
+                                       args.replace_entities,
+                                       args.replace_shared_offset,
+                                       args.replace_missing_tag,
+                                       args.replace_block_entities,
+                                       args.replace_ticks]
+                    replacing = list(zip(options_replace, c.CHUNK_PROBLEMS_ITERATOR))
+                    for replace, (problem, status, arg) in replacing:
+                        if replace:
+                            total = w.count_chunks(problem)
+                            if total:
+                                text = " Replacing chunks with status: {0} ".format(status)
+                                print(("{0:#^60}".format(text)))
+                                fixed = w.replace_problematic_chunks(backup_worlds, problem, ent_lim, del_ent)
+                                print(("\n{0} replaced of a total of {1} chunks with status: {2}".format(fixed, total, status)))
+                            else:
+                                print(("No chunks to replace with status: {0}".format(status)))
+
+                elif any_chunk_replace_option and not backup_worlds:
+                    print("Info: Won't replace any chunk.")
+                    print("No backup worlds found, won't replace any chunks/region files!")
+                elif any_chunk_replace_option and backup_worlds and len(world_list) > 1:
+                    print("Info: Won't replace any chunk.")
+                    print("Can't use the replace options while scanning more than one world!")
+
+                # replace region files
+                if backup_worlds and len(world_list) <= 1:
+                    del_ent = args.delete_entities
+                    ent_lim = args.entity_limit
+                    options_replace = [args.replace_too_small]
+                    replacing = list(zip(options_replace, c.REGION_PROBLEMS_ITERATOR))
+                    for replace, (problem, status, arg) in replacing:
+                        if replace:
+                            total = w.count_regions(problem)
+                            if total:
+                                text = " Replacing regions with status: {0} ".format(status)
+                                print(("{0:#^60}".format(text)))
+                                fixed = w.replace_problematic_regions(backup_worlds, problem, ent_lim, del_ent)
+                                print(("\n{0} replaced of a total of {1} regions with status: {2}".format(fixed, total, status)))
+                            else:
+                                print(("No region to replace with status: {0}".format(status)))
+
+                elif any_region_replace_option and not backup_worlds:
+                    print("Info: Won't replace any regions.")
+                    print("No valid backup worlds found, won't replace any chunks/region files!")
+                    print("Note: You probably inserted some backup worlds with the backup option but they are probably no valid worlds, the most common issue is wrong path.")
+                elif any_region_replace_option and backup_worlds and len(world_list) > 1:
+                    print("Info: Won't replace any regions.")
+                    print("Can't use the replace options while scanning more than one world!")
+
+                # delete chunks
+                delete_bad_chunks(args, w)
+
+                # delete region files
+                delete_bad_regions(args, w)
+
+                # fix chunks
+                fix_bad_chunks(args, w)
+
+                # trim chunks
+                trim_bad_chunks(args, w)
+
+                # print a summary for this world
+                if args.summary:
+                    summary_text += w.summary()
+
+                # check if problems have been found
+                if w.has_problems:
+                    found_problems_in_worlds = True
+
+        if args.results:
+            from regionfixer_core.results import save_results
+            save_results(args.results, world_list, regionset, pool.scan_params,
+                         args.shard)
+            print(("Results saved in \'{0}\'.".format(args.results)))
+
+        # Everything is scanned, nothing to resume
+        if journal is not None:
+            journal.remove()
 
         # verbose log text
         if args.summary == '-':
@@ -578,22 +1108,33 @@ if __name__ == '__main__':
         had_exception = False
         value = e.code
 
-    except ChildProcessException as e:
-        had_exception = True
-        print(ERROR_MSG)
-        bug_sender = BugReporter(e.printable_traceback)
-        # auto_reported = bug_sender.ask_and_send(QUESTION_TEXT)
-        bug_report = bug_sender.error_str
-        value = c.RV_CRASH
-
     except Exception as e:
-        had_exception = True
-        print(ERROR_MSG)
-        # Traceback will be taken in init
-        bug_sender = BugReporter()
-        # auto_reported = bug_sender.ask_and_send(QUESTION_TEXT)
-        bug_report = bug_sender.error_str
-        value = c.RV_CRASH
+        from regionfixer_core.bug_reporter import BugReporter
+        # scan.py is imported by main() only when something is scanned, and
+        # only then a child process can fail
+        scan = sys.modules.get('regionfixer_core.scan')
+        if scan is not None and isinstance(e, scan.ChildProcessException):
+            from regionfixer_core.remote import RemoteWorkerError
+            if e.exc_type is RemoteWorkerError:
+                # Not a bug, the remote workers are gone or refused a file. The
+                # scans failing inside a worker are a RemoteScanError.
+                print("\nError: {0}".format(e.exc_class))
+                value = c.RV_CRASH
+            else:
+                had_exception = True
+                print(ERROR_MSG)
+                bug_sender = BugReporter(e.printable_traceback)
+                # auto_reported = bug_sender.ask_and_send(QUESTION_TEXT)
+                bug_report = bug_sender.error_str
+                value = c.RV_CRASH
+        else:
+            had_exception = True
+            print(ERROR_MSG)
+            # Traceback will be taken in init
+            bug_sender = BugReporter()
+            # auto_reported = bug_sender.ask_and_send(QUESTION_TEXT)
+            bug_report = bug_sender.error_str
+            value = c.RV_CRASH
 
     finally:
         if had_exception and not auto_reported:
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#   Region Fixer.
+#   Fix your region files with a backup copy of your Minecraft world.
+#   Copyright (C) 2020  Alejandro Aguilera (Fenixin)
+#   https://github.com/Fenixin/Minecraft-Region-Fixer
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+""" Scan worlds and region sets from asyncio code.
+
+Usage:
+
+    async with contextlib.aclosing(scan_world(w, 4, 300)) as results:
+        async for scanned_file in results:
+            # do things
+
+The files are scanned in the workers of a ScanPool while the event loop keeps
+running. Closing the generator, or cancelling the task that iterates it,
+stops the scan.
+
+"""
+
+import asyncio
+
+import regionfixer_core.constants as c
+from regionfixer_core import world
+from regionfixer_core.scan import (ScanPool,
+                                   AsyncWorldScanner,
+                                   AsyncRegionsetScanner)
+
+
+# Default maximum number of tasks sent to the pool that haven't been consumed,
+# see AsyncScanner.max_pending
+DEFAULT_MAX_PENDING = 64
+
+
+async def _iterate_scanner(scanner):
+    """ Yields the results of an AsyncScanner without blocking the event loop.
+
+    If the iteration is stopped before the scan finishes the pool is terminated.
+    """
+
+    loop = asyncio.get_running_loop()
+    # The inline executor scans in get_last_result(), don't do it in the loop
+    blocking = getattr(scanner.pool, 'executor', None) == c.EXECUTOR_INLINE
+    finished = False
+    try:
+        scanner.scan()
+        while not scanner.finished:
+            if blocking:
+                result = await loop.run_in_executor(None, scanner.get_last_result)
+            else:
+                result = scanner.get_last_result()
+            if result is None:
+                await asyncio.sleep(scanner.get_sleep_time())
+            else:
+                yield result
+        finished = True
+    finally:
+        if not finished:
+            # Terminating a pool waits for the threads, don't block the loop
+            await loop.run_in_executor(None, scanner.terminate)
+
+
+async def _scan(scanner, own_pool):
+    """ Yields the results of an AsyncScanner, closing the pool if it's own. """
+
+    async for result in _iterate_scanner(scanner):
+        yield result
+    if own_pool:
+        scanner.pool.close()
+        await asyncio.get_running_loop().run_in_executor(None, scanner.pool.join)
+
+
+async def scan_world(world_obj, processes, entity_limit, remove_entities=False,
+                     pool=None, data_files=True, cache=None, journal=None,
+                     executor=c.EXECUTOR_THREAD, max_pending=DEFAULT_MAX_PENDING):
+    """ Scans a world, yielding the scanned files as they are scanned.
+
+    Inputs:
+     - world_obj -- World object from world.py that will be scanned
+     - processes -- An integer with the number of workers to use
+     - entity_limit -- An integer, threshold of entities for a chunk to be considered
+                     with too many entities
+     - remove_entities -- A boolean, defaults to False, to remove the entities while
+                         scanning.
+     - pool -- A ScanPool to use for the scan. If None a new one is created with
+               the given executor and closed at the end of the scan.
+     - data_files -- A boolean, defaults to True, also scan the player and data files.
+     - cache -- A ScanCache to skip the region files that haven't changed.
+     - journal -- A ScanJournal to resume an interrupted scan.
+     - executor -- One of the EXECUTOR_* values in constants.py, used to create the
+                   pool. Defaults to threads, no processes are started.
+     - max_pending -- Maximum number of tasks sent to the pool that haven't been
+                      consumed, see AsyncScanner. The scan waits for the consumer
+                      when it's reached.
+
+    Yields the ScannedRegionFile (and ScannedDataFile) objects of the world, the
+    same instances as in the world.
+
+    If the iteration is stopped before the end the pool is terminated, even a
+    shared one, it will have tasks of this scan left.
+
+    """
+
+    own_pool = pool is None
+    if own_pool:
+        pool = ScanPool(processes, entity_limit, remove_entities, executor=executor)
+    scanner = AsyncWorldScanner(world_obj, processes, entity_limit, remove_entities,
+                                pool, data_files, cache, journal, max_pending)
+
+    async for result in _scan(scanner, own_pool):
+        yield result
+    world_obj.scanned = True
+
+
+async def scan_regionset(regionset, processes, entity_limit, remove_entities=False,
+                         pool=None, cache=None, journal=None,
+                         executor=c.EXECUTOR_THREAD, max_pending=DEFAULT_MAX_PENDING):
+    """ Scans a RegionSet, yielding the ScannedRegionFile objects as they are scanned.
+
+    Inputs:
+     - regionset -- RegionSet object from world.py that will be scanned
+
+    The rest of the inputs are the same as in scan_world().
+
+    """
+
+    assert isinstance(regionset, world.RegionSet)
+
+    own_pool = pool is None
+    if own_pool:
+        pool = ScanPool(processes, entity_limit, remove_entities, executor=executor)
+    scanner = AsyncRegionsetScanner(regionset, processes, entity_limit, remove_entities,
+                                    pool, cache, journal, max_pending)
+
+    async for result in _scan(scanner, own_pool):
+        yield result
+    regionset.scanned = True
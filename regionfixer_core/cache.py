@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#   Region Fixer.
+#   Fix your region files with a backup copy of your Minecraft world.
+#   Copyright (C) 2020  Alejandro Aguilera (Fenixin)
+#   https://github.com/Fenixin/Minecraft-Region-Fixer
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import pickle
+from os.path import abspath, exists
+
+import nbt.region as region
+
+import regionfixer_core.constants as c
+
+
+# Increase it when the format of the cache or of the stored results changes,
+# old caches will be ignored
+CACHE_VERSION = 7
+
+
+def get_region_file_key(path):
+    """ Returns the information used to know if a region file has changed.
+
+    Inputs:
+     - path -- String with the path of the region file.
+
+    Return:
+     - key -- Tuple (size, mtime, header) where header are the raw bytes of the
+              two sectors of the region header (the 1024 chunk locations and
+              the 1024 chunk timestamps). None if the file can't be read.
+
+    The size and the modification time are not enough, some tools copy files
+    keeping the modification time. Minecraft updates the timestamp of a chunk
+    every time it's saved, so reading 8 KiB of the header is a cheap and safe
+    way to know if something changed. The header is also used to know which
+    chunks changed, see get_previous().
+
+    """
+
+    try:
+        st = os.stat(path)
+        with open(path, 'rb') as f:
+            header = f.read(2 * region.SECTOR_LENGTH)
+    except OSError:
+        return None
+
+    return st.st_size, st.st_mtime_ns, header
+
+
+class ScanCache:
+    """ Stores the results of the scan of region files between runs.
+
+    Inputs:
+     - path -- String with the path of the cache file. If it doesn't exist it
+               will be created by save().
+
+    The results are stored by the absolute path of the region file together with
+    the key returned by get_region_file_key() and the scan parameters used. A
+    result is only used if the key and the scan parameters are the same, this
+    way only the region files that changed since the last run are scanned again.
+
+    A cache file can be used for any number of worlds.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # abspath: (key, scan parameters, ScannedRegionFile)
+        self._entries = {}
+        # Keys of the region files looked up and not found, see get()
+        self._keys = {}
+        self.hits = 0
+        self.misses = 0
+
+        if exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    version, entries = pickle.load(f)
+                if version == CACHE_VERSION:
+                    self._entries = entries
+            except Exception:
+                # A broken cache is just an empty cache
+                print("Warning: The scan cache {0} can't be read. "
+                      "It will be created again.".format(path))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, scanned_regionfile, scan_params):
+        """ Returns the cached results of a region file if it hasn't changed.
+
+        Inputs:
+         - scanned_regionfile -- ScannedRegionFile object from world.py
+         - scan_params -- Dictionary with the scan parameters, see ScanPool.scan_params
+
+        Return:
+         - result -- The cached ScannedRegionFile, or None if there are no valid
+                     results for this file.
+
+        The key of the file is remembered, so put() stores the results with the
+        state the file had before the scan. If the file changes during the scan
+        the next run will scan it again.
+
+        """
+
+        path = abspath(scanned_regionfile.path)
+        key = get_region_file_key(path)
+        entry = self._entries.get(path)
+        if key is not None and entry is not None and entry[0] == key and entry[1] == scan_params:
+            self.hits += 1
+            return entry[2]
+
+        self.misses += 1
+        self._keys[path] = key
+        return None
+
+    def get_previous(self, scanned_regionfile, scan_params):
+        """ Returns the last results stored for a region file that has changed.
+
+        Inputs:
+         - scanned_regionfile -- ScannedRegionFile object from world.py
+         - scan_params -- Dictionary with the scan parameters, see ScanPool.scan_params
+
+        Return:
+         - previous -- Tuple (header, chunks, raw_sizes, overloads) with the raw
+                       region header of the last scan, a dictionary with the
+                       chunk tuples found, other with the known uncompressed
+                       sizes of the chunks and other with their overloads, or
+                       None if there are no usable results. See the previous
+                       argument of scan.scan_region_file().
+
+        """
+
+        entry = self._entries.get(abspath(scanned_regionfile.path))
+        if entry is None or entry[1] != scan_params:
+            return None
+        result = entry[2]
+        if result.status != c.REGION_OK:
+            return None
+        header = entry[0][2]
+        if len(header) != 2 * region.SECTOR_LENGTH:
+            return None
+        chunks = {}
+        raw_sizes = {}
+        overloads = {}
+        for k in result.keys():
+            chunks[k] = result[k]
+            raw_size = result.get_chunk_size(k)[1]
+            if raw_size is not None:
+                raw_sizes[k] = raw_size
+            chunk_overloads = result.get_chunk_overloads(k)
+            if chunk_overloads:
+                overloads[k] = chunk_overloads
+        return header, chunks, raw_sizes, overloads
+
+    def put(self, scanned_regionfile, scan_params):
+        """ Stores the results of the scan of a region file.
+
+        Inputs:
+         - scanned_regionfile -- ScannedRegionFile object from world.py
+         - scan_params -- Dictionary with the scan parameters, see ScanPool.scan_params
+
+        Only region files looked up with get() are stored, the rest have no
+        key to check them the next time.
+
+        """
+
+        path = abspath(scanned_regionfile.path)
+        key = self._keys.pop(path, None)
+        if key is not None:
+            self._entries[path] = (key, scan_params, scanned_regionfile)
+
+    def save(self):
+        """ Writes the cache to disk.
+
+        The cache is written to a temporary file and then renamed, an interrupted
+        save never leaves a broken cache.
+
+        """
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((CACHE_VERSION, self._entries), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#   Region Fixer.
+#   Fix your region files with a backup copy of your Minecraft world.
+#   Copyright (C) 2020  Alejandro Aguilera (Fenixin)
+#   https://github.com/Fenixin/Minecraft-Region-Fixer
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import struct
+from heapq import nlargest
+
+from .util import table
+
+
+# Number of chunks with most entities kept by an EntityCensus
+CENSUS_HOTSPOTS = 10
+
+# Number of entity types shown in the census report
+CENSUS_REPORT_TYPES = 20
+
+# Type used for the entities without an id
+UNKNOWN_ENTITY_ID = "?"
+
+# NBT tag types, see the NBT format
+_TAG_END = 0
+_TAG_STRING = 8
+_TAG_LIST = 9
+_TAG_COMPOUND = 10
+
+# Size of the payload of the tags with a fixed size
+_FIXED_SIZES = {1: 1, 2: 2, 3: 4, 4: 8, 5: 4, 6: 8}
+
+# Size of an item of the array tags
+_ARRAY_ITEM_SIZES = {7: 1, 11: 4, 12: 8}
+
+_unpack_short = struct.Struct('>H').unpack_from
+_unpack_int = struct.Struct('>i').unpack_from
+
+
+def _skip_payload(data, pos, tag_type):
+    """ Returns the position after the payload of a tag starting at pos. """
+
+    size = _FIXED_SIZES.get(tag_type)
+    if size is not None:
+        return pos + size
+    if tag_type == _TAG_STRING:
+        return pos + 2 + _unpack_short(data, pos)[0]
+    size = _ARRAY_ITEM_SIZES.get(tag_type)
+    if size is not None:
+        return pos + 4 + max(_unpack_int(data, pos)[0], 0) * size
+    if tag_type == _TAG_LIST:
+        item_type = data[pos]
+        length = _unpack_int(data, pos + 1)[0]
+        pos += 5
+        size = _FIXED_SIZES.get(item_type)
+        if size is not None:
+            return pos + max(length, 0) * size
+        for i in range(length):
+            pos = _skip_payload(data, pos, item_type)
+        return pos
+    if tag_type == _TAG_COMPOUND:
+        while True:
+            t = data[pos]
+            if t == _TAG_END:
+                return pos + 1
+            pos += 3 + _unpack_short(data, pos + 1)[0]
+            pos = _skip_payload(data, pos, t)
+    raise ValueError("Unknown NBT tag type {0}".format(tag_type))
+
+
+def _count_entity_ids(data, pos, counts):
+    """ Counts the ids of the entities of a list of compounds starting at pos. """
+
+    item_type = data[pos]
+    length = _unpack_int(data, pos + 1)[0]
+    pos += 5
+    if item_type != _TAG_COMPOUND:
+        return
+    for i in range(length):
+        entity_id = UNKNOWN_ENTITY_ID
+        while True:
+            t = data[pos]
+            if t == _TAG_END:
+                pos += 1
+                break
+            name_end = pos + 3 + _unpack_short(data, pos + 1)[0]
+            if t == _TAG_STRING and data[pos + 3:name_end] == b'id':
+                id_end = name_end + 2 + _unpack_short(data, name_end)[0]
+                entity_id = data[name_end + 2:id_end].decode('utf-8', 'replace')
+                pos = id_end
+            else:
+                pos = _skip_payload(data, name_end, t)
+        counts[entity_id] = counts.get(entity_id, 0) + 1
+
+
+def _find_entities(data, pos, in_root):
+    """ Looks for the list of entities in the compound starting at pos.
+
+    Return:
+     - counts -- Dictionary with the number of entities of every id, or None
+                 if the list is not in the compound.
+
+    """
+
+    while True:
+        t = data[pos]
+        if t == _TAG_END:
+            return None
+        name_end = pos + 3 + _unpack_short(data, pos + 1)[0]
+        name = data[pos + 3:name_end]
+        if t == _TAG_LIST and name in (b'Entities', b'entities'):
+            counts = {}
+            _count_entity_ids(data, name_end, counts)
+            return counts
+        if t == _TAG_COMPOUND and in_root and name == b'Level':
+            counts = _find_entities(data, name_end, False)
+            if counts is not None:
+                return counts
+        pos = _skip_payload(data, name_end, t)
+
+
+def read_entity_ids(data):
+    """ Counts the entities of a chunk by their id.
+
+    Inputs:
+     - data -- Bytes with the decompressed NBT data of a chunk, of a region file
+               or of an entities file.
+
+    Return:
+     - counts -- Dictionary with the ids of the entities as keys and the number
+                 of entities with that id as values. None if the chunk has no
+                 list of entities or the data can't be read.
+
+    The entities are in "Level"/"Entities" before 1.17, in "entities" in the
+    chunks of 1.18 and in "Entities" in the entities files. The NBT data is
+    walked without creating any tag, everything but the id of the entities
+    is skipped, so a chunk with thousands of entities doesn't take memory.
+
+    """
+
+    try:
+        if data[0] != _TAG_COMPOUND:
+            return None
+        return _find_entities(data, 3 + _unpack_short(data, 1)[0], True)
+    except (IndexError, ValueError, struct.error, RecursionError):
+        return None
+
+
+class EntityCensus:
+    """ Counts of the entities by their type, of a region file, a region set or a world.
+
+    The census is made while scanning, see ScanPool. Every region file gets its
+    own census, and they are merged to get the census of a region set or a
+    world, see RegionSet.get_entity_census().
+
+    Attributes:
+     - counts -- Dictionary with the ids of the entities as keys and the number of
+                 entities of that type as values.
+     - hotspots -- List with the CENSUS_HOTSPOTS chunks with most entities, sorted
+                   from the most to the least. Tuples like (num_entities,
+                   global_coords, histogram), the histogram is a tuple of
+                   (id, count) of the entities of the chunk sorted by count.
+
+    """
+
+    __slots__ = ('counts', 'hotspots')
+
+    def __init__(self):
+        self.counts = {}
+        self.hotspots = []
+
+    def __len__(self):
+        """ Returns the number of entities counted. """
+        return sum(self.counts.values())
+
+    def add_chunk(self, global_coords, counts):
+        """ Adds the entities of a chunk to the census.
+
+        Inputs:
+         - global_coords -- Tuple with the global coordinates of the chunk
+         - counts -- Dictionary with the number of entities of every id, as
+                     returned by read_entity_ids()
+
+        """
+
+        total = 0
+        for entity_id, n in counts.items():
+            self.counts[entity_id] = self.counts.get(entity_id, 0) + n
+            total += n
+        if total:
+            histogram = tuple(sorted(counts.items(), key=lambda t: (-t[1], t[0])))
+            self._add_hotspots([(total, tuple(global_coords), histogram)])
+
+    def merge(self, other):
+        """ Adds the counts of other EntityCensus to this one. """
+
+        for entity_id, n in other.counts.items():
+            self.counts[entity_id] = self.counts.get(entity_id, 0) + n
+        self._add_hotspots(other.hotspots)
+
+    def _add_hotspots(self, hotspots):
+        self.hotspots = nlargest(CENSUS_HOTSPOTS, self.hotspots + list(hotspots))
+
+    def most_common(self, n=None):
+        """ Returns a list of tuples (id, count) sorted by count, the first n
+        of them if n is not None. """
+
+        l = sorted(self.counts.items(), key=lambda t: (-t[1], t[0]))
+        return l if n is None else l[:n]
+
+    def to_dict(self):
+        """ Returns the census as a dictionary that can be stored as JSON. """
+        return {'counts': self.counts,
+                'hotspots': [[total, list(coords), [list(t) for t in histogram]]
+                             for total, coords, histogram in self.hotspots]}
+
+    @classmethod
+    def from_dict(cls, d):
+        """ Returns an EntityCensus from a dictionary returned by to_dict(). """
+        census = cls()
+        census.counts = dict(d['counts'])
+        census.hotspots = [(total, tuple(coords), tuple(tuple(t) for t in histogram))
+                           for total, coords, histogram in d['hotspots']]
+        return census
+
+
+def generate_census_report(census):
+    """ Returns a human readable string with the entity census.
+
+    Inputs:
+     - census -- EntityCensus object
+
+    """
+
+    total = len(census)
+    if not total:
+        return "\nEntity census: No entities found."
+
+    text = "\nEntity census: {0} entities of {1} types.\n".format(total, len(census.counts))
+    most_common = census.most_common(CENSUS_REPORT_TYPES)
+    text += table([["Type"] + [t[0] for t in most_common],
+                   ["Count"] + [t[1] for t in most_common],
+                   ["%"] + ["{0:.1%}".format(t[1] / total) for t in most_common]])
+    if len(census.counts) > len(most_common):
+        text += "\n ... and {0} more types.".format(len(census.counts) - len(most_common))
+
+    text += "\nChunks with most entities:"
+    for num_entities, coords, histogram in census.hotspots:
+        types = ", ".join("{0}: {1}".format(*t) for t in histogram[:3])
+        if len(histogram) > 3:
+            types += ", ..."
+        text += "\n Chunk {0}: {1} entities ({2})".format(coords, num_entities, types)
+    return text
@@ -47,6 +47,8 @@ CHUNK_WRONG_LOCATED = 2
 CHUNK_TOO_MANY_ENTITIES = 3
 CHUNK_SHARED_OFFSET = 4
 CHUNK_MISSING_ENTITIES_TAG = 5
+CHUNK_TOO_MANY_BLOCK_ENTITIES = 6
+CHUNK_TOO_MANY_TICKS = 7
 
 # Chunk statuses
 CHUNK_STATUSES = [CHUNK_NOT_CREATED,
@@ -55,14 +57,18 @@ CHUNK_STATUSES = [CHUNK_NOT_CREATED,
                   CHUNK_WRONG_LOCATED,
                   CHUNK_TOO_MANY_ENTITIES,
                   CHUNK_SHARED_OFFSET,
-                  CHUNK_MISSING_ENTITIES_TAG]
+                  CHUNK_MISSING_ENTITIES_TAG,
+                  CHUNK_TOO_MANY_BLOCK_ENTITIES,
+                  CHUNK_TOO_MANY_TICKS]
 
 # Status that are considered problems
 CHUNK_PROBLEMS = [CHUNK_CORRUPTED,
                   CHUNK_WRONG_LOCATED,
                   CHUNK_TOO_MANY_ENTITIES,
                   CHUNK_SHARED_OFFSET,
-                  CHUNK_MISSING_ENTITIES_TAG]
+                  CHUNK_MISSING_ENTITIES_TAG,
+                  CHUNK_TOO_MANY_BLOCK_ENTITIES,
+                  CHUNK_TOO_MANY_TICKS]
 
 # Text describing each chunk status
 CHUNK_STATUS_TEXT = {CHUNK_NOT_CREATED: "Not created",
@@ -71,7 +77,9 @@ CHUNK_STATUS_TEXT = {CHUNK_NOT_CREATED: "Not created",
                      CHUNK_WRONG_LOCATED: "Wrong located",
                      CHUNK_TOO_MANY_ENTITIES: "Too many entities",
                      CHUNK_SHARED_OFFSET: "Sharing offset",
-                     CHUNK_MISSING_ENTITIES_TAG: "Missing Entities tag"
+                     CHUNK_MISSING_ENTITIES_TAG: "Missing Entities tag",
+                     CHUNK_TOO_MANY_BLOCK_ENTITIES: "Too many block entities",
+                     CHUNK_TOO_MANY_TICKS: "Too many scheduled ticks"
                      }
 
 # arguments used in the options
@@ -79,7 +87,9 @@ CHUNK_PROBLEMS_ARGS = {CHUNK_CORRUPTED: 'corrupted',
                        CHUNK_WRONG_LOCATED: 'wrong-located',
                        CHUNK_TOO_MANY_ENTITIES: 'entities',
                        CHUNK_SHARED_OFFSET: 'shared-offset',
-                       CHUNK_MISSING_ENTITIES_TAG: 'missing_tag'
+                       CHUNK_MISSING_ENTITIES_TAG: 'missing_tag',
+                       CHUNK_TOO_MANY_BLOCK_ENTITIES: 'block-entities',
+                       CHUNK_TOO_MANY_TICKS: 'ticks'
                        }
 
 # used in some places where there is less space
@@ -87,7 +97,9 @@ CHUNK_PROBLEMS_ABBR = {CHUNK_CORRUPTED: 'c',
                        CHUNK_WRONG_LOCATED: 'w',
                        CHUNK_TOO_MANY_ENTITIES: 'tme',
                        CHUNK_SHARED_OFFSET: 'so',
-                       CHUNK_MISSING_ENTITIES_TAG: 'mt'
+                       CHUNK_MISSING_ENTITIES_TAG: 'mt',
+                       CHUNK_TOO_MANY_BLOCK_ENTITIES: 'tmb',
+                       CHUNK_TOO_MANY_TICKS: 'tmt'
                        }
 
 # Dictionary with possible solutions for the chunks problems,
@@ -97,16 +109,38 @@ CHUNK_SOLUTION_REMOVE = 51
 CHUNK_SOLUTION_REPLACE = 52
 CHUNK_SOLUTION_REMOVE_ENTITIES = 53
 CHUNK_SOLUTION_RELOCATE_USING_DATA = 54
+CHUNK_SOLUTION_TRIM = 55
 
 CHUNK_PROBLEMS_SOLUTIONS = {CHUNK_CORRUPTED: [CHUNK_SOLUTION_REMOVE, CHUNK_SOLUTION_REPLACE],
                        CHUNK_WRONG_LOCATED: [CHUNK_SOLUTION_REMOVE, CHUNK_SOLUTION_REPLACE, CHUNK_SOLUTION_RELOCATE_USING_DATA],
                        CHUNK_TOO_MANY_ENTITIES: [CHUNK_SOLUTION_REMOVE_ENTITIES, CHUNK_SOLUTION_REPLACE],
                        CHUNK_SHARED_OFFSET: [CHUNK_SOLUTION_REMOVE, CHUNK_SOLUTION_REPLACE],
-                       CHUNK_MISSING_ENTITIES_TAG: [CHUNK_SOLUTION_REMOVE, CHUNK_SOLUTION_REPLACE]}
+                       CHUNK_MISSING_ENTITIES_TAG: [CHUNK_SOLUTION_REMOVE, CHUNK_SOLUTION_REPLACE],
+                       CHUNK_TOO_MANY_BLOCK_ENTITIES: [CHUNK_SOLUTION_TRIM, CHUNK_SOLUTION_REPLACE],
+                       CHUNK_TOO_MANY_TICKS: [CHUNK_SOLUTION_TRIM, CHUNK_SOLUTION_REPLACE]}
 
 # chunk problems that can be fixed (so they don't need to be removed or replaced)
 FIXABLE_CHUNK_PROBLEMS = [CHUNK_CORRUPTED, CHUNK_MISSING_ENTITIES_TAG, CHUNK_WRONG_LOCATED]
 
+# chunk problems fixed by emptying some lists of the chunk, see CHUNK_PROBLEMS_TAGS.
+# In order of precedence, a chunk with both problems gets the status of the first.
+TRIMMABLE_CHUNK_PROBLEMS = [CHUNK_TOO_MANY_BLOCK_ENTITIES, CHUNK_TOO_MANY_TICKS]
+
+# Names of the lists of a level chunk counted for a chunk problem. The first
+# ones are in the "Level" compound of the chunks older than 21w43a (1.18), the
+# second ones in the root of the newer chunks.
+CHUNK_PROBLEMS_TAGS = {CHUNK_TOO_MANY_BLOCK_ENTITIES: (['TileEntities'], ['block_entities']),
+                       CHUNK_TOO_MANY_TICKS: (['TileTicks', 'LiquidTicks'],
+                                              ['block_ticks', 'fluid_ticks'])}
+
+# The region header stores the sectors of a chunk in a byte, a chunk can't use
+# more than CHUNK_SECTOR_LIMIT sectors of 4KiB (a bit less than 1MiB). Minecraft
+# moves the bigger chunks to .mcc files since 1.15, older versions can't
+# save them at all. The chunks needing at least CHUNK_SECTOR_WARNING sectors
+# are listed in the chunk size report, see ChunkSizeStats in sizes.py.
+CHUNK_SECTOR_LIMIT = 255
+CHUNK_SECTOR_WARNING = 224
+
 # list with problem, status-text, problem arg tuples
 CHUNK_PROBLEMS_ITERATOR = []
 for problem in CHUNK_PROBLEMS:
@@ -118,6 +152,42 @@ for problem in CHUNK_PROBLEMS:
 TUPLE_NUM_ENTITIES = 0
 TUPLE_STATUS = 1
 
+# How deep the chunks are scanned:
+# Only the region header and the chunk headers are read, no chunk is decompressed
+SCAN_DEPTH_HEADER = 1
+# All the chunks are read and decompressed, but not parsed
+SCAN_DEPTH_DECOMPRESS = 2
+# All the chunks are read, decompressed and parsed
+SCAN_DEPTH_FULL = 3
+
+SCAN_DEPTHS = [SCAN_DEPTH_HEADER,
+               SCAN_DEPTH_DECOMPRESS,
+               SCAN_DEPTH_FULL]
+
+# Text describing each scan depth
+SCAN_DEPTH_TEXT = {SCAN_DEPTH_HEADER: "Header only",
+                   SCAN_DEPTH_DECOMPRESS: "Decompress only",
+                   SCAN_DEPTH_FULL: "Full"
+                   }
+
+# arguments used in the options
+SCAN_DEPTH_ARGS = {SCAN_DEPTH_HEADER: 'header',
+                   SCAN_DEPTH_DECOMPRESS: 'decompress',
+                   SCAN_DEPTH_FULL: 'full'
+                   }
+
+# Executors used to run the scan tasks, see scan.ScanPool:
+# Child processes, the default
+EXECUTOR_PROCESS = 'process'
+# Threads of the process, zlib releases the GIL while decompressing
+EXECUTOR_THREAD = 'thread'
+# No concurrency, the tasks run in the process as the results are asked for
+EXECUTOR_INLINE = 'inline'
+
+EXECUTORS = [EXECUTOR_PROCESS,
+             EXECUTOR_THREAD,
+             EXECUTOR_INLINE]
+
 
 
 
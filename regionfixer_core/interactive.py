@@ -89,7 +89,8 @@ class InteractiveLoop(Cmd):
                             self.options.entity_limit = int(args[1])
                             print("entity-limit = {0}".format(args[1]))
                             print("Updating chunk status...")
-                            self.current.rescan_entities(self.options)
+                            changed = self.current.set_entity_limit(self.options.entity_limit)
+                            print("{0} chunks changed their status.".format(changed))
                         else:
                             print("Invalid value. Valid values are positive integers and zero")
                     except ValueError:
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#   Region Fixer.
+#   Fix your region files with a backup copy of your Minecraft world.
+#   Copyright (C) 2020  Alejandro Aguilera (Fenixin)
+#   https://github.com/Fenixin/Minecraft-Region-Fixer
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import pickle
+from os.path import abspath, exists
+from time import time
+
+from regionfixer_core.cache import get_region_file_key
+
+
+# Increase it when the format of the journal or of the stored results changes,
+# old journals will be ignored
+JOURNAL_VERSION = 6
+
+# Seconds between forcing the journal to disk. Every result is flushed, this
+# is only for crashes of the whole system.
+JOURNAL_SYNC_TIME = 5.0
+
+
+class ScanJournal:
+    """ Journal with the results of a scan, used to resume an interrupted scan.
+
+    Inputs:
+     - path -- String with the path of the journal file.
+     - scan_params -- Dictionary with the scan parameters, see ScanPool.scan_params
+     - resume -- Boolean, if True the results already in the journal are loaded
+                 and used, if False the journal is started from scratch.
+
+    Every result is appended to the file as soon as it arrives, together with
+    the key of the file taken before the scan (see cache.get_region_file_key(),
+    it works for data files too).
+    When resuming, only the results of the files that haven't changed since then
+    are used, the rest of the files are scanned again.
+
+    The journal only makes sense for a scan session, remove() it when the scan
+    finishes. Use ScanCache to keep results between scans.
+
+    """
+
+    def __init__(self, path, scan_params, resume=False):
+        self.path = path
+        self.scan_params = scan_params
+        # abspath: (key, result)
+        self._entries = {}
+        # Keys of the files looked up and not found, see get()
+        self._keys = {}
+        self._last_sync = time()
+
+        valid_size = 0
+        if resume and exists(path):
+            valid_size = self._load()
+
+        if valid_size:
+            self._file = open(path, 'r+b')
+            # Drop a record half written when the scan was interrupted
+            self._file.truncate(valid_size)
+            self._file.seek(valid_size)
+        else:
+            self._file = open(path, 'wb')
+            pickle.dump((JOURNAL_VERSION, scan_params), self._file, pickle.HIGHEST_PROTOCOL)
+            self._file.flush()
+
+    def _load(self):
+        """ Reads the results stored in the journal file.
+
+        Return:
+         - valid_size -- Integer with the number of bytes of the file with valid
+                         records, 0 if the journal can't be used.
+
+        """
+
+        valid_size = 0
+        with open(self.path, 'rb') as f:
+            try:
+                version, scan_params = pickle.load(f)
+            except Exception:
+                print("Warning: The journal {0} can't be read. "
+                      "Starting the scan from scratch.".format(self.path))
+                return 0
+            if version != JOURNAL_VERSION or scan_params != self.scan_params:
+                print("Warning: The journal {0} was written by a scan with different "
+                      "options. Starting the scan from scratch.".format(self.path))
+                return 0
+            valid_size = f.tell()
+            while True:
+                try:
+                    path, key, result = pickle.load(f)
+                except Exception:
+                    # End of file, or the last record was not completely written
+                    break
+                self._entries[path] = (key, result)
+                valid_size = f.tell()
+
+        return valid_size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, scanned_file):
+        """ Returns the result stored in the journal for a file if it hasn't changed.
+
+        Inputs:
+         - scanned_file -- ScannedRegionFile or ScannedDataFile from world.py
+
+        Return:
+         - result -- The stored result, or None if the file has to be scanned.
+
+        """
+
+        path = abspath(scanned_file.path)
+        key = get_region_file_key(path)
+        entry = self._entries.get(path)
+        if key is not None and entry is not None and entry[0] == key:
+            return entry[1]
+
+        self._keys[path] = key
+        return None
+
+    def append(self, result):
+        """ Writes the result of the scan of a file at the end of the journal.
+
+        Inputs:
+         - result -- ScannedRegionFile or ScannedDataFile from world.py
+
+        Only files looked up with get() are written, the rest have no key to
+        check them when resuming.
+
+        """
+
+        path = abspath(result.path)
+        key = self._keys.pop(path, None)
+        if key is None:
+            return
+        self._entries[path] = (key, result)
+        pickle.dump((path, key, result), self._file, pickle.HIGHEST_PROTOCOL)
+        self._file.flush()
+        if time() - self._last_sync > JOURNAL_SYNC_TIME:
+            os.fsync(self._file.fileno())
+            self._last_sync = time()
+
+    def close(self):
+        """ Closes the journal file, it can be used later to resume the scan. """
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def remove(self):
+        """ Closes and deletes the journal file, used when the scan is finished. """
+        self._file.close()
+        os.remove(self.path)
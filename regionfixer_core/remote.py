@@ -0,0 +1,690 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#   Region Fixer.
+#   Fix your region files with a backup copy of your Minecraft world.
+#   Copyright (C) 2020  Alejandro Aguilera (Fenixin)
+#   https://github.com/Fenixin/Minecraft-Region-Fixer
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import os
+import sys
+import hmac
+import json
+import socket
+import hashlib
+import threading
+import socketserver
+import multiprocessing
+from queue import SimpleQueue
+from collections import deque
+from os.path import abspath, realpath, commonpath
+from traceback import extract_tb
+
+import regionfixer_core.constants as c
+from regionfixer_core import world
+from regionfixer_core.scan import scan_region_file, scan_data, RegionFileShard
+from regionfixer_core.results import (region_to_dict, region_from_dict,
+                                      datafile_to_dict, datafile_from_dict)
+
+
+# Increase it when the messages change, a coordinator and a worker with
+# different versions refuse to work together
+PROTOCOL_VERSION = 8
+
+# Seconds to wait while connecting to a worker, also for the handshake
+REMOTE_CONNECT_TIMEOUT = 10.0
+
+# A connection that has been idle for REMOTE_KEEPALIVE_IDLE seconds is probed
+# every REMOTE_KEEPALIVE_INTERVAL seconds, after REMOTE_KEEPALIVE_COUNT probes
+# without answer the other machine is considered dead (about a minute and a
+# half). The scan of a file can take any time, so there is no read timeout.
+REMOTE_KEEPALIVE_IDLE = 30
+REMOTE_KEEPALIVE_INTERVAL = 10
+REMOTE_KEEPALIVE_COUNT = 6
+
+# Seconds to wait for a reply where the keepalive intervals can't be set, the
+# default intervals of the system take hours to notice a dead machine
+REMOTE_READ_TIMEOUT = 3600.0
+
+# Host a worker listens on when --listen has no host, only this machine
+# can connect
+REMOTE_DEFAULT_HOST = '127.0.0.1'
+
+
+class RemoteWorkerError(Exception):
+    """ Raised when the remote workers can't be used. """
+    pass
+
+
+class RemoteScanError(Exception):
+    """ Raised when the scan of a file fails inside a remote worker, it's a bug
+    like the exceptions of the child processes of a ScanPool. """
+    pass
+
+
+def _set_keepalive(sock):
+    """ Makes a connection notice a dead machine in the other side.
+
+    The keepalive probes are sent with the intervals of REMOTE_KEEPALIVE_*. If
+    the system doesn't allow to set them the connection gets a read timeout
+    of REMOTE_READ_TIMEOUT seconds instead.
+
+    """
+
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, 'TCP_KEEPIDLE') and hasattr(socket, 'TCP_KEEPINTVL'):
+        # Linux, and Windows 10 1709 and newer
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, REMOTE_KEEPALIVE_IDLE)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, REMOTE_KEEPALIVE_INTERVAL)
+        if hasattr(socket, 'TCP_KEEPCNT'):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, REMOTE_KEEPALIVE_COUNT)
+        sock.settimeout(None)
+    elif hasattr(socket, 'SIO_KEEPALIVE_VALS'):
+        # Older Windows, the number of probes is fixed
+        sock.ioctl(socket.SIO_KEEPALIVE_VALS, (1, REMOTE_KEEPALIVE_IDLE * 1000,
+                                               REMOTE_KEEPALIVE_INTERVAL * 1000))
+        sock.settimeout(None)
+    else:
+        sock.settimeout(REMOTE_READ_TIMEOUT)
+
+
+def load_secret(path):
+    """ Reads the shared secret of the coordinator and the workers.
+
+    Inputs:
+     - path -- String with the path of the file with the secret
+
+    Return:
+     - secret -- Bytes with the contents of the file, without the white space
+                 around it.
+
+    Raises OSError if the file can't be read and ValueError if it's empty.
+
+    """
+
+    with open(path, 'rb') as f:
+        secret = f.read().strip()
+    if not secret:
+        raise ValueError("The secret file '{0}' is empty".format(path))
+    return secret
+
+
+def _sign(secret, role, nonce):
+    """ Returns the proof of knowing the secret for a nonce sent by the other
+    side. The role ('coordinator' or 'worker') is signed too, so the proof sent
+    by one side can't be replayed as the proof of the other. """
+    return hmac.new(secret, role.encode('ascii') + bytes.fromhex(nonce),
+                    hashlib.sha256).hexdigest()
+
+
+def _new_nonce():
+    return os.urandom(16).hex()
+
+
+def _is_inside(path, roots):
+    """ True if the path is inside one of the roots, the links are followed. """
+    path = realpath(path)
+    for root in roots:
+        try:
+            if commonpath([path, root]) == root:
+                return True
+        except ValueError:
+            # Different drives
+            pass
+    return False
+
+
+def parse_address(text):
+    """ Parses a 'host:port' string.
+
+    Inputs:
+     - text -- String with the address, the host can be omitted (':port')
+
+    Return:
+     - address -- Tuple (host, port), the host is '' if omitted.
+
+    Raises ValueError if the text is not a valid address.
+
+    """
+
+    host, sep, port = text.rpartition(':')
+    if not sep:
+        raise ValueError("'{0}' is not an address like host:port".format(text))
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError("'{0}' is not an address like host:port".format(text))
+    if not 0 <= port <= 65535:
+        raise ValueError("The port in '{0}' must be between 0 and 65535".format(text))
+    return host, port
+
+
+def _send(wfile, message):
+    """ Writes a message, a dictionary encoded as one line of JSON. """
+    wfile.write(json.dumps(message).encode('utf-8') + b'\n')
+    wfile.flush()
+
+
+def _receive(rfile):
+    """ Reads a message written by _send(). Returns None if the connection
+    was closed. """
+    line = rfile.readline()
+    if not line:
+        return None
+    return json.loads(line.decode('utf-8'))
+
+
+def task_to_message(task_id, scanned_obj):
+    """ Returns the message that asks a worker to scan a file.
+
+    Inputs:
+     - task_id -- Integer, the worker returns it with the result
+     - scanned_obj -- ScannedRegionFile, RegionFileShard or ScannedDataFile to scan
+
+    The paths are sent absolute, the worker must see the files in the same path
+    (shared storage). The previous results of a ScanCache are not sent, the
+    remote workers always scan all the chunks of a region file.
+
+    """
+
+    message = {'type': 'task', 'id': task_id, 'shard': None}
+    if isinstance(scanned_obj, RegionFileShard):
+        message['shard'] = [scanned_obj.index, scanned_obj.count]
+        scanned_obj = scanned_obj.scanned_file
+    if isinstance(scanned_obj, world.ScannedRegionFile):
+        message['kind'] = 'region'
+        message['folder'] = scanned_obj.folder
+    else:
+        message['kind'] = 'data'
+    message['path'] = abspath(scanned_obj.path)
+    return message
+
+
+def scan_task(message, scan_params):
+    """ Scans the file of a task message, runs in the child processes of a worker.
+
+    Inputs:
+     - message -- Dictionary, see task_to_message()
+     - scan_params -- Dictionary with the scan parameters sent by the coordinator,
+                      see ScanPool.scan_params
+
+    Return:
+     - reply -- Dictionary with the message to send back. The results use the
+                same format as the results files, see results.py. If the scan
+                fails the reply has the exception and its traceback instead.
+
+    """
+
+    reply = {'type': 'result', 'id': message['id'], 'shard': message['shard']}
+    try:
+        if message['kind'] == 'region':
+            r = world.ScannedRegionFile(message['path'], folder=message['folder'])
+            chunks = None
+            if message['shard'] is not None:
+                index, count = message['shard']
+                chunks = range(index, 1024, count)
+            # The workers never write files, see _WorkerHandler
+            result = scan_region_file(r, scan_params['entity_limit'], False, chunks, None,
+                                      scan_params['scan_depth'], scan_params['sample'],
+                                      scan_params['census'], scan_params['block_entity_limit'],
+                                      scan_params['tick_limit'])
+            to_dict = region_to_dict
+        else:
+            result = scan_data(world.ScannedDataFile(message['path']))
+            to_dict = datafile_to_dict
+        if isinstance(result, tuple):
+            except_type, except_class, tb = result[1]
+        else:
+            reply['result'] = to_dict(result)
+            return reply
+    except KeyboardInterrupt as e:
+        raise e
+    except:
+        except_type, except_class, tb = sys.exc_info()
+        tb = extract_tb(tb)
+
+    reply['type'] = 'exception'
+    reply['exception'] = "{0}: {1}".format(except_type.__name__, except_class)
+    reply['traceback'] = [list(frame) for frame in tb]
+    return reply
+
+
+class _WorkerHandler(socketserver.StreamRequestHandler):
+    """ Serves the tasks sent through one connection of a coordinator. """
+
+    def _refuse(self, message):
+        _send(self.wfile, {'type': 'error', 'message': message})
+
+    def handle(self):
+        # Nobody waits forever for a connection that doesn't say hello
+        self.request.settimeout(REMOTE_CONNECT_TIMEOUT)
+        nonce = _new_nonce()
+        _send(self.wfile, {'type': 'challenge', 'version': PROTOCOL_VERSION,
+                           'nonce': nonce})
+        try:
+            hello = _receive(self.rfile)
+        except (OSError, ValueError):
+            return
+        if not isinstance(hello, dict) or hello.get('type') != 'hello':
+            return
+        if hello.get('version') != PROTOCOL_VERSION:
+            self._refuse('The worker uses the protocol version {0}, '
+                         'not {1}'.format(PROTOCOL_VERSION, hello.get('version')))
+            return
+        auth = hello.get('auth')
+        if not (isinstance(auth, str) and
+                hmac.compare_digest(auth, _sign(self.server.secret, 'coordinator', nonce))):
+            self._refuse('Wrong secret')
+            return
+        scan_params = hello['scan_params']
+        if scan_params.get('remove_entities'):
+            self._refuse('The workers only read the files, they can\'t remove entities')
+            return
+        _send(self.wfile, {'type': 'ready', 'version': PROTOCOL_VERSION,
+                           'auth': _sign(self.server.secret, 'worker', hello['nonce']),
+                           'slots': self.server.processes})
+        # Don't keep a thread waiting forever for a coordinator that is gone
+        _set_keepalive(self.request)
+
+        while True:
+            message = _receive(self.rfile)
+            if message is None:
+                return
+            if not _is_inside(message['path'], self.server.roots):
+                _send(self.wfile, {'type': 'error', 'id': message['id'],
+                                   'message': '{0} is not in the worlds of the '
+                                              'worker'.format(message['path'])})
+                continue
+            reply = self.server.pool.apply(scan_task, (message, scan_params))
+            _send(self.wfile, reply)
+
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    """ Server that scans the files sent by coordinators, see RemoteScanPool.
+
+    Inputs:
+     - address -- Tuple (host, port) to listen on. If the host is empty only
+                  this machine can connect, see REMOTE_DEFAULT_HOST.
+     - processes -- Integer with the number of child processes used to scan
+     - secret -- Bytes with the secret shared with the coordinators, see
+                 load_secret()
+     - roots -- List with the paths of the worlds (or any folder) the worker
+                can scan. The files out of them are refused.
+
+    Every connection is served by a thread, and the scans run in a
+    multiprocessing.Pool shared by all of them. A coordinator opens one
+    connection per child process of the worker (the 'slots' of the worker).
+
+    The messages are dictionaries encoded as lines of JSON:
+     - worker: {'type': 'challenge', 'version', 'nonce'}
+     - coordinator: {'type': 'hello', 'version', 'auth', 'nonce', 'scan_params'}
+     - worker: {'type': 'ready', 'version', 'auth', 'slots'} or {'type': 'error', 'message'}
+     - coordinator: {'type': 'task', 'id', 'kind', 'path', 'folder', 'shard'}
+     - worker: {'type': 'result', 'id', 'shard', 'result'},
+               {'type': 'exception', 'id', 'shard', 'exception', 'traceback'} or
+               {'type': 'error', 'id', 'message'}
+    The last two repeat until the coordinator closes the connection.
+
+    Both sides prove they know the secret signing the nonce sent by the other
+    one, see _sign(). The secret is never sent, but the rest of the messages
+    are not encrypted. The worker never writes files, the coordinators asking
+    to remove entities are refused.
+
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, processes, secret, roots):
+        host, port = address
+        address = (host or REMOTE_DEFAULT_HOST, port)
+        self.processes = processes
+        self.secret = secret
+        self.roots = [realpath(root) for root in roots]
+        self.pool = multiprocessing.Pool(processes=processes)
+        try:
+            socketserver.ThreadingTCPServer.__init__(self, address, _WorkerHandler)
+        except:
+            self.pool.terminate()
+            raise
+
+    def server_close(self):
+        socketserver.ThreadingTCPServer.server_close(self)
+        self.pool.terminate()
+        self.pool.join()
+
+
+def serve_worker(address, processes, secret, roots):
+    """ Runs a scan worker until it's interrupted with Ctrl-C.
+
+    Inputs:
+     - address -- Tuple (host, port) to listen on
+     - processes -- Integer with the number of child processes used to scan
+     - secret -- Bytes with the secret shared with the coordinators
+     - roots -- List with the paths the worker can scan, see WorkerServer
+
+    """
+
+    server = WorkerServer(address, processes, secret, roots)
+    try:
+        host, port = server.server_address[:2]
+        print("Worker waiting for tasks in {0}:{1} with {2} processes.".format(
+            host, port, processes))
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nWorker stopped.")
+    finally:
+        server.server_close()
+
+
+class _RemoteTask:
+    """ A file to scan and the RemoteResult it belongs to. """
+
+    def __init__(self, task_id, scanned_obj, result):
+        self.id = task_id
+        self.scanned_obj = scanned_obj
+        self.result = result
+
+    @property
+    def scanned_file(self):
+        if isinstance(self.scanned_obj, RegionFileShard):
+            return self.scanned_obj.scanned_file
+        return self.scanned_obj
+
+
+class RemoteResult:
+    """ Returned by RemoteScanPool.map_async(), like multiprocessing.AsyncResult. """
+
+    def __init__(self, pool, total):
+        self._pool = pool
+        self.total = total
+        self.done = 0
+
+    def ready(self):
+        """ True when all the results are in the queue, or the scan failed. """
+        return self.done == self.total or self._pool.failed
+
+
+class _WorkerConnection:
+    """ One connection to a worker, it scans one task at a time. """
+
+    def __init__(self, address, scan_params, secret):
+        self.address = address
+        self.sock = socket.create_connection(address, REMOTE_CONNECT_TIMEOUT)
+        try:
+            self.rfile = self.sock.makefile('rb')
+            self.wfile = self.sock.makefile('wb')
+            challenge = _receive(self.rfile)
+            if challenge is None or challenge.get('type') != 'challenge':
+                raise RemoteWorkerError("The worker {0} didn't send a challenge, "
+                                        "it's not a region fixer worker".format(self.name))
+            if challenge.get('version') != PROTOCOL_VERSION:
+                raise RemoteWorkerError("The worker {0} uses the protocol version {1}, "
+                                        "not {2}".format(self.name, challenge.get('version'),
+                                                         PROTOCOL_VERSION))
+            nonce = _new_nonce()
+            _send(self.wfile, {'type': 'hello', 'version': PROTOCOL_VERSION,
+                               'auth': _sign(secret, 'coordinator', challenge['nonce']),
+                               'nonce': nonce, 'scan_params': scan_params})
+            reply = _receive(self.rfile)
+            # The scan of a file can take any time, only notice dead machines
+            _set_keepalive(self.sock)
+        except:
+            self.close()
+            raise
+        if reply is None or reply.get('type') != 'ready':
+            self.close()
+            message = reply.get('message') if reply else "connection closed"
+            raise RemoteWorkerError("The worker {0} refused the connection: {1}".format(
+                self.name, message))
+        auth = reply.get('auth')
+        if not (isinstance(auth, str) and
+                hmac.compare_digest(auth, _sign(secret, 'worker', nonce))):
+            self.close()
+            raise RemoteWorkerError("The worker {0} doesn't know the secret".format(self.name))
+        self.slots = reply['slots']
+
+    @property
+    def name(self):
+        return "{0}:{1}".format(*self.address)
+
+    def request(self, message):
+        """ Sends a task and returns the reply of the worker. """
+        _send(self.wfile, message)
+        reply = _receive(self.rfile)
+        if reply is None:
+            raise ConnectionError("connection closed")
+        if reply.get('id') != message['id']:
+            raise ConnectionError("unexpected reply")
+        return reply
+
+    def close(self):
+        """ Closes the connection, a thread waiting for a reply will get an error. """
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class RemoteScanPool:
+    """ Scans the files in remote workers, used instead of a ScanPool.
+
+    Inputs:
+     - workers -- List of tuples (host, port) of the workers, see serve_worker()
+     - secret -- Bytes with the secret shared with the workers, see load_secret()
+     - entity_limit -- An integer, threshold of entities for a chunk to be considered
+                     with too many entities
+     - scan_depth -- One of the SCAN_DEPTH_* values in constants.py, defaults to
+                     a full scan.
+     - sample -- Float, fraction of the chunks with a sane header to scan in every
+                 region file. None, the default, scans all of them.
+     - census -- Boolean, if True the entities are counted by type, see ScanPool.
+     - block_entity_limit, tick_limit -- Integers or None, the thresholds of
+                                         block entities and scheduled ticks, see ScanPool.
+
+    The workers must see the files in the same paths as this machine (for
+    example, an NFS export mounted in the same path in all the machines). The
+    workers only read the files, the entities can't be removed while scanning.
+
+    There is a thread for every slot of every worker, each of them sends one task,
+    waits for its result and puts it in the queue, like the child processes of a
+    ScanPool. If a worker is lost its tasks are sent to the rest of the workers.
+    If all the workers are lost the scan fails with a RemoteWorkerError. A scan
+    that fails inside a worker gives a RemoteScanError with its traceback.
+
+    The workers that can't be reached when the pool is created are ignored, a
+    RemoteWorkerError is raised if none of them can be used.
+
+    """
+
+    def __init__(self, workers, secret, entity_limit,
+                 scan_depth=c.SCAN_DEPTH_FULL, sample=None, census=False,
+                 block_entity_limit=None, tick_limit=None):
+        self.entity_limit = entity_limit
+        self.remove_entities = False
+        self.scan_depth = scan_depth
+        self.sample = sample
+        self.census = census
+        self.block_entity_limit = block_entity_limit
+        self.tick_limit = tick_limit
+
+        self.queue = SimpleQueue()
+        self.failed = False
+
+        self._tasks = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._terminated = False
+        self._next_id = 0
+
+        self._connections = []
+        for address in workers:
+            try:
+                conn = _WorkerConnection(address, self.scan_params, secret)
+                self._connections.append(conn)
+                for i in range(conn.slots - 1):
+                    self._connections.append(_WorkerConnection(address, self.scan_params,
+                                                               secret))
+            except (OSError, ValueError, RemoteWorkerError) as e:
+                print("Warning: The worker {0}:{1} can't be used: {2}".format(
+                    address[0], address[1], e))
+        if not self._connections:
+            raise RemoteWorkerError("None of the remote workers can be used.")
+
+        self.processes = len(self._connections)
+        self._alive = len(self._connections)
+        self._threads = []
+        for conn in self._connections:
+            t = threading.Thread(target=self._run_connection, args=(conn,), daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+            self.join()
+        else:
+            self.terminate()
+
+    @property
+    def scan_params(self):
+        """ Dictionary with the parameters that change the results of a scan,
+        see ScanPool.scan_params. """
+        return {'entity_limit': self.entity_limit,
+                'remove_entities': self.remove_entities,
+                'scan_depth': self.scan_depth,
+                'sample': self.sample,
+                'census': self.census,
+                'block_entity_limit': self.block_entity_limit,
+                'tick_limit': self.tick_limit}
+
+    def map_async(self, function, iterable, chunksize):
+        """ Send the tasks to the workers.
+
+        Inputs:
+         - function -- Ignored, the workers always use scan_task(). It's here to be
+                       used like ScanPool.map_async().
+         - iterable -- List of batches of files, see scan.schedule_tasks(). The
+                       files are sent one by one, the order is kept.
+         - chunksize -- Ignored
+
+        Return:
+         - result -- A RemoteResult, its ready() tells when the scan is done.
+
+        """
+
+        scanned_objs = [obj for batch in iterable for obj in batch]
+        result = RemoteResult(self, len(scanned_objs))
+        with self._cond:
+            for obj in scanned_objs:
+                self._tasks.append(_RemoteTask(self._next_id, obj, result))
+                self._next_id += 1
+            self._cond.notify_all()
+        return result
+
+    def _get_task(self):
+        """ Waits for a task to send. Returns None when the thread has to exit. """
+        with self._cond:
+            while not (self._tasks or self._closed or self._terminated or self.failed):
+                self._cond.wait()
+            if self._terminated or self.failed or not self._tasks:
+                return None
+            return self._tasks.popleft()
+
+    def _run_connection(self, conn):
+        """ Sends tasks through a connection until the pool is closed. """
+        while True:
+            task = self._get_task()
+            if task is None:
+                break
+            try:
+                reply = conn.request(task_to_message(task.id, task.scanned_obj))
+            except (OSError, ValueError) as e:
+                self._lose_connection(conn, task, e)
+                return
+            self.queue.put(self._get_scan_result(task, reply, conn))
+            with self._cond:
+                task.result.done += 1
+        conn.close()
+
+    def _lose_connection(self, conn, task, error):
+        """ Gives the task of a lost connection to the rest of the workers. """
+        conn.close()
+        with self._cond:
+            if self._terminated:
+                return
+            self._alive -= 1
+            self._tasks.appendleft(task)
+            if self._alive:
+                print("\nWarning: Lost a connection with the worker {0} ({1}), "
+                      "its task will be scanned by other workers.".format(conn.name, error))
+            else:
+                self.failed = True
+                e = RemoteWorkerError("Lost the connection with all the remote workers, "
+                                      "the last one was {0} ({1})".format(conn.name, error))
+                self.queue.put((task.scanned_file, (RemoteWorkerError, e, [])))
+            self._cond.notify_all()
+
+    def _get_scan_result(self, task, reply, conn):
+        """ Returns the scanned file of a reply, or an exception tuple like the
+        ones of the child processes of a ScanPool. """
+        scanned_file = task.scanned_file
+        if reply['type'] == 'error':
+            e = RemoteWorkerError("The worker {0} refused a task: {1}".format(
+                conn.name, reply['message']))
+            return scanned_file, (RemoteWorkerError, e, [])
+        if reply['type'] != 'result':
+            e = RemoteScanError("{0} in the worker {1}".format(reply['exception'], conn.name))
+            return scanned_file, (RemoteScanError, e, reply['traceback'])
+
+        if isinstance(scanned_file, world.ScannedRegionFile):
+            result = region_from_dict(reply['result'])
+            if reply['shard'] is not None:
+                result.shard = tuple(reply['shard'])
+        else:
+            result = datafile_from_dict(reply['result'])
+        # The files were sent with absolute paths
+        result.path = scanned_file.path
+        result.folder = scanned_file.folder
+        return result
+
+    def close(self):
+        """ No more tasks will be sent, the connections are closed once the
+        tasks are done. """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def join(self):
+        """ Wait for the tasks to be done, close() has to be called first. """
+        for t in self._threads:
+            t.join()
+
+    def terminate(self):
+        """ Stop sending tasks and close all the connections right now. """
+        with self._cond:
+            self._terminated = True
+            self._closed = True
+            self._cond.notify_all()
+        for conn in self._connections:
+            conn.close()
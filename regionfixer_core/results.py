@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#   Region Fixer.
+#   Fix your region files with a backup copy of your Minecraft world.
+#   Copyright (C) 2020  Alejandro Aguilera (Fenixin)
+#   https://github.com/Fenixin/Minecraft-Region-Fixer
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import json
+
+from regionfixer_core import world
+from regionfixer_core.census import EntityCensus
+from regionfixer_core.sizes import SectorUsage
+
+
+# Increase it when the format of the results file changes
+RESULTS_VERSION = 1
+
+
+class ResultsFileError(Exception):
+    """ Raised when a results file can't be used. """
+    pass
+
+
+def region_to_dict(scanned_regionfile):
+    """ Returns a dictionary with the results of a ScannedRegionFile.
+
+    The chunks are stored as a list of [x, z, number of entities, status], and
+    their sizes as a list of [x, z, size, uncompressed size]. The chunks over
+    the block entity or tick limits are in a list of [x, z, statuses], see
+    ScannedRegionFile.set_chunk_overloads(). The census is None if the scan
+    didn't make one, the usage if the file has no header.
+    """
+
+    r = scanned_regionfile
+    return {'path': r.path,
+            'folder': r.folder,
+            'status': r.status,
+            'scan_time': r.scan_time,
+            'scanned': r.scanned,
+            'sample': r.sample,
+            'chunks': [[x, z] + list(r[(x, z)]) for x, z in r.keys()],
+            'sizes': [[x, z] + list(r.get_chunk_size((x, z))) for x, z in r.keys()],
+            'overloads': [[x, z, r.get_chunk_overloads((x, z))] for x, z in r.keys()
+                          if r.get_chunk_overloads((x, z))],
+            'census': r.census.to_dict() if r.census is not None else None,
+            'usage': r.usage.to_dict() if r.usage is not None else None}
+
+
+def region_from_dict(d):
+    """ Returns a ScannedRegionFile with the results stored by region_to_dict(). """
+
+    r = world.ScannedRegionFile(d['path'], d['scan_time'], d['folder'])
+    r.status = d['status']
+    r.scanned = d['scanned']
+    r.sample = tuple(d['sample']) if d['sample'] is not None else None
+    for x, z, num_entities, status in d['chunks']:
+        r[(x, z)] = (num_entities, status)
+    for x, z, size, raw_size in d.get('sizes', []):
+        r.set_chunk_size((x, z), size, raw_size)
+    for x, z, overloads in d.get('overloads', []):
+        r.set_chunk_overloads((x, z), overloads)
+    if d.get('census') is not None:
+        r.census = EntityCensus.from_dict(d['census'])
+    if d.get('usage') is not None:
+        r.usage = SectorUsage.from_dict(d['usage'])
+    return r
+
+
+def datafile_to_dict(scanned_datafile):
+    """ Returns a dictionary with the results of a ScannedDataFile. """
+    return {'path': scanned_datafile.path,
+            'status': scanned_datafile.status}
+
+
+def datafile_from_dict(d):
+    """ Returns a ScannedDataFile with the results stored by datafile_to_dict(). """
+    f = world.ScannedDataFile(d['path'])
+    f.status = d['status']
+    return f
+
+
+def _scanned(data_set):
+    """ Returns the scanned files of a DataSet. """
+    return [f for f in data_set._get_list() if f.status is not None]
+
+
+def save_results(path, world_list, regionset, scan_params, shard=None):
+    """ Writes the results of a scan to a JSON file.
+
+    Inputs:
+     - path -- String with the path of the results file.
+     - world_list -- List of scanned World objects
+     - regionset -- RegionSet with the scanned separate region files
+     - scan_params -- Dictionary with the scan parameters, see ScanPool.scan_params
+     - shard -- Tuple (index, count) if only a shard of the region files has
+                been scanned, see World.keep_shard(). None for a whole scan.
+
+    JSON is used instead of pickle so the file can be read by any version of
+    python in any machine. Only the scanned files are written, so the results of
+    every shard can be merged with load_results().
+
+    """
+
+    worlds = []
+    for w in world_list:
+        worlds.append({'path': w.path,
+                       'regionsets': [{'path': rs.path,
+                                       'regions': [region_to_dict(r) for r in _scanned(rs)]}
+                                      for rs in w.regionsets],
+                       'datafilesets': [{'path': ds.path,
+                                         'files': [datafile_to_dict(f) for f in _scanned(ds)]}
+                                        for ds in w.datafilesets]})
+    results = {'version': RESULTS_VERSION,
+               'shard': shard,
+               'scan_params': scan_params,
+               'worlds': worlds,
+               'regions': [region_to_dict(r) for r in _scanned(regionset)]}
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(results, f)
+    os.replace(tmp_path, path)
+
+
+def _add_region(regionset, r):
+    regionset._replace_in_data_structure(r)
+    regionset._update_counts(r)
+
+
+def load_results(paths):
+    """ Merges the results files written by save_results().
+
+    Inputs:
+     - paths -- List of strings with the paths of the results files
+
+    Return:
+     - world_list -- List of World objects with the results of all the files
+     - regionset -- RegionSet with the results of the separate region files
+
+    The worlds are opened again from their paths, so they have to be in the
+    same place as when they were scanned (for example, an NFS export mounted
+    in the same path in all the machines). The counters of every set are
+    updated as if the results came from a scan.
+
+    Raises ResultsFileError if a file can't be read, or if the files are from
+    scans with different options.
+
+    """
+
+    all_results = []
+    for path in paths:
+        try:
+            with open(path) as f:
+                results = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ResultsFileError("The results file {0} can't be read: {1}".format(path, e))
+        if results.get('version') != RESULTS_VERSION:
+            raise ResultsFileError("The results file {0} has an unknown format.".format(path))
+        all_results.append(results)
+
+    if any(r['scan_params'] != all_results[0]['scan_params'] for r in all_results):
+        raise ResultsFileError("The results files are from scans with different options.")
+
+    shards = [tuple(r['shard']) for r in all_results if r['shard'] is not None]
+    if shards:
+        count = shards[0][1]
+        missing = set(range(count)) - set(i for i, n in shards if n == count)
+        if len(shards) != len(all_results) or any(n != count for i, n in shards):
+            raise ResultsFileError("The results files are from different shardings.")
+        if missing:
+            print("Warning: The results of the shards {0} of {1} are missing.".format(
+                ", ".join(str(i + 1) for i in sorted(missing)), count))
+
+    worlds = {}
+    region_list = []
+    for results in all_results:
+        for d in results['worlds']:
+            if d['path'] not in worlds:
+                worlds[d['path']] = world.World(d['path'])
+            w = worlds[d['path']]
+            regionsets = dict((rs.path, rs) for rs in w.regionsets)
+            for rs_dict in d['regionsets']:
+                if rs_dict['path'] not in regionsets:
+                    raise ResultsFileError("The region set {0} is not in the world {1}.".format(
+                        rs_dict['path'], d['path']))
+                for r_dict in rs_dict['regions']:
+                    _add_region(regionsets[rs_dict['path']], region_from_dict(r_dict))
+            datafilesets = dict((ds.path, ds) for ds in w.datafilesets)
+            for ds_dict in d['datafilesets']:
+                ds = datafilesets[ds_dict['path']]
+                for f_dict in ds_dict['files']:
+                    f = datafile_from_dict(f_dict)
+                    ds._replace_in_data_structure(f)
+                    ds._update_counts(f)
+        region_list.extend(results['regions'])
+
+    regionset = world.RegionSet()
+    for r_dict in region_list:
+        _add_region(regionset, region_from_dict(r_dict))
+
+    world_list = list(worlds.values())
+    for w in world_list:
+        # Only the files in the results count, the results replace the files
+        # found in the world so they keep the same order as in a scan
+        for ds in w.regionsets + w.datafilesets:
+            for key, f in list(ds._set.items()):
+                if f.status is None:
+                    del ds._set[key]
+        w.scanned = True
+    regionset.scanned = bool(region_list)
+
+    return world_list, regionset
@@ -23,12 +23,20 @@
 
 
 import sys
+import zlib
+import random
 import logging
+import queue
 import multiprocessing
-from os.path import split, abspath, join
+from multiprocessing.pool import ThreadPool
+from os.path import split, abspath, join, getsize
 from time import sleep, time
-from copy import copy
+from copy import deepcopy
+from functools import partial
+from math import ceil
+from collections import deque
 from traceback import extract_tb
+from io import BytesIO
 
 import nbt.region as region
 import nbt.nbt as nbt
@@ -43,6 +51,8 @@ from progressbar import ProgressBar, Bar, AdaptiveETA, SimpleProgress
 import regionfixer_core.constants as c
 from regionfixer_core.util import entitle
 from regionfixer_core import world
+from regionfixer_core.census import EntityCensus, read_entity_ids
+from regionfixer_core.sizes import SectorUsage
 
 
 
@@ -121,85 +131,522 @@ class ChildProcessException(Exception):
         return error_log_path
 
 
-def multiprocess_scan_data(data):
-    """ Does the multithread stuff for scan_data """
+def multiprocess_scan_data(data, params, data_results=None):
+    """ Does the multithread stuff for scan_data
+
+    If data_results is a list the result is appended to it as a tuple
+    (path, status) instead of being put in the queue, see multiprocess_scan_batch().
+    Exceptions are always put in the queue.
+    """
     # Protect everything so an exception will be returned from the worker
     try:
         result = scan_data(data)
-        multiprocess_scan_data.q.put(result)
+        if data_results is not None and not isinstance(result, tuple):
+            data_results.append((result.path, result.status))
+        else:
+            params['queue'].put(result)
     except KeyboardInterrupt as e:
         raise e
     except:
         except_type, except_class, tb = sys.exc_info()
         s = (data, (except_type, except_class, extract_tb(tb)))
-        multiprocess_scan_data.q.put(s)
+        params['queue'].put(s)
 
 
-def multiprocess_scan_regionfile(region_file):
-    """ Does the multithread stuff for scan_region_file """
+def multiprocess_scan_regionfile(region_file, params, shard=None):
+    """ Does the multithread stuff for scan_region_file
+
+    If shard is a RegionFileShard only the chunks of the shard are scanned.
+    """
     # Protect everything so an exception will be returned from the worker
     try:
         r = region_file
-        entity_limit = multiprocess_scan_regionfile.entity_limit
-        remove_entities = multiprocess_scan_regionfile.remove_entities
+        # Don't send the previous results back to the father process
+        previous = r.previous_scan
+        r.previous_scan = None
+        chunks = shard.chunks if shard is not None else None
         # call the normal scan_region_file with this parameters
-        r = scan_region_file(r, entity_limit, remove_entities)
-        multiprocess_scan_regionfile.q.put(r)
+        r = scan_region_file(r, params['entity_limit'], params['remove_entities'],
+                             chunks, previous, params['scan_depth'], params['sample'],
+                             params['census'], params['block_entity_limit'],
+                             params['tick_limit'])
+        if shard is not None and not isinstance(r, tuple):
+            r.shard = (shard.index, shard.count)
+        params['queue'].put(r)
     except KeyboardInterrupt as e:
         raise e
     except:
         except_type, except_class, tb = sys.exc_info()
         s = (region_file, (except_type, except_class, extract_tb(tb)))
-        multiprocess_scan_regionfile.q.put(s)
+        params['queue'].put(s)
+
+
+def multiprocess_scan(scanned_obj, params):
+    """ Does the multithread stuff for scan_region_file and scan_data.
+
+    Used when region files and data files are sent to the pool together.
+    """
+    if isinstance(scanned_obj, world.ScannedRegionFile):
+        multiprocess_scan_regionfile(scanned_obj, params)
+    elif isinstance(scanned_obj, RegionFileShard):
+        multiprocess_scan_regionfile(scanned_obj.scanned_file, params, scanned_obj)
+    else:
+        multiprocess_scan_data(scanned_obj, params)
+
+
+def multiprocess_scan_batch(batch, params=None):
+    """ Scan a list of data/region files, see schedule_tasks().
+
+    Every region file scanned puts its own result in the queue, so the results
+    still arrive one by one. The results of the data files are small and quick
+    to get, sending them one by one costs more than scanning them. They are put
+    in the queue together at the end of the batch, as one list of tuples
+    (path, status), see AsyncScanner._store_data_file_results().
+
+    The params are the queue and the scan parameters, see _mp_pool_init(). They
+    are None in the child processes of a ScanPool, _mp_pool_init() stored them
+    in this function.
+    """
+    if params is None:
+        params = multiprocess_scan_batch.params
+    data_results = []
+    for scanned_obj in batch:
+        if isinstance(scanned_obj, world.ScannedDataFile):
+            multiprocess_scan_data(scanned_obj, params, data_results)
+        else:
+            multiprocess_scan(scanned_obj, params)
+    if data_results:
+        params['queue'].put(data_results)
+
+
+def _scan_batch_copies(function, params, batch):
+    """ Runs a task of the threads or the inline executor of a ScanPool.
+
+    The scanned files are modified by the scan and the shards of a region file
+    share it, the child processes get their own copies when the tasks are
+    pickled. Here every file is copied right before it's scanned, the copies of
+    a batch are not made until a worker gets to it.
+    """
+    return function((deepcopy(obj) for obj in batch), params=params)
 
 
-def _mp_data_pool_init(d):
-    """ Function to initialize the multiprocessing in scan_dataset.
+class RegionFileShard:
+    """ A part of the chunks of a region file, scanned as a separate task.
 
     Inputs:
-    - d -- Dictionary containing the information to copy to the function of the child process.
+     - scanned_file -- ScannedRegionFile object from world.py
+     - index -- Integer, number of this shard, from 0 to count - 1
+     - count -- Integer, number of shards the region file is split into
 
-    This function adds the queue to each of the child processes objects. This queue
-    is used to get the results from the child process. 
+    The chunks of the shard are the ones with header index (x + z * 32)
+    equal to index modulo count. Interleaving the chunks balances the work
+    better than contiguous ranges, heavy chunks tend to be close together.
 
     """
 
-    assert isinstance(d, dict)
-    assert 'queue' in d
-    multiprocess_scan_data.q = d['queue']
+    def __init__(self, scanned_file, index, count):
+        self.scanned_file = scanned_file
+        self.index = index
+        self.count = count
+        self.chunks = range(index, 1024, count)
 
 
-def _mp_regionset_pool_init(d):
-    """ Function to initialize the multiprocessing in scan_regionset.
-    
+# Region files bigger than this are split in shards if there are several
+# child processes, see split_region_file()
+SHARD_MIN_FILE_SIZE = 8 * 1024 * 1024
+# Approximate size of every shard
+SHARD_TARGET_SIZE = 4 * 1024 * 1024
+
+
+def split_region_file(scanned_file, size, processes):
+    """ Split a big region file in RegionFileShards.
+
+    Inputs:
+     - scanned_file -- ScannedRegionFile object from world.py
+     - size -- Integer, size of the region file in bytes
+     - processes -- Integer with the number of child processes of the pool.
+
+    Return:
+     - shards -- List of RegionFileShard objects. An empty list if the region
+                 file is not worth splitting.
+
+    A region file with a lot of heavy chunks can take a long time to scan, and
+    it would be scanned by only one child process. Every shard parses again the
+    8 KiB header of the region file, which is cheap compared with decompressing
+    and parsing the chunks. The results are merged in the father process with
+    ScannedRegionFile.merge_shard().
+
+    """
+
+    if processes < 2 or size < SHARD_MIN_FILE_SIZE:
+        return []
+    count = min(processes, -(-size // SHARD_TARGET_SIZE))
+    return [RegionFileShard(scanned_file, i, count) for i in range(count)]
+
+
+def collect_shard(pending, scanned_file):
+    """ Merge the result of a shard with the rest of the shards of its region file.
+
+    Inputs:
+     - pending -- Dictionary used to store the partial results, keys are the
+                  paths of the region files.
+     - scanned_file -- ScannedRegionFile with the results of one shard
+
+    Return:
+     - merged -- ScannedRegionFile with the results of all the shards if this
+                 was the last one, None otherwise.
+
+    """
+
+    index, count = scanned_file.shard
+    scanned_file.shard = None
+    path = scanned_file.path
+    if path not in pending:
+        pending[path] = [scanned_file, 1]
+    else:
+        pending[path][0].merge_shard(scanned_file)
+        pending[path][1] += 1
+    if pending[path][1] == count:
+        return pending.pop(path)[0]
+    return None
+
+
+# The size of the batches is adapted so there are around this number of
+# batches per child process for the remaining files. See schedule_tasks()
+SCHEDULE_BATCHES_PER_PROCESS = 4
+# Files smaller than this are cheap to scan, they can always be grouped up
+# to this amount of bytes
+SCHEDULE_MIN_BATCH_BYTES = 1024 * 1024
+
+
+def _get_file_size(scanned_file):
+    """ Returns the size in bytes of the file of a ScannedRegionFile/ScannedDataFile. """
+    size = getattr(scanned_file, 'file_size', None)
+    if size is not None:
+        return size
+    try:
+        return getsize(scanned_file.path)
+    except (OSError, TypeError):
+        return 0
+
+
+def schedule_tasks(scanned_files, processes, split=False):
+    """ Sort the files by size and group them in batches to send to the pool.
+
+    Inputs:
+     - scanned_files -- List of ScannedRegionFile/ScannedDataFile objects to scan.
+     - processes -- Integer with the number of child processes of the pool.
+     - split -- Boolean, if True the big region files are split in
+                RegionFileShards, see split_region_file().
+
+    Return:
+     - batches -- List of lists of scanned files (and shards), the biggest
+                  files first.
+
+    The time needed to scan a file is more or less proportional to its size. Sending
+    the biggest files first (longest processing time first) avoids ending the scan
+    with one child process scanning a huge region file while the rest wait.
+
+    The batches are made smaller as the files left get fewer and smaller (guided
+    scheduling). A batch never has more than the remaining files or bytes divided
+    by SCHEDULE_BATCHES_PER_PROCESS * processes (but small files can always be
+    grouped up to SCHEDULE_MIN_BATCH_BYTES), and the big files go alone in
+    their batch. This way there are few tasks when there are a lot of small files
+    and the end of the scan is well balanced.
+
+    """
+
+    sized = []
+    for f in scanned_files:
+        size = _get_file_size(f)
+        shards = []
+        if split and isinstance(f, world.ScannedRegionFile):
+            shards = split_region_file(f, size, processes)
+        if shards:
+            sized.extend((size // len(shards), shard) for shard in shards)
+        else:
+            sized.append((size, f))
+    sized.sort(key=lambda t: t[0], reverse=True)
+    divisor = SCHEDULE_BATCHES_PER_PROCESS * max(1, processes)
+    remaining_files = len(sized)
+    remaining_bytes = sum(size for size, f in sized)
+
+    batches = []
+    i = 0
+    while i < len(sized):
+        max_files = max(1, remaining_files // divisor)
+        max_bytes = max(sized[i][0], remaining_bytes // divisor,
+                        SCHEDULE_MIN_BATCH_BYTES)
+        batch = []
+        batch_bytes = 0
+        while (i < len(sized) and len(batch) < max_files and
+               batch_bytes + sized[i][0] <= max_bytes):
+            size, f = sized[i]
+            batch.append(f)
+            batch_bytes += size
+            i += 1
+        batches.append(batch)
+        remaining_files -= len(batch)
+        remaining_bytes -= batch_bytes
+
+    return batches
+
+
+def _mp_pool_init(d):
+    """ Function to initialize the child processes of a ScanPool.
+
     Inputs:
     - d -- Dictionary containing the information to copy to the function of the child process.
 
-    This function adds the queue to each of the child processes objects. This queue
-    is used to get the results from the child process. 
+    This function adds the queue and the scan parameters to multiprocess_scan_batch() in
+    each of the child processes. This queue is used to get the results from the child
+    process.
+
+    Only the scan parameters are passed, never the data sets. The initargs are
+    pickled once per child process, so passing a whole regionset would make the
+    start up of every worker grow with the size of the world.
 
     """
 
     assert isinstance(d, dict)
-    assert 'regionset' in d
-    assert 'queue' in d
-    assert 'entity_limit' in d
-    assert 'remove_entities' in d
-    multiprocess_scan_regionfile.regionset = d['regionset']
-    multiprocess_scan_regionfile.q = d['queue']
-    multiprocess_scan_regionfile.entity_limit = d['entity_limit']
-    multiprocess_scan_regionfile.remove_entities = d['remove_entities']
+    assert set(d) == set(['queue', 'entity_limit', 'remove_entities', 'scan_depth',
+                          'sample', 'census', 'block_entity_limit', 'tick_limit'])
+    multiprocess_scan_batch.params = d
+
+
+class _InlineQueue:
+    """ Queue of an InlinePool, runs the next task when it has no results. """
+
+    def __init__(self):
+        self._items = deque()
+        self._tasks = deque()
+
+    def put(self, item):
+        self._items.append(item)
+
+    def _run_next(self):
+        function, args = self._tasks.popleft()
+        function(*args)
+
+    def _run_pending(self):
+        while not self._items and self._tasks:
+            self._run_next()
+
+    def empty(self):
+        self._run_pending()
+        return not self._items
+
+    def get(self):
+        self._run_pending()
+        return self._items.popleft()
+
+
+class _InlineResult:
+    """ Returned by InlinePool.map_async(), like multiprocessing.AsyncResult. """
+
+    def __init__(self, inline_queue):
+        self._queue = inline_queue
+
+    def ready(self):
+        return not self._queue._tasks
+
+
+class InlinePool:
+    """ Runs the tasks in this process, one by one, without any concurrency.
+
+    Inputs:
+     - inline_queue -- An _InlineQueue, the tasks put their results in it
+
+    It's used like a multiprocessing.Pool, but the tasks are only run when
+    the queue is asked for results and it has none. This way the scan
+    advances at the pace it's consumed and it can be stopped at any moment.
+
+    """
+
+    def __init__(self, inline_queue):
+        self._queue = inline_queue
+
+    def map_async(self, function, iterable, chunksize):
+        """ Queue the tasks, one for every file of every batch. """
+        for batch in iterable:
+            for scanned_obj in batch:
+                self._queue._tasks.append((function, ([scanned_obj],)))
+        return _InlineResult(self._queue)
+
+    def close(self):
+        pass
+
+    def join(self):
+        """ Run the tasks left, their results stay in the queue. """
+        while self._queue._tasks:
+            self._queue._run_next()
+
+    def terminate(self):
+        """ Drop the tasks left. """
+        self._queue._tasks.clear()
+
+
+class ScanPool:
+    """ Pool of workers shared by all the scanners of a scan session.
+
+    Inputs:
+     - processes -- Integer with the number of child processes (or threads) to use
+                    for the scan
+     - entity_limit -- An integer, threshold of entities for a chunk to be considered
+                     with too many entities
+     - remove_entities -- A boolean, defaults to False, to remove the entities while
+                         scanning.
+     - scan_depth -- One of the SCAN_DEPTH_* values in constants.py, defaults to
+                     a full scan.
+     - sample -- Float, fraction of the chunks with a sane header to scan in every
+                 region file. None, the default, scans all of them.
+     - executor -- One of the EXECUTOR_* values in constants.py, defaults to
+                   child processes. Threads avoid starting processes, which is
+                   slow for small worlds and not always possible when region
+                   fixer is used as a library. The inline executor scans the files
+                   in this process, one at a time, as the results are asked for.
+     - census -- Boolean, if True the entities of every region file are counted
+                 by type, see EntityCensus in census.py. Only with a full scan.
+     - block_entity_limit -- An integer, threshold of block entities for a chunk to
+                             be considered with too many block entities. None, the
+                             default, doesn't check them. Only with a full scan.
+     - tick_limit -- An integer, threshold of scheduled ticks (of blocks and fluids)
+                     for a chunk to be considered with too many ticks. None, the
+                     default, doesn't check them. Only with a full scan.
+
+    Creating a multiprocessing.Pool means forking/spawning all the child processes
+    and importing all the modules in them. Instead of paying that for every data set
+    and region set, the pool is created once and every AsyncScanner uses it. The
+    results of all the scanners go through the same queue, this is fine because
+    the scanners are run one after another.
+
+    All the executors run the same functions and give the same results. The
+    threads and the inline executor scan copies of the files, like the child
+    processes do.
+
+    Call close() and join() (or use it as a context manager) when all the scans
+    are done.
+
+    """
+
+    def __init__(self, processes, entity_limit, remove_entities=False,
+                 scan_depth=c.SCAN_DEPTH_FULL, sample=None,
+                 executor=c.EXECUTOR_PROCESS, census=False,
+                 block_entity_limit=None, tick_limit=None):
+        if executor not in c.EXECUTORS:
+            raise ValueError("Unknown executor: {0}".format(executor))
+        # There is no concurrency inline, splitting region files in shards is useless
+        self.processes = processes if executor != c.EXECUTOR_INLINE else 1
+        self.entity_limit = entity_limit
+        self.remove_entities = remove_entities
+        self.scan_depth = scan_depth
+        self.sample = sample
+        self.executor = executor
+        self.census = census
+        self.block_entity_limit = block_entity_limit
+        self.tick_limit = tick_limit
+
+        # Queue used by the workers to pass results
+        if executor == c.EXECUTOR_PROCESS:
+            self.queue = multiprocessing.SimpleQueue()
+        elif executor == c.EXECUTOR_THREAD:
+            self.queue = queue.SimpleQueue()
+        else:
+            self.queue = _InlineQueue()
+        self._params = {'queue': self.queue,
+                        'entity_limit': entity_limit,
+                        'remove_entities': remove_entities,
+                        'scan_depth': scan_depth,
+                        'sample': sample,
+                        'census': census,
+                        'block_entity_limit': block_entity_limit,
+                        'tick_limit': tick_limit}
+
+        if executor == c.EXECUTOR_PROCESS:
+            # NOTE TO SELF: initargs doesn't handle kwargs, only args!
+            # Pass a dict with all the args
+            self._pool = multiprocessing.Pool(processes=processes,
+                                              initializer=_mp_pool_init,
+                                              initargs=(self._params,))
+        elif executor == c.EXECUTOR_THREAD:
+            self._pool = ThreadPool(processes=processes)
+        else:
+            self._pool = InlinePool(self.queue)
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+            self.join()
+        else:
+            self.terminate()
+
+    @property
+    def scan_params(self):
+        """ Dictionary with the parameters that change the results of a scan.
+
+        Used to know if the results stored in a ScanCache are still valid.
+        """
+        return {'entity_limit': self.entity_limit,
+                'remove_entities': self.remove_entities,
+                'scan_depth': self.scan_depth,
+                'sample': self.sample,
+                'census': self.census,
+                'block_entity_limit': self.block_entity_limit,
+                'tick_limit': self.tick_limit}
+
+    def map_async(self, function, iterable, chunksize):
+        """ Send the tasks to the workers, see multiprocessing.Pool.map_async()
+
+        The function gets the queue and the scan parameters as the keyword
+        argument params, except in the child processes, see _mp_pool_init().
+        """
+        if self.executor == c.EXECUTOR_PROCESS:
+            return self._pool.map_async(function, iterable, chunksize)
+
+        # The scanned files are copied by the task, see _scan_batch_copies()
+        return self._pool.map_async(partial(_scan_batch_copies, function, self._params),
+                                    iterable, chunksize)
+
+    def close(self):
+        """ No more tasks will be sent, the child processes will exit once the
+        tasks are done. """
+        if not self._closed:
+            self._closed = True
+            self._pool.close()
+
+    def join(self):
+        """ Wait for the child processes to exit, close() has to be called first. """
+        self._pool.join()
+
+    def terminate(self):
+        """ Terminate the child processes, this will exit no matter what. """
+        self._closed = True
+        self._pool.terminate()
 
 
 class AsyncScanner:
     """ Class to derive all the scanner classes from.
 
     Inputs:
-     - data_structure -- Is one of the objects in world: DataSet, RegionSet
-     - processes -- Integer with the number of child processes to use for the scan
-     - scan_function -- Function used to scan the data
-     - init_args -- These are the initialization arguments passed to __init__
-     - _mp_init_function -- Function used to initialize the child processes
+     - data_structures -- One of the objects in world: DataSet, RegionSet, or
+                          a list of them to scan all of them at once
+     - pool -- ScanPool used to run the scan, or a RemoteScanPool from remote.py
+     - own_pool -- Boolean, True if the pool was created only for this scanner and
+                   it has to be closed once the tasks are sent
+     - cache -- A ScanCache from cache.py, defaults to None. The region files that
+                haven't changed since they were stored in the cache are not
+                scanned, their cached results are used.
+     - journal -- A ScanJournal from journal.py, defaults to None. Every result is
+                  written to it, and the files already in it are not scanned again.
+     - max_pending -- Integer, maximum number of tasks sent to the pool whose
+                      results haven't been taken with get_last_result(). The
+                      rest of the tasks are sent as the results are taken, this
+                      way a slow consumer doesn't fill the memory with results.
+                      None, the default, sends all the tasks at once.
     
     To implement a scanner you have to override:
     update_str_last_scanned()
@@ -209,23 +656,52 @@ class AsyncScanner:
 
     """
 
-    def __init__(self, data_structure, processes, scan_function, init_args,
-                 _mp_init_function):
+    def __init__(self, data_structures, pool, own_pool=False, cache=None,
+                 journal=None, max_pending=None):
         """ Init the scanner """
-        assert isinstance(data_structure, world.DataSet)
-        self.data_structure = data_structure
-        self.list_files_to_scan = data_structure._get_list()
-        self.processes = processes
-        self.scan_function = scan_function
-
-        # Queue used by processes to pass results
-        self.queue = multiprocessing.SimpleQueue()
-        init_args.update({'queue': self.queue})
-        # NOTE TO SELF: initargs doesn't handle kwargs, only args!
-        # Pass a dict with all the args
-        self.pool = multiprocessing.Pool(processes=processes,
-                                         initializer=_mp_init_function,
-                                         initargs=(init_args,))
+        if isinstance(data_structures, world.DataSet):
+            data_structures = [data_structures]
+        assert all(isinstance(ds, world.DataSet) for ds in data_structures)
+        # A ScanPool, or anything used like it (see remote.RemoteScanPool)
+        assert hasattr(pool, 'map_async') and hasattr(pool, 'queue')
+        self.data_structures = data_structures
+        self.processes = pool.processes
+
+        self.pool = pool
+        self.queue = pool.queue
+        self._own_pool = own_pool
+        self.cache = cache
+        self.journal = journal
+        assert max_pending is None or max_pending > 0
+        self.max_pending = max_pending
+
+        # Paths are unique, use them to know to which set a result belongs
+        self.list_files_to_scan = []
+        self._owners = {}
+        for ds in self.data_structures:
+            for scanned_file in ds._get_files_to_scan():
+                self.list_files_to_scan.append(scanned_file)
+                self._owners[scanned_file.path] = ds
+
+        # Number of files scanned in every set, and in total
+        self._scanned = dict((id(ds), 0) for ds in self.data_structures)
+        self.counter = 0
+
+        # AsyncResults of the tasks sent to the pool, None until scan() is called
+        self._results = None
+        # Batches of files not sent yet to the pool, and number of tasks sent
+        # whose results are not in the queue yet, see max_pending
+        self._batches = deque()
+        self._pending_tasks = 0
+
+        # Results taken from the journal or the cache, returned before the
+        # ones from the queue
+        self._cached_results = deque()
+        # Data files already stored in their set, see _store_data_file_results()
+        self._stored_results = deque()
+
+        # Results of the region files split in shards, see collect_shard()
+        self._pending_shards = {}
 
         # Recommended time to sleep between polls for results
         self.SCAN_START_SLEEP_TIME = 0.001
@@ -240,6 +716,42 @@ class AsyncScanner:
         # Holds a friendly string with the name of the last file scanned
         self._str_last_scanned = None
 
+    @property
+    def data_structure(self):
+        """ The first (usually the only) set scanned. """
+        return self.data_structures[0]
+
+    def _get_files_already_scanned(self):
+        """ Take the results of the files from the journal and the cache.
+
+        Return:
+         - to_scan -- List with the files that need to be scanned.
+
+        """
+
+        to_scan = []
+        params = self.pool.scan_params
+        for scanned_file in self.list_files_to_scan:
+            result = None
+            use_cache = (self.cache is not None and
+                         isinstance(scanned_file, world.ScannedRegionFile))
+            if use_cache:
+                result = self.cache.get(scanned_file, params)
+            if result is None and self.journal is not None:
+                result = self.journal.get(scanned_file)
+                if result is not None and use_cache:
+                    self.cache.put(result, params)
+            if result is None and use_cache:
+                scanned_file.previous_scan = self.cache.get_previous(scanned_file, params)
+            if result is None:
+                to_scan.append(scanned_file)
+            else:
+                # The world may have been found using a different path
+                result.path = scanned_file.path
+                result.folder = scanned_file.folder
+                self._cached_results.append(result)
+        return to_scan
+
     def scan(self):
         """ Launch the child processes and scan all the files. """
 
@@ -248,43 +760,123 @@ class AsyncScanner:
         logging.debug("Starting scan in: %s", str(self))
         logging.debug("########################################################")
         logging.debug("########################################################")
-        # Tests indicate that smaller amount of jobs per worker make all type
-        # of scans faster
-        jobs_per_worker = 5
-        # jobs_per_worker = max(1, total_files // self.processes
-        self._results = self.pool.map_async(self.scan_function,
-                                            self.list_files_to_scan,
-                                            jobs_per_worker)
-
-        # No more tasks to the pool, exit the processes once the tasks are done
-        self.pool.close()
+        to_scan = self.list_files_to_scan
+        if self.cache is not None or self.journal is not None:
+            to_scan = self._get_files_already_scanned()
+        # Biggest files first, in batches adapted to the files left. Never
+        # split region files when removing entities, the shards would write
+        # the same file at the same time.
+        batches = schedule_tasks(to_scan, self.processes,
+                                 split=not self.pool.remove_entities)
+        self._batches.extend(batches)
+        self._results = []
+        self._send_tasks()
 
         # See method
         self._str_last_scanned = ""
 
+    def _send_tasks(self):
+        """ Send to the pool the batches allowed by max_pending. """
+
+        to_send = []
+        pending = self._pending_tasks
+        while self._batches and (self.max_pending is None or pending < self.max_pending):
+            batch = self._batches.popleft()
+            to_send.append(batch)
+            pending += len(batch)
+        if to_send:
+            self._results.append(self.pool.map_async(multiprocess_scan_batch, to_send, 1))
+            self._pending_tasks = pending
+
+        # No more tasks to the pool, exit the processes once the tasks are done.
+        # A shared pool is closed by its creator.
+        if not self._batches and self._own_pool:
+            self.pool.close()
+
     def get_last_result(self):
-        """ Return results of last file scanned. """
+        """ Return results of last file scanned.
+
+        If there is no new result return None. The ScannedRegionFile or
+        ScannedDataFile returned is the same instance in the set,
+        don't modify it or you will modify the set results.
+
+        This method is better if you want to closely control the scan
+        process.
+
+        """
 
         q = self.queue
-        ds = self.data_structure
-        if not q.empty():
+        stored = False
+        if self._stored_results:
+            d = self._stored_results.popleft()
+            stored = True
+        elif self._cached_results:
+            d = self._cached_results.popleft()
+        elif not q.empty():
             d = q.get()
+            self._pending_tasks -= len(d) if isinstance(d, list) else 1
+            if self._batches:
+                self._send_tasks()
             if isinstance(d, tuple):
                 self.raise_child_exception(d)
-            # Copy it to the father process
-            ds._replace_in_data_structure(d)
-            ds._update_counts(d)
-            self.update_str_last_scanned(d)
-            # Got result! Reset it!
-            self.queries_without_results = 0
-            return d
+            if isinstance(d, list):
+                self._store_data_file_results(d)
+                d = self._stored_results.popleft()
+                stored = True
+            elif getattr(d, 'shard', None) is not None:
+                d = collect_shard(self._pending_shards, d)
+                if d is None:
+                    # Got a result, but the region file is not finished yet
+                    self.queries_without_results = 0
+                    return None
+            if self.journal is not None:
+                self.journal.append(d)
+            if self.cache is not None and isinstance(d, world.ScannedRegionFile):
+                self.cache.put(d, self.pool.scan_params)
         else:
             # Count amount of queries without result
             self.queries_without_results += 1
             return None
 
+        ds = self._owners[d.path]
+        if not stored:
+            # Copy it to the father process
+            ds._replace_in_data_structure(d)
+            ds._update_counts(d)
+        self._scanned[id(ds)] += 1
+        self.counter += 1
+        self.update_str_last_scanned(d)
+        # Got result! Reset it!
+        self.queries_without_results = 0
+        return d
+
+    def _store_data_file_results(self, results):
+        """ Store in bulk the results of the data files of a batch.
+
+        Inputs:
+         - results -- List of tuples (path, status), see multiprocess_scan_batch()
+
+        Every DataFileSet is updated at once, and the updated ScannedDataFiles
+        are returned one by one by get_last_result().
+
+        """
+
+        by_set = {}
+        for path, status in results:
+            ds = self._owners[path]
+            by_set.setdefault(id(ds), (ds, []))[1].append((path, status))
+        for ds, pairs in by_set.values():
+            updated = ds._update_statuses(pairs)
+            if self.journal is not None:
+                for scanned_file in updated:
+                    self.journal.append(scanned_file)
+            self._stored_results.extend(updated)
+
     def terminate(self):
         """ Terminate the pool, this will exit no matter what.
+
+        Note that a shared pool is also terminated, this is used to stop
+        the whole scan.
         """
         self.pool.terminate()
 
@@ -300,7 +892,7 @@ class AsyncScanner:
         e = exception_tuple
         raise ChildProcessException(e[0], e[1][0], e[1][1], e[1][2])
 
-    def update_str_last_scanned(self):
+    def update_str_last_scanned(self, scanned_file):
         """ Updates the string that represents the last file scanned. """
         raise NotImplementedError
 
@@ -312,6 +904,15 @@ class AsyncScanner:
 
         """
 
+        # Sleep, let the other processes do their job
+        sleep(self.get_sleep_time())
+
+    def get_sleep_time(self):
+        """ Adjust and return the time to sleep waiting for results, see sleep().
+
+        Used to wait without blocking, for example with asyncio.sleep().
+        """
+
         # If the query number is outside of our range...
         if not ((self.queries_without_results < self.MAX_QUERY_NUM) &
                 (self.queries_without_results > self.MIN_QUERY_NUM)):
@@ -335,8 +936,7 @@ class AsyncScanner:
         logging.debug("Time between calls to sleep(): %s", str(time() - self.last_time))
         self.last_time = time()
 
-        # Sleep, let the other processes do their job
-        sleep(self.scan_sleep_time)
+        return self.scan_sleep_time
 
     @property
     def str_last_scanned(self):
@@ -352,7 +952,10 @@ class AsyncScanner:
 
         """
 
-        return self._results.ready() and self.queue.empty()
+        return (self._results is not None and not self._batches and
+                all(r.ready() for r in self._results) and
+                self.queue.empty() and not self._cached_results and
+                not self._stored_results)
 
     @property
     def results(self):
@@ -369,20 +972,16 @@ class AsyncScanner:
 
         """
 
-        q = self.queue
-        T = self.SCAN_WAIT_TIME
-        while not q.empty() or not self.finished:
-            sleep(T)
-            if not q.empty():
-                d = q.get()
-                if isinstance(d, tuple):
-                    self.raise_child_exception(d)
-                # Overwrite it in the data dict
-                self.replace_in_data_structure(d)
-                yield d
+        if self._results is None:
+            self.scan()
+        while not self.finished:
+            self.sleep()
+            r = self.get_last_result()
+            if r is not None:
+                yield r
 
     def __len__(self):
-        return len(self.data_structure)
+        return len(self.list_files_to_scan)
 
 
 class AsyncDataScanner(AsyncScanner):
@@ -391,16 +990,18 @@ class AsyncDataScanner(AsyncScanner):
     Inputs:
      - data_structure -- A DataFileSet from world.py containing the files to scan
      - processes -- An integer with the number of child processes to use
+     - pool -- A ScanPool to use for the scan. If None a new one is created
+               and closed at the end of the scan.
     
     """
 
-    def __init__(self, data_structure, processes):
-        scan_function = multiprocess_scan_data
-        init_args = {}
-        _mp_init_function = _mp_data_pool_init
+    def __init__(self, data_structure, processes, pool=None):
+        own_pool = pool is None
+        if own_pool:
+            # The entity limit is not used scanning data files
+            pool = ScanPool(processes, 0)
 
-        AsyncScanner.__init__(self, data_structure, processes, scan_function,
-                              init_args, _mp_init_function)
+        AsyncScanner.__init__(self, data_structure, pool, own_pool)
 
         # Recommended time to sleep between polls for results
         self.scan_wait_time = 0.0001
@@ -420,24 +1021,26 @@ class AsyncRegionsetScanner(AsyncScanner):
      - remove_entities -- A boolean, defaults to False, to remove the entities whilel 
                          scanning. This is really handy because opening chunks with
                          too many entities for scanning can take minutes.
+     - pool -- A ScanPool to use for the scan. If None a new one is created
+               and closed at the end of the scan. The entity_limit and 
+               remove_entities of a given pool are used instead of the arguments.
+     - cache -- A ScanCache to skip the region files that haven't changed.
+     - journal -- A ScanJournal to resume an interrupted scan.
+     - max_pending -- Maximum number of tasks in the pool, see AsyncScanner.
     
     """
 
     def __init__(self, regionset, processes, entity_limit,
-                 remove_entities=False):
+                 remove_entities=False, pool=None, cache=None, journal=None,
+                 max_pending=None):
         assert isinstance(regionset, world.DataSet)
 
-        scan_function = multiprocess_scan_regionfile
-        _mp_init_function = _mp_regionset_pool_init
-
-        init_args = {}
-        init_args['regionset'] = regionset
-        init_args['processes'] = processes
-        init_args['entity_limit'] = entity_limit
-        init_args['remove_entities'] = remove_entities
+        own_pool = pool is None
+        if own_pool:
+            pool = ScanPool(processes, entity_limit, remove_entities)
 
-        AsyncScanner.__init__(self, regionset, processes, scan_function,
-                              init_args, _mp_init_function)
+        AsyncScanner.__init__(self, regionset, pool, own_pool, cache, journal,
+                              max_pending)
 
         # Recommended time to sleep between polls for results
         self.scan_wait_time = 0.001
@@ -446,8 +1049,8 @@ class AsyncRegionsetScanner(AsyncScanner):
         self._str_last_scanned = self.data_structure.get_name() + ": " + r.filename
 
 
-class AsyncWorldRegionScanner:
-    """ Wrapper around the calls of AsyncScanner the whole world.
+class AsyncWorldScanner(AsyncScanner):
+    """ Scan all the region sets, and optionally the data file sets, of a world.
     
     Inputs:
      - world_obj -- A World object from world.py
@@ -457,136 +1060,86 @@ class AsyncWorldRegionScanner:
      - remove_entities -- A boolean, defaults to False, to remove the entities while 
                          scanning. This is really handy because opening chunks with
                          too many entities for scanning can take minutes.
-    
-    This class is just a wrapper around AsyncRegionsetScanner to scan all the region sets
-    of the world.
+     - pool -- A ScanPool to use for the scan. If None a new one is created
+               and closed at the end of the scan.
+     - data_files -- A boolean, defaults to True, also scan the player and data files.
+     - cache -- A ScanCache to skip the region files that haven't changed.
+     - journal -- A ScanJournal to resume an interrupted scan.
+     - max_pending -- Maximum number of tasks in the pool, see AsyncScanner.
+
+    All the files of all the sets are sent to the pool at once, this way the child
+    processes don't sit idle waiting for the last big region files of a region set
+    before the next region set starts. Every result is put back in the set it
+    belongs to, and the progress is tracked for every set and in total.
 
-    
     """
 
     def __init__(self, world_obj, processes, entity_limit,
-                 remove_entities=False):
+                 remove_entities=False, pool=None, data_files=True, cache=None,
+                 journal=None, max_pending=None):
 
         self._world_obj = world_obj
-        self.processes = processes
         self.entity_limit = entity_limit
         self.remove_entities = remove_entities
 
-        self.regionsets = copy(world_obj.regionsets)
-
-        self._current_regionset = None
-        self._str_last_scanned = None
-
-        # Holds a friendly string with the name of the last file scanned
-        self.scan_wait_time = 0.001
-
-    def sleep(self):
-        """ Sleep waiting for results.
-
-        This method will sleep less when results arrive faster and
-        more when they arrive slower. See AsyncScanner.sleep().
-
-        """
-
-        self._current_regionset.sleep()
-
-    def scan(self):
-        """ Scan and fill the given regionset. """
-
-        cr = AsyncRegionsetScanner(self.regionsets.pop(0),
-                                   self.processes,
-                                   self.entity_limit,
-                                   self.remove_entities)
-        self._current_regionset = cr
-        cr.scan()
-
-        # See method
-        self._str_last_scanned = ""
-
-    def get_last_result(self):
-        """ Return results of last region file scanned.
+        own_pool = pool is None
+        if own_pool:
+            pool = ScanPool(processes, entity_limit, remove_entities)
 
-        If there are left no scanned region files return None. The
-        ScannedRegionFile returned is the same instance in the regionset,
-        don't modify it or you will modify the regionset results.
+        data_structures = []
+        if data_files:
+            data_structures.extend(world_obj.datafilesets)
+        data_structures.extend(world_obj.regionsets)
 
-        This method is better if you want to closely control the scan
-        process.
-
-        """
+        AsyncScanner.__init__(self, data_structures, pool, own_pool, cache,
+                              journal, max_pending)
 
-        cr = self._current_regionset
+    def update_str_last_scanned(self, scanned_file):
+        ds = self._owners[scanned_file.path]
+        self._str_last_scanned = ds.get_name() + ": " + scanned_file.filename
 
-        if cr is not None:
-            if not cr.finished:
-                r = cr.get_last_result()
-                self._str_last_scanned = cr.str_last_scanned
-                return r
-            elif self.regionsets:
-                self.scan()
-                return None
-            else:
-                return None
-        else:
-            return None
-
-    def terminate(self):
-        """ Terminates scan of the current RegionSet. """
-
-        self._current_regionset.terminate()
-
-    @property
-    def str_last_scanned(self):
-        """ A friendly string with last scanned thing. """
-        return self._str_last_scanned
+    def get_progress(self):
+        """ Return the progress of the scan of every set.
 
-    @property
-    def current_regionset(self):
-        """ Returns the current RegionSet being scanned. """
-
-        return self._current_regionset.regionset
-
-    @property
-    def finished(self):
-        """ Return True if the scan has finished.
-        
-        It checks if the queue is empty and if the results are ready.
+        Return:
+         - progress -- List of tuples (name, scanned, total), one for every set
+                       with files to scan.
 
         """
 
-        return not self.regionsets and self._current_regionset.finished
+        return [(ds.get_name(), self._scanned[id(ds)], len(ds))
+                for ds in self.data_structures if len(ds)]
 
     @property
     def world_obj(self):
         return self._world_obj
 
-    @property
-    def results(self):
-        """ Yield all the results from the scan.
 
-        This is the simpler method to control the scanning process,
-        but also the most sloppy. If you want to closely control the
-        scan process (for example cancel the process in the middle,
-        whatever is happening) use get_last_result().
-
-        Usage:
-        for result in scanner.results:
-            # do things
-        """
+class AsyncWorldRegionScanner(AsyncWorldScanner):
+    """ Scan all the region sets of a world, see AsyncWorldScanner.
+    
+    Inputs:
+     - world_obj -- A World object from world.py
+     - processes -- An integer with the number of child processes to use
+     - entity_limit -- An integer, threshold of entities for a chunk to be considered
+                     with too many entities
+     - remove_entities -- A boolean, defaults to False, to remove the entities while 
+                         scanning.
+     - pool -- A ScanPool to use for the scan. If None a new one is created
+               and closed at the end of the scan.
+     - cache -- A ScanCache to skip the region files that haven't changed.
+     - journal -- A ScanJournal to resume an interrupted scan.
+     - max_pending -- Maximum number of tasks in the pool, see AsyncScanner.
 
-        while not self.finished:
-            cr = self._current_regionset
-            if cr and not cr.finished:
-                for r in cr.results:
-                    yield r
-            elif self.regionsets:
-                self.scan()
+    """
 
-    def __len__(self):
-        l = 0
-        for rs in self.regionsets:
-            l += len(rs)
-        return l
+    def __init__(self, world_obj, processes, entity_limit,
+                 remove_entities=False, pool=None, cache=None, journal=None,
+                 max_pending=None):
+        AsyncWorldScanner.__init__(self, world_obj, processes, entity_limit,
+                                   remove_entities, pool, data_files=False,
+                                   cache=cache, journal=journal,
+                                   max_pending=max_pending)
 
 
 def console_scan_loop(scanners, scan_titles, verbose):
@@ -627,6 +1180,9 @@ def console_scan_loop(scanners, scan_titles, verbose):
                                 print("Scanned {0: <12} {1:.<43} {2}/{3}".format(join(fol, fn), status, counter, total))
                     if not verbose:
                         pbar.finish()
+                    if hasattr(scanner, 'get_progress'):
+                        for name, scanned, total_set in scanner.get_progress():
+                            print(" - {0}: {1} of {2} files scanned.".format(name, scanned, total_set))
                 except KeyboardInterrupt as e:
                     # If not, dead processes will accumulate in windows
                     scanner.terminate()
@@ -641,7 +1197,7 @@ def console_scan_loop(scanners, scan_titles, verbose):
 
 
 def console_scan_world(world_obj, processes, entity_limit, remove_entities,
-                       verbose):
+                       verbose, pool=None, cache=None, journal=None):
     """ Scans a world folder prints status to console.
 
     Inputs:
@@ -653,6 +1209,12 @@ def console_scan_world(world_obj, processes, entity_limit, remove_entities,
                          scanning. This is really handy because opening chunks with
                          too many entities for scanning can take minutes.
      - verbose -- Boolean, if true it will print a line per scanned region file.
+     - pool -- A ScanPool shared by all the scans of the session. If None a
+               new one is created for this world and closed at the end.
+     - cache -- A ScanCache, the region files that haven't changed since the
+                last scan are not scanned again. The caller saves it.
+     - journal -- A ScanJournal, the results are written to it as they arrive and
+                  the files already in it are not scanned again.
 
     """
 
@@ -685,22 +1247,26 @@ def console_scan_world(world_obj, processes, entity_limit, remove_entities,
             print("[WARNING!]: \'level.dat\' is corrupted with the following error/s:")
             print("\t {0}".format(c.DATAFILE_STATUS_TEXT[w.scanned_level.status]))
 
-    ps = AsyncDataScanner(w.players, processes)
-    ops = AsyncDataScanner(w.old_players, processes)
-    ds = AsyncDataScanner(w.data_files, processes)
-    ws = AsyncWorldRegionScanner(w, processes, entity_limit, remove_entities)
+    own_pool = pool is None
+    if own_pool:
+        pool = ScanPool(processes, entity_limit, remove_entities)
+
+    # Player files, data files and all the region sets are scanned at once
+    ws = AsyncWorldScanner(w, processes, entity_limit, remove_entities, pool,
+                           cache=cache, journal=journal)
 
-    scanners = [ps, ops, ds, ws]
+    scanners = [ws]
 
-    scan_titles = [' Scanning UUID player files ',
-                   ' Scanning old format player files ',
-                   ' Scanning structures and map data files ',
-                   ' Scanning region, POI and entities files ']
+    scan_titles = [' Scanning data, region, POI and entities files ']
     console_scan_loop(scanners, scan_titles, verbose)
+    if own_pool:
+        pool.close()
+        pool.join()
     w.scanned = True
 
 
-def console_scan_regionset(regionset, processes, entity_limit, remove_entities, verbose):
+def console_scan_regionset(regionset, processes, entity_limit, remove_entities, verbose,
+                           pool=None, cache=None, journal=None):
     """ Scan a regionset printing status to console.
 
     Inputs:
@@ -712,11 +1278,17 @@ def console_scan_regionset(regionset, processes, entity_limit, remove_entities,
                          scanning. This is really handy because opening chunks with
                          too many entities for scanning can take minutes.
      - verbose -- Boolean, if true it will print a line per scanned region file.
+     - pool -- A ScanPool shared by all the scans of the session. If None a
+               new one is created for this scan.
+     - cache -- A ScanCache, the region files that haven't changed since the
+                last scan are not scanned again. The caller saves it.
+     - journal -- A ScanJournal, the results are written to it as they arrive and
+                  the files already in it are not scanned again.
 
     """
 
     rs = AsyncRegionsetScanner(regionset, processes, entity_limit,
-                               remove_entities)
+                               remove_entities, pool, cache, journal)
     scanners = [rs]
     titles = [entitle("Scanning separate region files", 0)]
     console_scan_loop(scanners, titles, verbose)
@@ -769,7 +1341,10 @@ def scan_data(scanned_dat_file):
     return s
 
 
-def scan_region_file(scanned_regionfile_obj, entity_limit, remove_entities):
+def scan_region_file(scanned_regionfile_obj, entity_limit, remove_entities,
+                     chunks=None, previous=None, scan_depth=c.SCAN_DEPTH_FULL,
+                     sample=None, census=False, block_entity_limit=None,
+                     tick_limit=None):
     """ Scan a region file filling the ScannedRegionFile object
 
     Inputs:
@@ -779,6 +1354,37 @@ def scan_region_file(scanned_regionfile_obj, entity_limit, remove_entities):
      - remove_entities -- A boolean, defaults to False, to remove the entities while 
                          scanning. This is really handy because opening chunks with
                          too many entities for scanning can take minutes.
+     - chunks -- Container with the header indexes (x + z * 32) of the chunks to
+                 scan. If None, the default, all the chunks are scanned. See
+                 RegionFileShard.
+     - previous -- Tuple (header, chunks, raw_sizes, overloads) with the raw
+                   region header, the chunk tuples, the uncompressed sizes and
+                   the overloads of the chunks of the last scan of this file,
+                   see ScanCache.get_previous().
+                   If given, only the chunks with a different location or
+                   timestamp in the header are read, the rest keep their status.
+     - scan_depth -- One of the SCAN_DEPTH_* values in constants.py. With
+                     SCAN_DEPTH_HEADER the chunks are not read at all, only the
+                     problems proved by the headers are found, see scan_chunk_header().
+                     With SCAN_DEPTH_DECOMPRESS the chunks are decompressed but
+                     not parsed, see scan_chunk_data().
+     - sample -- Float, fraction of the chunks with a sane header to scan. None,
+                 the default, scans all of them. See choose_sample_chunks().
+     - census -- Boolean, if True the entities of the scanned chunks are counted
+                 by type in an EntityCensus stored in the census attribute of the
+                 ScannedRegionFile. Only with SCAN_DEPTH_FULL. The previous
+                 results are not used, they have no census.
+     - block_entity_limit -- An integer, threshold of block entities for a chunk
+                             to have the status CHUNK_TOO_MANY_BLOCK_ENTITIES. None
+                             doesn't check them. Only with SCAN_DEPTH_FULL.
+     - tick_limit -- An integer, threshold of scheduled ticks for a chunk to have
+                     the status CHUNK_TOO_MANY_TICKS. None doesn't check them.
+                     Only with SCAN_DEPTH_FULL.
+
+    The sizes of the chunks are stored too, see ScannedRegionFile.set_chunk_size().
+    The compressed size comes from the chunk header.
+    The sectors used by the region file are in its usage attribute, see
+    SectorUsage in sizes.py.
 
     """
 
@@ -806,20 +1412,71 @@ def scan_region_file(scanned_regionfile_obj, entity_limit, remove_entities):
             r.scanned = True
             return r
 
+        r.usage = SectorUsage.from_region_file(region_file)
+
+        if sample is not None:
+            random_sample, suspicious, population = choose_sample_chunks(
+                region_file, sample, r.filename, chunks)
+            chunks = random_sample | suspicious
+
+        entity_census = None
+        if census and scan_depth == c.SCAN_DEPTH_FULL:
+            entity_census = r.census = EntityCensus()
+            previous = None
+
+        unchanged = {}
+        old_raw_sizes = {}
+        old_overloads = {}
+        if previous is not None:
+            old_header, old_chunks, old_raw_sizes, old_overloads = previous
+            unchanged = get_unchanged_chunks(region_file, old_header, old_chunks)
+
+        overload_statuses = [c.CHUNK_TOO_MANY_ENTITIES] + c.TRIMMABLE_CHUNK_PROBLEMS
+        metadata = region_file.metadata
         for x in range(32):
             for z in range(32):
+                if chunks is not None and x + z * 32 not in chunks:
+                    continue
+                m = metadata[(x, z)]
+                # The length in the chunk header is only read for these
+                size = m.length if m.status in (region.STATUS_CHUNK_OK,
+                                                region.STATUS_CHUNK_OVERLAPPING) else None
+                if (x, z) in unchanged:
+                    tup = unchanged[(x, z)]
+                    if tup:
+                        r[(x, z)] = tup
+                        r.set_chunk_size((x, z), size, old_raw_sizes.get((x, z)))
+                        r.set_chunk_overloads((x, z), old_overloads.get((x, z), ()))
+                    continue
                 # start the actual chunk scanning
-                g_coords = r.get_global_chunk_coords(x, z)
-                chunk, tup = scan_chunk(region_file,
-                                      (x, z),
-                                      g_coords,
-                                      entity_limit)
-                if tup:
-                    r[(x, z)] = tup
+                chunk = None
+                if scan_depth == c.SCAN_DEPTH_HEADER:
+                    tup = scan_chunk_header(region_file, (x, z))
+                    raw_size = None
+                elif scan_depth == c.SCAN_DEPTH_DECOMPRESS:
+                    tup, raw_size = scan_chunk_data(region_file, (x, z))
                 else:
+                    g_coords = r.get_global_chunk_coords(x, z)
+                    chunk, tup, raw_size = scan_chunk(region_file,
+                                                      (x, z),
+                                                      g_coords,
+                                                      entity_limit,
+                                                      entity_census,
+                                                      block_entity_limit,
+                                                      tick_limit)
+                if not tup:
                     # chunk not created
                     continue
 
+                r[(x, z)] = tup
+                r.set_chunk_size((x, z), size, raw_size)
+                if (tup[c.TUPLE_STATUS] in overload_statuses and
+                        world.get_chunk_type(chunk) == c.LEVEL_DIR):
+                    # The status has only the first problem, keep all of them
+                    # for ScannedRegionFile.set_entity_limit()
+                    r.set_chunk_overloads((x, z), check_chunk_overloads(
+                        chunk, block_entity_limit, tick_limit))
+
                 if tup[c.TUPLE_STATUS] == c.CHUNK_OK:
                     continue
                 elif tup[c.TUPLE_STATUS] == c.CHUNK_TOO_MANY_ENTITIES:
@@ -831,8 +1488,11 @@ def scan_region_file(scanned_regionfile_obj, entity_limit, remove_entities):
                         world.delete_entities(region_file, x, z)
                         print(("Deleted {0} entities in chunk"
                                " ({1},{2}) of the region file: {3}").format(tup[c.TUPLE_NUM_ENTITIES], x, z, r.filename))
-                        # entities removed, change chunk status to OK
-                        r[(x, z)] = (0, c.CHUNK_OK)
+                        # entities removed, the chunk gets the status of the
+                        # other problems it has, or OK
+                        overloads = r.get_chunk_overloads((x, z))
+                        r[(x, z)] = (0, overloads[0] if overloads else c.CHUNK_OK)
+                        r.set_chunk_overloads((x, z), overloads)
 
                     else:
                         # This stores all the entities in a file,
@@ -857,14 +1517,25 @@ def scan_region_file(scanned_regionfile_obj, entity_limit, remove_entities):
         # TODO: Why? I don't remember why
         # TODO: Leave this to nbt, which code is much better than this
 
-        metadata = region_file.metadata
-        sharing = [k for k in metadata if (metadata[k].status == region.STATUS_CHUNK_OVERLAPPING and
+        # The header is always parsed completely, so this also works when
+        # only some of the chunks are scanned.
+        sharing = [k for k in metadata if ((chunks is None or k[0] + k[1] * 32 in chunks) and
+                                           metadata[k].status == region.STATUS_CHUNK_OVERLAPPING and
                                            r[k][c.TUPLE_STATUS] == c.CHUNK_WRONG_LOCATED)]
         shared_counter = 0
         for k in sharing:
             r[k] = (r[k][c.TUPLE_NUM_ENTITIES], c.CHUNK_SHARED_OFFSET)
             shared_counter += 1
 
+        if sample is not None:
+            found = set(r.keys())
+            problems = 0
+            for i in random_sample:
+                k = (i % 32, i // 32)
+                if k in found and r[k][c.TUPLE_STATUS] in c.CHUNK_PROBLEMS:
+                    problems += 1
+            r.sample = (population, len(random_sample), problems)
+
         r.scan_time = time()
         r.status = c.REGION_OK
         r.scanned = True
@@ -888,7 +1559,241 @@ def scan_region_file(scanned_regionfile_obj, entity_limit, remove_entities):
         return r
 
 
-def scan_chunk(region_file, coords, global_coords, entity_limit):
+def choose_sample_chunks(region_file, fraction, seed, chunks=None):
+    """ Chooses the chunks to scan in a sampled scan.
+
+    Inputs:
+     - region_file -- nbt.RegionFile object
+     - fraction -- Float, fraction of the chunks with a sane header to choose
+     - seed -- Seed for the random choice, the same seed always gives the same sample
+     - chunks -- Container with the header indexes of the chunks wanted, None for
+                 all of them. The sample is always chosen from the whole region
+                 file, so the shards of a file get the same chunks as a whole scan.
+
+    Return:
+     - random_sample -- Set with the header indexes (x + z * 32) of the chunks with
+                        a sane header chosen at random
+     - suspicious -- Set with the header indexes of all the chunks with a
+                     problem in the header, these are always scanned
+     - population -- Integer, number of chunks with a sane header
+
+    At least one chunk is chosen if there is any.
+
+    """
+
+    population = []
+    suspicious = set()
+    for (x, z), m in region_file.metadata.items():
+        i = x + z * 32
+        if m.status == region.STATUS_CHUNK_NOT_CREATED:
+            continue
+        if m.status == region.STATUS_CHUNK_OK:
+            population.append(i)
+        else:
+            suspicious.add(i)
+
+    population.sort()
+    size = min(len(population), int(ceil(fraction * len(population))))
+    random_sample = set(random.Random(seed).sample(population, size))
+    if chunks is not None:
+        random_sample = set(i for i in random_sample if i in chunks)
+        suspicious = set(i for i in suspicious if i in chunks)
+        population = [i for i in population if i in chunks]
+    return random_sample, suspicious, len(population)
+
+
+def get_unchanged_chunks(region_file, old_header, old_chunks):
+    """ Returns the results of the chunks that haven't changed since the last scan.
+
+    Inputs:
+     - region_file -- nbt.RegionFile object
+     - old_header -- Bytes with the two sectors of the region header at the
+                     time of the last scan
+     - old_chunks -- Dictionary with the chunk tuples of the last scan, keys are
+                     the local chunk coordinates
+
+    Return:
+     - unchanged -- Dictionary with the local coordinates of the unchanged chunks as
+                    keys and their old chunk tuple as values (None for chunks not
+                    created)
+
+    Minecraft writes the chunk in a new location, or updates its timestamp, every
+    time it saves a chunk, so a chunk with the same location and timestamp in the
+    header has the same data. Only chunks with a sane header are reused. Chunks
+    overlapping others may have been overwritten by a changed chunk, these are
+    always read again.
+
+    The sharing offset status depends on other chunks, so it's turned back into
+    wrong located and scan_region_file() checks it again with the new header.
+
+    """
+
+    region_file.file.seek(0)
+    header = region_file.file.read(2 * region.SECTOR_LENGTH)
+    if len(header) != len(old_header):
+        return {}
+
+    unchanged = {}
+    for (x, z), m in region_file.metadata.items():
+        if m.status not in (region.STATUS_CHUNK_OK, region.STATUS_CHUNK_NOT_CREATED):
+            continue
+        location = 4 * (x + z * 32)
+        timestamp = location + region.SECTOR_LENGTH
+        if (header[location:location + 4] != old_header[location:location + 4] or
+                header[timestamp:timestamp + 4] != old_header[timestamp:timestamp + 4]):
+            continue
+        tup = old_chunks.get((x, z))
+        if m.status == region.STATUS_CHUNK_OK and tup is None:
+            # Not in the last results, read it
+            continue
+        if tup is not None and tup[c.TUPLE_STATUS] == c.CHUNK_SHARED_OFFSET:
+            tup = (tup[c.TUPLE_NUM_ENTITIES], c.CHUNK_WRONG_LOCATED)
+        unchanged[(x, z)] = tup
+
+    return unchanged
+
+
+def scan_chunk_header(region_file, coords):
+    """ Returns the status of a chunk using only the region and chunk headers.
+
+    Keywords arguments:
+    region_file -- nbt.RegionFile object
+    coords -- tuple containing the local (region) coordinates of the chunk
+
+    Return:
+    (num_entities, status) -- tuple with None as number of entities and the
+                              status described by the CHUNK_* variables, or
+                              None if the chunk is not created
+
+    nbt.RegionFile reads the chunk headers when it opens the file, so this
+    doesn't read anything. Only what the headers prove is reported: chunks
+    in the header, outside of the file, with zero length or with different
+    lengths in the region and chunk header are corrupted. Chunks overlapping
+    others are sharing offset; without reading them it's impossible to know
+    which one is the good one, so all of them are reported. Everything else
+    is considered OK.
+
+    """
+
+    m = region_file.metadata[coords]
+    if m.status == region.STATUS_CHUNK_NOT_CREATED:
+        return None
+    elif m.status == region.STATUS_CHUNK_OVERLAPPING:
+        status = c.CHUNK_SHARED_OFFSET
+    elif m.status in (region.STATUS_CHUNK_IN_HEADER,
+                      region.STATUS_CHUNK_OUT_OF_FILE,
+                      region.STATUS_CHUNK_ZERO_LENGTH,
+                      region.STATUS_CHUNK_MISMATCHED_LENGTHS):
+        status = c.CHUNK_CORRUPTED
+    elif m.blockstart * region.SECTOR_LENGTH + 5 >= region_file.size:
+        status = c.CHUNK_CORRUPTED
+    else:
+        status = c.CHUNK_OK
+
+    return None, status
+
+
+# Maximum number of bytes decompressed at once by scan_chunk_data()
+DECOMPRESS_BLOCK_SIZE = 64 * 1024
+
+
+def scan_chunk_data(region_file, coords):
+    """ Returns the status of a chunk decompressing it, without parsing it.
+
+    Keywords arguments:
+    region_file -- nbt.RegionFile object
+    coords -- tuple containing the local (region) coordinates of the chunk
+
+    Return:
+    (num_entities, status) -- tuple with None as number of entities and the
+                              status described by the CHUNK_* variables, or
+                              None if the chunk is not created
+    raw_size -- the number of bytes of the decompressed data, None if the chunk
+                is not created or corrupted
+
+    Does the same checks as nbt.RegionFile.get_blockdata() but the decompressed
+    data is thrown away block by block, a chunk with a huge amount of data
+    never needs more than DECOMPRESS_BLOCK_SIZE bytes of memory. A chunk is
+    corrupted if its compressed stream is broken or truncated.
+
+    As in scan_chunk_header(), the chunks overlapping others are reported as
+    sharing offset. Wrong located chunks and entities are not found.
+
+    """
+
+    m = region_file.metadata[coords]
+    if m.status == region.STATUS_CHUNK_NOT_CREATED:
+        return None, None
+    if m.status in (region.STATUS_CHUNK_IN_HEADER, region.STATUS_CHUNK_ZERO_LENGTH):
+        return (None, c.CHUNK_CORRUPTED), None
+    if m.status == region.STATUS_CHUNK_OUT_OF_FILE and (m.length <= 1 or m.compression is None):
+        return (None, c.CHUNK_CORRUPTED), None
+    start = m.blockstart * region.SECTOR_LENGTH + 5
+    if start >= region_file.size:
+        return (None, c.CHUNK_CORRUPTED), None
+
+    raw_size = 0
+    if m.compression == region.COMPRESSION_NONE:
+        ok = True
+        raw_size = m.length - 1
+    elif m.compression in (region.COMPRESSION_ZLIB, region.COMPRESSION_GZIP):
+        # Don't read past the end of the file, see get_blockdata()
+        length = min(m.length - 1, region_file.size - start)
+        region_file.file.seek(start)
+        data = region_file.file.read(length)
+        wbits = zlib.MAX_WBITS
+        if m.compression == region.COMPRESSION_GZIP:
+            wbits |= 16
+        try:
+            d = zlib.decompressobj(wbits)
+            raw_size += len(d.decompress(data, DECOMPRESS_BLOCK_SIZE))
+            while d.unconsumed_tail:
+                raw_size += len(d.decompress(d.unconsumed_tail, DECOMPRESS_BLOCK_SIZE))
+            ok = d.eof
+        except zlib.error:
+            ok = False
+    else:
+        # Unknown compression
+        ok = False
+
+    if not ok:
+        return (None, c.CHUNK_CORRUPTED), None
+    elif m.status == region.STATUS_CHUNK_OVERLAPPING:
+        status = c.CHUNK_SHARED_OFFSET
+    else:
+        status = c.CHUNK_OK
+
+    return (None, status), raw_size
+
+
+def check_chunk_overloads(chunk, block_entity_limit, tick_limit):
+    """ Returns the limits other than the entity limit a level chunk is over.
+
+    Inputs:
+     - chunk -- A level chunk, from the NBT module
+     - block_entity_limit -- Integer, the number of block entities that is
+                             considered to be too many, None to not check them
+     - tick_limit -- Integer, the number of scheduled ticks (of blocks and
+                     fluids) that is considered to be too many, None to not
+                     check them
+
+    Return:
+     - overloads -- List with the statuses in TRIMMABLE_CHUNK_PROBLEMS of the
+                    chunk, in the same order. The first one is the status of
+                    the chunk if it's not wrong located and has not too many
+                    entities, see scan_chunk().
+
+    """
+
+    limits = {c.CHUNK_TOO_MANY_BLOCK_ENTITIES: block_entity_limit,
+              c.CHUNK_TOO_MANY_TICKS: tick_limit}
+    return [status for status in c.TRIMMABLE_CHUNK_PROBLEMS
+            if limits[status] is not None and
+            limits[status] < world.count_chunk_lists(chunk, c.CHUNK_PROBLEMS_TAGS[status])]
+
+
+def scan_chunk(region_file, coords, global_coords, entity_limit, census=None,
+               block_entity_limit=None, tick_limit=None):
     """ Scans a chunk returning its status and number of entities.
 
     Keywords arguments:
@@ -896,12 +1801,20 @@ def scan_chunk(region_file, coords, global_coords, entity_limit):
     coords -- tuple containing the local (region) coordinates of the chunk
     global_coords -- tuple containing the global (world) coordinates of the chunk
     entity_limit -- the number of entities that is considered to be too many
+    census -- EntityCensus object, if given the entities of the chunk are added
+              to it, see read_entity_ids() in census.py
+    block_entity_limit -- the number of block entities that is considered to be
+                          too many, None to not check them
+    tick_limit -- the number of scheduled ticks (of blocks and fluids) that is
+                  considered to be too many, None to not check them
 
     Return:
     chunk -- as a nbt file
     (num_entities, status) -- tuple with the number of entities of the chunk and
                               the status described by the CHUNK_* variables in
                               world.py
+    raw_size -- the number of bytes of the decompressed data, None if it
+                couldn't be decompressed
 
     If the chunk does not exist (is not yet created it returns None)
     
@@ -910,11 +1823,24 @@ def scan_chunk(region_file, coords, global_coords, entity_limit):
     """
 
     el = entity_limit
+    raw_size = None
 
     try:
-        chunk = region_file.get_chunk(*coords)
+        # The same as region_file.get_chunk(), but the size of the data and
+        # the census need the decompressed data
+        data = region_file.get_blockdata(*coords)
+        raw_size = len(data)
+        try:
+            chunk = nbt.NBTFile(buffer=BytesIO(data))
+        except MalformedFileError as e:
+            raise ChunkDataError(str(e))
         chunk_type = world.get_chunk_type(chunk)
 
+        if census is not None and chunk_type != c.POI_DIR:
+            entity_ids = read_entity_ids(data)
+            if entity_ids:
+                census.add_chunk(global_coords, entity_ids)
+
         if chunk_type == c.LEVEL_DIR:
             # to know if is a poi chunk or a level chunk check the contents
             # if 'Level' is at root is a level chunk
@@ -947,8 +1873,9 @@ def scan_chunk(region_file, coords, global_coords, entity_limit):
                     # too many entities in the chunk
                     status = c.CHUNK_TOO_MANY_ENTITIES
                 else:
-                    # chunk ok
-                    status = c.CHUNK_OK
+                    # too many block entities or scheduled ticks, or chunk ok
+                    overloads = check_chunk_overloads(chunk, block_entity_limit, tick_limit)
+                    status = overloads[0] if overloads else c.CHUNK_OK
 
             ############################
             #    Chunk error detection
@@ -1050,7 +1977,9 @@ def scan_chunk(region_file, coords, global_coords, entity_limit):
         global_coords = world.get_global_chunk_coords(split(region_file.filename)[1], coords[0], coords[1])
         num_entities = None
 
-    return chunk, (num_entities, status) if status != c.CHUNK_NOT_CREATED else None
+    if status == c.CHUNK_NOT_CREATED:
+        return chunk, None, None
+    return chunk, (num_entities, status), raw_size
 
 
 if __name__ == '__main__':
@@ -0,0 +1,390 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#   Region Fixer.
+#   Fix your region files with a backup copy of your Minecraft world.
+#   Copyright (C) 2020  Alejandro Aguilera (Fenixin)
+#   https://github.com/Fenixin/Minecraft-Region-Fixer
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+from bisect import bisect_left, bisect_right
+from heapq import nlargest
+
+from nbt.region import (SECTOR_LENGTH,
+                        STATUS_CHUNK_OK,
+                        STATUS_CHUNK_OVERLAPPING)
+
+from .util import table, format_size
+import regionfixer_core.constants as c
+
+
+# Upper limits in bytes of the bins of the size histograms, powers of two from
+# one sector to 16MiB. The last bin of a histogram has the bigger chunks.
+SIZE_BINS = [SECTOR_LENGTH << i for i in range(13)]
+
+# Number of the biggest chunks kept by ChunkSizeStats
+SIZE_LARGEST = 10
+
+# Smallest compressed size of a chunk needing CHUNK_SECTOR_WARNING sectors
+NEAR_LIMIT_SIZE = (c.CHUNK_SECTOR_WARNING - 1) * SECTOR_LENGTH - 3
+
+
+def _bin_label(i):
+    if i == len(SIZE_BINS):
+        return "> " + format_size(SIZE_BINS[-1])
+    return "<= " + format_size(SIZE_BINS[i])
+
+
+def get_sectors(size):
+    """ Returns the sectors of a region file used by a chunk with the given
+    compressed size, the 4 bytes of its length included. """
+    return (size + 4 + SECTOR_LENGTH - 1) // SECTOR_LENGTH
+
+
+class ChunkSizeStats:
+    """ Statistics of the sizes of the chunks of a region file, a region set or a world.
+
+    The sizes are found while scanning, see ScannedRegionFile.set_chunk_size().
+    The compressed size is in the header of every chunk, so it's known with any
+    scan depth. The uncompressed size is only known if the chunks are
+    decompressed.
+
+    Attributes:
+     - chunks -- Integer, number of chunks with a known compressed size
+     - total_size -- Integer, sum of the compressed sizes in bytes
+     - raw_chunks -- Integer, number of chunks with a known uncompressed size
+     - total_raw_size -- Integer, sum of the uncompressed sizes in bytes
+     - histogram -- List with the number of chunks in every bin of SIZE_BINS by
+                    compressed size, plus the chunks bigger than the last bin.
+     - raw_histogram -- The same as histogram with the uncompressed sizes.
+     - largest -- List with the SIZE_LARGEST chunks with the biggest compressed
+                  size, from the biggest to the smallest. Tuples like (size,
+                  raw_size, global_coords), raw_size can be None.
+     - near_limit -- List with all the chunks needing CHUNK_SECTOR_WARNING
+                     sectors or more, from the biggest to the smallest. Tuples
+                     like (size, global_coords). This is not a problem of the
+                     chunk, but they are getting close to CHUNK_SECTOR_LIMIT.
+
+    """
+
+    __slots__ = ('chunks', 'total_size', 'raw_chunks', 'total_raw_size',
+                 'histogram', 'raw_histogram', 'largest', 'near_limit')
+
+    def __init__(self):
+        self.chunks = 0
+        self.total_size = 0
+        self.raw_chunks = 0
+        self.total_raw_size = 0
+        self.histogram = [0] * (len(SIZE_BINS) + 1)
+        self.raw_histogram = [0] * (len(SIZE_BINS) + 1)
+        self.largest = []
+        self.near_limit = []
+
+    def add_sizes(self, sizes, raw_sizes, region_coords):
+        """ Adds the sizes of the chunks of a region file.
+
+        Inputs:
+         - sizes -- Sequence with the compressed size of every chunk of the region
+                    file, indexed by x * 32 + z with the local coordinates of the
+                    chunks. Negative for unknown sizes.
+         - raw_sizes -- Sequence with the uncompressed sizes, the same way.
+         - region_coords -- Tuple with the coordinates of the region file
+
+        The sizes are sorted and the histograms are filled with bisect, this is
+        called for every region file of a world.
+
+        """
+
+        rx, rz = region_coords
+        for values, histogram, raw in ((sizes, self.histogram, False),
+                                       (raw_sizes, self.raw_histogram, True)):
+            values = sorted(values)
+            start = bisect_left(values, 0)
+            if start == len(values):
+                continue
+            if raw:
+                self.raw_chunks += len(values) - start
+                self.total_raw_size += sum(values[start:])
+            else:
+                self.chunks += len(values) - start
+                self.total_size += sum(values[start:])
+                # Rare, only look for them if the sorted sizes say there are some
+                if values[-1] >= NEAR_LIMIT_SIZE:
+                    near_limit = [(size, (rx * 32 + i // 32, rz * 32 + i % 32))
+                                  for i, size in enumerate(sizes)
+                                  if size >= NEAR_LIMIT_SIZE]
+                    self._add_near_limit(near_limit)
+            for i, limit in enumerate(SIZE_BINS):
+                end = bisect_right(values, limit, start)
+                histogram[i] += end - start
+                start = end
+            histogram[-1] += len(values) - start
+
+        largest = []
+        for i in nlargest(SIZE_LARGEST, range(len(sizes)), key=sizes.__getitem__):
+            if sizes[i] < 0:
+                break
+            x, z = divmod(i, 32)
+            raw_size = raw_sizes[i] if raw_sizes[i] >= 0 else None
+            largest.append((sizes[i], raw_size, (rx * 32 + x, rz * 32 + z)))
+        self._add_largest(largest)
+
+    def merge(self, other):
+        """ Adds the statistics of other ChunkSizeStats to this one. """
+
+        self.chunks += other.chunks
+        self.total_size += other.total_size
+        self.raw_chunks += other.raw_chunks
+        self.total_raw_size += other.total_raw_size
+        for i in range(len(self.histogram)):
+            self.histogram[i] += other.histogram[i]
+            self.raw_histogram[i] += other.raw_histogram[i]
+        self._add_largest(other.largest)
+        self._add_near_limit(other.near_limit)
+
+    def _add_largest(self, largest):
+        self.largest = nlargest(SIZE_LARGEST, self.largest + list(largest),
+                                key=lambda t: (t[0], t[2]))
+
+    def _add_near_limit(self, near_limit):
+        self.near_limit = sorted(self.near_limit + list(near_limit), reverse=True)
+
+
+class SectorUsage:
+    """ How the sectors of a region file, a region set or a world are used.
+
+    Made while scanning from the region header, already read by nbt.RegionFile,
+    see from_region_file(). They are added to get the usage of a region set or a
+    world, see RegionSet.get_sector_usage().
+
+    Attributes:
+     - regions -- Integer, number of region files
+     - file_size -- Integer, size in bytes of the region files
+     - chunk_data -- Integer, bytes of the data of the chunks with a sane header,
+                     their 4 bytes of length included
+     - allocated -- Integer, sectors allocated to the chunks in the region headers
+     - required -- Integer, sectors needed by the data of the chunks with a sane
+                   header, what a region file with no gaps would use
+     - holes -- Integer, free sectors between the region header and the last
+                allocated sector
+     - hole_count -- Integer, number of runs of free sectors
+     - trailing -- Integer, bytes after the last allocated sector
+
+    """
+
+    __slots__ = ('regions', 'file_size', 'chunk_data', 'allocated', 'required',
+                 'holes', 'hole_count', 'trailing')
+
+    def __init__(self):
+        self.regions = 0
+        self.file_size = 0
+        self.chunk_data = 0
+        self.allocated = 0
+        self.required = 0
+        self.holes = 0
+        self.hole_count = 0
+        self.trailing = 0
+
+    @classmethod
+    def from_region_file(cls, region_file):
+        """ Returns the SectorUsage of a nbt.RegionFile.
+
+        Only the metadata of the chunks is used, the region file is not read
+        again. The sectors and the data shared by chunks overlapping others
+        are counted once, and the sectors out of the file are not counted.
+
+        """
+
+        usage = cls()
+        usage.regions = 1
+        usage.file_size = region_file.size
+        sectors = (region_file.size + SECTOR_LENGTH - 1) // SECTOR_LENGTH
+        used = bytearray(max(sectors, 2))
+        used[0:2] = b"\x01\x01"
+        spans = []
+        for m in region_file.metadata.values():
+            if m.blockstart >= 2 and m.blocklength:
+                end = min(m.blockstart + m.blocklength, sectors)
+                if end > m.blockstart:
+                    used[m.blockstart:end] = b"\x01" * (end - m.blockstart)
+            if m.status in (STATUS_CHUNK_OK, STATUS_CHUNK_OVERLAPPING):
+                spans.append((m.blockstart, m.length))
+
+        # Overlapping chunks share data and sectors, count their union. With
+        # the chunks sorted by their start, only the part of a chunk after the
+        # end of the previous ones is new.
+        data_end = sectors_end = 0
+        for start, length in sorted(spans):
+            end = start * SECTOR_LENGTH + length + 4
+            usage.chunk_data += max(0, end - max(start * SECTOR_LENGTH, data_end))
+            data_end = max(data_end, end)
+            end = start + get_sectors(length)
+            usage.required += max(0, end - max(start, sectors_end))
+            sectors_end = max(sectors_end, end)
+
+        last = used.rstrip(b"\x00")
+        usage.allocated = last.count(1) - 2
+        usage.holes = len(last) - 2 - usage.allocated
+        usage.hole_count = len([run for run in last.split(b"\x01") if run])
+        usage.trailing = max(0, region_file.size - len(last) * SECTOR_LENGTH)
+        return usage
+
+    def merge(self, other):
+        """ Adds the usage of other SectorUsage to this one. """
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    @property
+    def compacted_size(self):
+        """ Size in bytes of the region files with no free sectors. """
+        return (2 * self.regions + self.required) * SECTOR_LENGTH
+
+    @property
+    def savings(self):
+        """ Bytes that would be freed compacting the region files. """
+        return max(0, self.file_size - self.compacted_size)
+
+    @property
+    def padding(self):
+        """ Bytes of the region files not used by the headers or the data of the chunks. """
+        return max(0, self.file_size - 2 * self.regions * SECTOR_LENGTH - self.chunk_data)
+
+    def to_dict(self):
+        """ Returns the usage as a dictionary that can be stored as JSON. """
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    @classmethod
+    def from_dict(cls, d):
+        """ Returns a SectorUsage from a dictionary returned by to_dict(). """
+        usage = cls()
+        for name in cls.__slots__:
+            setattr(usage, name, d[name])
+        return usage
+
+
+def generate_size_report(stats):
+    """ Returns a human readable string with the statistics of the chunk sizes.
+
+    Inputs:
+     - stats -- ChunkSizeStats object
+
+    """
+
+    if not stats.chunks:
+        return "\nChunk sizes: No chunks found."
+
+    text = "\nChunk sizes: {0} chunks, {1} compressed (average {2}).".format(
+        stats.chunks, format_size(stats.total_size),
+        format_size(stats.total_size // stats.chunks))
+    if stats.raw_chunks:
+        text += "\n {0} chunks decompressed, {1} of data (average {2}).".format(
+            stats.raw_chunks, format_size(stats.total_raw_size),
+            format_size(stats.total_raw_size // stats.raw_chunks))
+    text += "\n"
+
+    # Only the bins up to the biggest chunk
+    last = max(i for i in range(len(stats.histogram))
+               if stats.histogram[i] or stats.raw_histogram[i])
+    columns = [["Size"] + [_bin_label(i) for i in range(last + 1)],
+               ["Compressed"] + stats.histogram[:last + 1]]
+    if stats.raw_chunks:
+        columns.append(["Uncompressed"] + stats.raw_histogram[:last + 1])
+    text += table(columns)
+
+    text += "\nBiggest chunks:"
+    for size, raw_size, coords in stats.largest:
+        text += "\n Chunk {0}: {1} compressed, {2} sectors".format(
+            coords, format_size(size), get_sectors(size))
+        if raw_size is not None:
+            text += ", {0} uncompressed".format(format_size(raw_size))
+
+    if stats.near_limit:
+        text += "\n{0} chunks need {1} sectors or more of the {2} allowed by the region format:".format(
+            len(stats.near_limit), c.CHUNK_SECTOR_WARNING, c.CHUNK_SECTOR_LIMIT)
+        for size, coords in stats.near_limit:
+            text += "\n Chunk {0}: {1} compressed, {2} sectors".format(
+                coords, format_size(size), get_sectors(size))
+    return text
+
+
+def generate_region_size_table(regions):
+    """ Returns a table with the chunk sizes of every region file.
+
+    Inputs:
+     - regions -- List of ScannedRegionFile objects
+
+    """
+
+    columns = [["Region file"], ["Chunks"], ["Compressed"], ["Uncompressed"], ["Biggest"]]
+    for r in sorted(regions, key=lambda r: r.coords):
+        stats = r.get_size_stats()
+        if not stats.chunks:
+            continue
+        columns[0].append(r.filename)
+        columns[1].append(stats.chunks)
+        columns[2].append(format_size(stats.total_size))
+        columns[3].append(format_size(stats.total_raw_size) if stats.raw_chunks else "?")
+        columns[4].append(format_size(stats.largest[0][0]))
+    return table(columns)
+
+
+def generate_usage_report(usage):
+    """ Returns a human readable string with the sector usage of some region files.
+
+    Inputs:
+     - usage -- SectorUsage object
+
+    """
+
+    if not usage.regions or not usage.file_size:
+        return "\nRegion file usage: No region files with data."
+
+    text = "\nRegion file usage: {0} region files, {1} on disk.".format(
+        usage.regions, format_size(usage.file_size))
+    text += "\n Chunk data: {0} ({1:.1%}), padding: {2} ({3:.1%}).".format(
+        format_size(usage.chunk_data), usage.chunk_data / usage.file_size,
+        format_size(usage.padding), usage.padding / usage.file_size)
+    text += "\n Sectors: {0} allocated, {1} needed by the chunks.".format(
+        usage.allocated, usage.required)
+    text += "\n Free sectors: {0} in {1} holes, {2} after the last chunk.".format(
+        usage.holes, usage.hole_count, format_size(usage.trailing))
+    text += "\n Compacting the region files would save {0} ({1:.1%}).".format(
+        format_size(usage.savings), usage.savings / usage.file_size)
+    return text
+
+
+def generate_region_usage_table(regions):
+    """ Returns a table with the sector usage of every region file.
+
+    Inputs:
+     - regions -- List of ScannedRegionFile objects
+
+    """
+
+    columns = [["Region file"], ["Size"], ["Chunk data"], ["Holes"], ["Trailing"], ["Savings"]]
+    for r in sorted(regions, key=lambda r: r.coords):
+        usage = r.usage
+        if usage is None or not usage.file_size:
+            continue
+        columns[0].append(r.filename)
+        columns[1].append(format_size(usage.file_size))
+        columns[2].append("{0:.1%}".format(usage.chunk_data / usage.file_size))
+        columns[3].append("{0} in {1}".format(usage.holes, usage.hole_count))
+        columns[4].append(format_size(usage.trailing))
+        columns[5].append(format_size(usage.savings))
+    return table(columns)
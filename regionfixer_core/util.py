@@ -21,9 +21,9 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import platform
 import sys
 import traceback
+from math import sqrt
 
 
 def get_str_from_traceback(ty, value, tb):
@@ -89,7 +89,8 @@ def is_bare_console():
 
     """
 
-    if platform.system() == 'Windows':
+    # sys.platform is the same as platform.system() here, and importing platform is slow
+    if sys.platform == 'win32':
         try:
             import ctypes
             GetConsoleProcessList = ctypes.windll.kernel32.GetConsoleProcessList
@@ -164,3 +165,41 @@ def table(columns):
     text += "-" * ml_total
     return text
 
+
+
+def wilson_interval(successes, trials, z=1.96):
+    """ Returns the Wilson score interval of a proportion.
+
+    Inputs:
+     - successes -- Integer, number of successes in the sample
+     - trials -- Integer, size of the sample
+     - z -- Float, quantile of the normal distribution for the confidence wanted,
+            defaults to 1.96 (95% confidence)
+
+    Return:
+     - low, high -- Floats with the bounds of the interval
+
+    Unlike the normal approximation it behaves well with small samples and
+    proportions near 0, which is the usual case for problems in chunks.
+
+    """
+
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    z2 = z * z
+    center = (p + z2 / (2 * trials)) / (1 + z2 / trials)
+    margin = z * sqrt(p * (1 - p) / trials + z2 / (4 * trials * trials)) / (1 + z2 / trials)
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def format_size(size):
+    """ Returns a human readable string with a size in bytes, like '1.5 MiB'. """
+
+    for unit in ("bytes", "KiB", "MiB", "GiB"):
+        if abs(size) < 1024 or unit == "GiB":
+            break
+        size /= 1024
+    if unit == "bytes":
+        return "{0} bytes".format(size)
+    return "{0:.1f} {1}".format(size, unit)
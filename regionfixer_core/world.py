@@ -23,13 +23,20 @@
 
 from glob import glob
 from os.path import join, split, exists, isfile
-from os import remove
+from os import remove, scandir
+from collections import namedtuple
 from shutil import copy
+from array import array
+from itertools import compress, repeat
+from operator import gt
 import zlib
+from math import sqrt
 
 import nbt.region as region
 import nbt.nbt as nbt
-from .util import table
+from .util import table, wilson_interval
+from .sizes import ChunkSizeStats, SectorUsage
+from .census import EntityCensus
 from nbt.nbt import TAG_List
 
 import regionfixer_core.constants as c
@@ -41,6 +48,75 @@ class InvalidFileName(IOError):
     pass
 
 
+# A region file found in a directory, see find_region_files(). The size and
+# the modification time are the ones it had when it was found.
+RegionFileEntry = namedtuple('RegionFileEntry', ['path', 'size', 'mtime'])
+
+
+def _scandir(path):
+    """ Returns a list with the os.DirEntry objects of a directory, an empty
+    list if it can't be read. """
+    try:
+        with scandir(path) as it:
+            return list(it)
+    except OSError:
+        return []
+
+
+def find_region_files(directory):
+    """ Finds the region files (r.*.*.mca) of a directory.
+
+    Inputs:
+     - directory -- String with the path of the directory
+
+    Return:
+     - entries -- List of RegionFileEntry, in the order given by the file system.
+                  Empty if the directory doesn't exist.
+
+    It reads the directory once with os.scandir(), which is faster than glob()
+    for directories with a lot of files, and takes the size and the modification
+    time of every file, the size is used to schedule the scan.
+
+    """
+
+    entries = []
+    for entry in _scandir(directory):
+        name = entry.name
+        # The same files as glob("r.*.*.mca")
+        if name.startswith('r.') and name.endswith('.mca') and name.count('.') >= 3:
+            try:
+                st = entry.stat()
+            except OSError:
+                # Removed or broken link, let the scan find out
+                entries.append(RegionFileEntry(entry.path, None, None))
+                continue
+            entries.append(RegionFileEntry(entry.path, st.st_size, st.st_mtime))
+    return entries
+
+
+def get_region_coords(filename):
+    """ Returns the coordinates of a region file from its name.
+
+    Inputs:
+     - filename -- String with the name of the region file, like r.1.-2.mca
+
+    Return:
+     - coordX, coordZ -- Integers with the x and z coordinates of the region file.
+
+    Raises InvalidFileName if the name doesn't have the coordinates.
+
+    """
+
+    l = filename.split('.')
+    try:
+        coordX = int(l[1])
+        coordZ = int(l[2])
+    except (ValueError, IndexError):
+        raise InvalidFileName()
+
+    return coordX, coordZ
+
+
 class ScannedDataFile:
     """ Stores all the information of a scanned data file. 
     
@@ -79,6 +155,47 @@ class ScannedChunk:
     # They take too much memory.
 
 
+# Chunks in a region file, every chunk has a slot in the arrays of
+# ScannedRegionFile
+REGION_CHUNKS = 32 * 32
+
+# Status stored in the slot of a chunk that is not in the results. It has to
+# fit in a signed char and not be in CHUNK_STATUSES.
+_NO_CHUNK = -128
+
+# Number of entities stored for the chunks where they couldn't be counted,
+# they are None in the status tuples
+_UNKNOWN_ENTITIES = -1
+
+# Size stored for the chunks with an unknown size, they are None in the size
+# tuples
+_UNKNOWN_SIZE = -1
+
+# Bits stored for the chunks over the limits of TRIMMABLE_CHUNK_PROBLEMS, see
+# ScannedRegionFile.set_chunk_overloads()
+_OVERLOAD_BITS = dict((status, 1 << i) for i, status in enumerate(c.TRIMMABLE_CHUNK_PROBLEMS))
+
+
+def _chunk_slot(x, z):
+    """ Returns the slot of a chunk in the arrays of ScannedRegionFile.
+
+    The slots follow the order in which the chunks are scanned (x first, then
+    z), so keys() returns the chunks in the same order as the scan.
+    """
+    if not (0 <= x < 32 and 0 <= z < 32):
+        raise KeyError((x, z))
+    return x * 32 + z
+
+
+def _overload_status(flags):
+    """ Returns the status of a chunk under the entity limit with the given
+    overload bits, with the same precedence used by scan.scan_chunk(). """
+    for status in c.TRIMMABLE_CHUNK_PROBLEMS:
+        if flags & _OVERLOAD_BITS[status]:
+            return status
+    return c.CHUNK_OK
+
+
 class ScannedRegionFile:
     """ Stores all the scan information for a region file.
 
@@ -88,8 +205,23 @@ class ScannedRegionFile:
                at which the region file has been scanned. None by default.
      - folder -- Used to enhance print()
 
+    The results of the chunks are stored in two arrays with a slot for every
+    chunk of the region file, one with the statuses and other with the number
+    of entities, instead of a dictionary of tuples. A scanned world can have
+    millions of chunks, and the arrays take about 5KiB per region file. They
+    are still read and written with the same (num_entities, status) tuples.
+
+    The sizes of the chunks are stored the same way in other two arrays, see
+    set_chunk_size(), and the limits other than the entity limit a chunk is
+    over in another one, see set_chunk_overloads().
+
     """
 
+    __slots__ = ('path', 'filename', 'folder', 'x', 'z', 'coords',
+                 '_statuses', '_entities', '_sizes', '_raw_sizes', '_overloads',
+                 'scan_time', 'status', 'scanned', 'shard', 'previous_scan',
+                 'sample', 'file_size', 'census', 'usage')
+
     def __init__(self, path, scanned_time=None, folder=""):
         # general region file info
         self.path = path
@@ -99,15 +231,21 @@ class ScannedRegionFile:
         self.x, self.z = self.get_coords()
         self.coords = (self.x, self.z)
 
-        # dictionary storing all the state tuples of all the chunks
-        # in the region file, keys are the local coords of the chunk
-        # sometimes called header coords
-        self._chunks = {}
+        # arrays with the status and the number of entities of all the chunks
+        # in the region file, see _chunk_slot(). They are created when the
+        # first chunk is stored, the region files not scanned yet don't
+        # need them.
+        self._statuses = None
+        self._entities = None
 
-        # Dictionary containing counters to for all the chunks
-        self._counts = {}
-        for s in c.CHUNK_STATUSES:
-            self._counts[s] = 0
+        # arrays with the compressed and uncompressed sizes of the chunks in
+        # bytes, created when the first size is stored
+        self._sizes = None
+        self._raw_sizes = None
+
+        # array with the bits of the TRIMMABLE_CHUNK_PROBLEMS of every chunk,
+        # created when the first chunk over one of these limits is stored
+        self._overloads = None
 
         # time when the scan for this file finished
         self.scan_time = scanned_time
@@ -118,6 +256,30 @@ class ScannedRegionFile:
         # has the file been scanned yet?
         self.scanned = False
 
+        # (index, count) when this object holds the results of only a part
+        # of the chunks, see RegionFileShard in scan.py
+        self.shard = None
+
+        # (header, chunks, raw_sizes, overloads) with the results of the last scan of this file,
+        # used to scan only the chunks that changed, see ScanCache.get_previous()
+        self.previous_scan = None
+
+        # (population, sampled, problems) when only a random sample of the
+        # chunks with a sane header has been scanned, see scan.choose_sample_chunks()
+        self.sample = None
+
+        # Size in bytes of the file when it was found, used to schedule the
+        # scan. None if unknown. See find_region_files()
+        self.file_size = None
+
+        # EntityCensus with the entities of the region file by type, only
+        # when the scan makes a census, see ScanPool
+        self.census = None
+
+        # SectorUsage with the sectors used and wasted in the region file,
+        # see sizes.py
+        self.usage = None
+
     @property
     def oneliner_status(self):
         """ On line description of the status of the region file. """
@@ -145,11 +307,161 @@ class ScannedRegionFile:
         return text
 
     def __getitem__(self, key):
-        return self._chunks[key]
+        i = _chunk_slot(*key)
+        if self._statuses is None or self._statuses[i] == _NO_CHUNK:
+            raise KeyError(key)
+        num_entities = self._entities[i]
+        if num_entities == _UNKNOWN_ENTITIES:
+            num_entities = None
+        return (num_entities, self._statuses[i])
 
     def __setitem__(self, key, value):
-        self._chunks[key] = value
-        self._counts[value[c.TUPLE_STATUS]] += 1
+        i = _chunk_slot(*key)
+        if self._statuses is None:
+            self._statuses = array('b', [_NO_CHUNK]) * REGION_CHUNKS
+            self._entities = array('i', [0]) * REGION_CHUNKS
+        num_entities = value[c.TUPLE_NUM_ENTITIES]
+        self._statuses[i] = value[c.TUPLE_STATUS]
+        self._entities[i] = _UNKNOWN_ENTITIES if num_entities is None else num_entities
+        # New results, the overloads of the old ones are not valid
+        if self._overloads is not None:
+            self._overloads[i] = 0
+
+    def get_chunk_overloads(self, key):
+        """ Returns the limits other than the entity limit a chunk is over.
+
+        Inputs:
+         - key -- Tuple with the local coordinates of the chunk
+
+        Return:
+         - overloads -- List with the statuses in TRIMMABLE_CHUNK_PROBLEMS of the
+                        chunk, in the same order. Empty if it's under all the
+                        limits or they are unknown.
+
+        """
+
+        i = _chunk_slot(*key)
+        if self._overloads is None:
+            return []
+        flags = self._overloads[i]
+        return [s for s in c.TRIMMABLE_CHUNK_PROBLEMS if flags & _OVERLOAD_BITS[s]]
+
+    def set_chunk_overloads(self, key, overloads):
+        """ Stores the limits other than the entity limit a chunk is over.
+
+        Inputs:
+         - key -- Tuple with the local coordinates of the chunk
+         - overloads -- Sequence with statuses in TRIMMABLE_CHUNK_PROBLEMS,
+                        see scan.check_chunk_overloads()
+
+        The status of a chunk only has the first problem found, a chunk with
+        too many entities can have too many block entities too. These are
+        kept so the chunk gets the right status when the entity limit changes
+        or one of the problems is trimmed, see set_entity_limit(). Storing new
+        results for the chunk with chunk[key] = tuple clears them.
+
+        """
+
+        i = _chunk_slot(*key)
+        if self._overloads is None:
+            if not overloads:
+                return
+            self._overloads = array('b', [0]) * REGION_CHUNKS
+        flags = 0
+        for status in overloads:
+            flags |= _OVERLOAD_BITS[status]
+        self._overloads[i] = flags
+
+    def get_chunk_size(self, key):
+        """ Returns the sizes of a chunk found by the scan.
+
+        Inputs:
+         - key -- Tuple with the local coordinates of the chunk
+
+        Return:
+         - (size, raw_size) -- Tuple with the size in bytes of the compressed
+                               data of the chunk and the size of its data once
+                               decompressed. Any of them is None if unknown.
+
+        """
+
+        i = _chunk_slot(*key)
+        if self._sizes is None:
+            return None, None
+        size = self._sizes[i]
+        raw_size = self._raw_sizes[i]
+        return (None if size == _UNKNOWN_SIZE else size,
+                None if raw_size == _UNKNOWN_SIZE else raw_size)
+
+    def set_chunk_size(self, key, size, raw_size):
+        """ Stores the sizes of a chunk, see get_chunk_size().
+
+        Inputs:
+         - key -- Tuple with the local coordinates of the chunk
+         - size -- Integer with the length in bytes of the compressed data of
+                   the chunk, as in its header. None if unknown.
+         - raw_size -- Integer with the length in bytes of the decompressed
+                       data. None if unknown.
+
+        """
+
+        i = _chunk_slot(*key)
+        if self._sizes is None:
+            self._sizes = array('i', [_UNKNOWN_SIZE]) * REGION_CHUNKS
+            self._raw_sizes = array('i', [_UNKNOWN_SIZE]) * REGION_CHUNKS
+        self._sizes[i] = _UNKNOWN_SIZE if size is None else size
+        self._raw_sizes[i] = _UNKNOWN_SIZE if raw_size is None else raw_size
+
+    def get_size_stats(self):
+        """ Returns the statistics of the sizes of the chunks of the region file.
+
+        Return:
+         - stats -- ChunkSizeStats object, see sizes.py
+
+        """
+
+        stats = ChunkSizeStats()
+        if self._sizes is not None:
+            stats.add_sizes(self._sizes, self._raw_sizes, self.coords)
+        return stats
+
+    def merge_shard(self, other):
+        """ Adds the results of other part of the same region file to this one.
+
+        Inputs:
+         - other -- ScannedRegionFile of the same region file with the results of
+                    other chunks.
+
+        The chunks of the shards don't overlap. If a shard found a problem in the
+        region file itself that status is kept.
+
+        """
+
+        assert other.path == self.path
+        for k in other.keys():
+            self[k] = other[k]
+            if other._sizes is not None:
+                self.set_chunk_size(k, *other.get_chunk_size(k))
+            if other._overloads is not None:
+                self.set_chunk_overloads(k, other.get_chunk_overloads(k))
+        if other.status in c.REGION_PROBLEMS:
+            self.status = other.status
+        if other.scan_time and (not self.scan_time or other.scan_time > self.scan_time):
+            self.scan_time = other.scan_time
+        if other.sample is not None:
+            if self.sample is None:
+                self.sample = other.sample
+            else:
+                self.sample = tuple(a + b for a, b in zip(self.sample, other.sample))
+        self.scanned = self.scanned and other.scanned
+        if other.census is not None:
+            if self.census is None:
+                self.census = other.census
+            else:
+                self.census.merge(other.census)
+        # All the shards read the same header
+        if self.usage is None:
+            self.usage = other.usage
 
     def get_coords(self):
         """ Returns the region file coordinates as two integers.
@@ -165,16 +477,7 @@ class ScannedRegionFile:
         if self.x != None and self.z != None:
             return self.x, self.z
         else:
-            splited = split(self.filename)
-            filename = splited[1]
-            l = filename.split('.')
-            try:
-                coordX = int(l[1])
-                coordZ = int(l[2])
-            except ValueError:
-                raise InvalidFileName()
-
-            return coordX, coordZ
+            return get_region_coords(split(self.filename)[1])
 
     def keys(self):
         """Returns a list with all the local coordinates (header coordinates).
@@ -184,7 +487,10 @@ class ScannedRegionFile:
                     region file header as integer tuples
         """
 
-        return list(self._chunks.keys())
+        statuses = self._statuses
+        if statuses is None:
+            return []
+        return [divmod(i, 32) for i in range(REGION_CHUNKS) if statuses[i] != _NO_CHUNK]
 
     @property
     def has_problems(self):
@@ -227,12 +533,12 @@ class ScannedRegionFile:
 
         """
 
+        if self._statuses is None:
+            return 0
         if status == None:
-            counter = 0
-            for s in c.CHUNK_STATUSES:
-                counter += self._counts[s]
+            counter = REGION_CHUNKS - self._statuses.count(_NO_CHUNK)
         else:
-            counter = self._counts[status]
+            counter = self._statuses.count(status)
 
         return counter
 
@@ -270,12 +576,15 @@ class ScannedRegionFile:
         """
 
         l = []
-        for ck in list(self.keys()):
-            t = self[ck]
-            if status == t[c.TUPLE_STATUS]:
-                l.append((self.get_global_chunk_coords(*ck), t))
-            elif status == None:
-                l.append((self.get_global_chunk_coords(*ck), t))
+        statuses = self._statuses
+        if statuses is None or (status != None and not statuses.count(status)):
+            return l
+        for i in range(REGION_CHUNKS):
+            s = statuses[i]
+            if s == _NO_CHUNK or (status != None and s != status):
+                continue
+            ck = divmod(i, 32)
+            l.append((self.get_global_chunk_coords(*ck), self[ck]))
 
         return l
 
@@ -449,6 +758,9 @@ class ScannedRegionFile:
         Return:
          - counter -- Integer with the number of removed entities.
 
+        The chunks get the status of the other limit they are over, or
+        c.CHUNK_OK, see set_chunk_overloads().
+
         """
 
         status = c.CHUNK_TOO_MANY_ENTITIES
@@ -458,9 +770,11 @@ class ScannedRegionFile:
             global_coords = ck[0]
             local_coords = _get_local_chunk_coords(*global_coords)
             counter += self.remove_chunk_entities(*local_coords)
-            # create new status tuple:
-            #                    (num_entities, chunk status)
-            self[local_coords] = (0, c.CHUNK_OK)
+            # The chunk keeps the other limits it's over, see
+            # set_chunk_overloads()
+            overloads = self.get_chunk_overloads(local_coords)
+            self[local_coords] = (0, overloads[0] if overloads else c.CHUNK_OK)
+            self.set_chunk_overloads(local_coords, overloads)
         return counter
 
     def remove_chunk_entities(self, x, z):
@@ -480,6 +794,92 @@ class ScannedRegionFile:
 
         return delete_entities( region.RegionFile(self.path), x, z )
 
+    def trim_problematic_chunks(self, status):
+        """ Empties the lists of the chunks with the given status.
+
+        Inputs:
+         - status -- Integer with the status of the chunks to trim. See
+                     TRIMMABLE_CHUNK_PROBLEMS in constants.py
+
+        Return:
+         - counter -- Integer with the number of items removed from the lists.
+
+        The block entities or the scheduled ticks of the chunks are removed,
+        see trim_chunk_lists(). The chunks get the status of the other limit
+        they are over, or c.CHUNK_OK, see set_chunk_overloads().
+
+        """
+
+        assert status in c.TRIMMABLE_CHUNK_PROBLEMS
+        counter = 0
+        bad_chunks = self.list_chunks(status)
+        if not bad_chunks:
+            return counter
+        region_file = region.RegionFile(self.path)
+        for global_coords, status_tuple in bad_chunks:
+            local_coords = _get_local_chunk_coords(*global_coords)
+            counter += trim_chunk_lists(region_file, local_coords[0], local_coords[1],
+                                        c.CHUNK_PROBLEMS_TAGS[status])
+            overloads = [s for s in self.get_chunk_overloads(local_coords) if s != status]
+            self[local_coords] = (status_tuple[c.TUPLE_NUM_ENTITIES],
+                                  overloads[0] if overloads else c.CHUNK_OK)
+            self.set_chunk_overloads(local_coords, overloads)
+        return counter
+
+    def set_entity_limit(self, entity_limit):
+        """ Updates the status of the chunks for a new entity limit.
+
+        Inputs:
+         - entity_limit -- Integer, chunks with more entities than this have the
+                           status c.CHUNK_TOO_MANY_ENTITIES.
+
+        Return:
+         - changed -- Integer with the number of chunks that changed status.
+
+        It uses the number of entities stored by the scan, the region file is
+        not read. Only the chunks with the status c.CHUNK_OK, one of
+        TRIMMABLE_CHUNK_PROBLEMS or c.CHUNK_TOO_MANY_ENTITIES can change, the
+        same as in scan.scan_chunk(). A chunk under the new limit gets back the
+        status of the other limits it's over, see set_chunk_overloads().
+
+        """
+
+        statuses = self._statuses
+        if statuses is None:
+            return 0
+        entities = self._entities
+        too_many = c.CHUNK_TOO_MANY_ENTITIES
+        # Most of the region files have no chunks over the limit, skip them
+        # without looking at every chunk
+        if not statuses.count(too_many) and max(entities) <= entity_limit:
+            return 0
+
+        # Look for the chunks to change without a python loop over the 1024
+        # slots: the slots over the limit come from one pass over the entities,
+        # done in C by map() and compress(), and the slots with the status from
+        # searching the bytes of the statuses. Only the chunks found are looked
+        # at in python, usually a few.
+        flagged = []
+        data = statuses.tobytes()
+        i = data.find(too_many)
+        while i != -1:
+            flagged.append(i)
+            i = data.find(too_many, i + 1)
+
+        below = [c.CHUNK_OK] + c.TRIMMABLE_CHUNK_PROBLEMS
+        changed = 0
+        for i in compress(range(REGION_CHUNKS), map(gt, entities, repeat(entity_limit))):
+            if statuses[i] in below:
+                statuses[i] = too_many
+                changed += 1
+        overloads = self._overloads
+        for i in flagged:
+            if entities[i] <= entity_limit:
+                statuses[i] = _overload_status(overloads[i]) if overloads is not None else c.CHUNK_OK
+                changed += 1
+
+        return changed
+
     def rescan_entities(self, options):
         """ Updates the status of all the chunks after changing entity_limit.
         
@@ -487,25 +887,273 @@ class ScannedRegionFile:
          - options -- argparse arguments, the whole argparse.ArgumentParser() object as used
                       by regionfixer.py
 
+        See set_entity_limit().
+
+        """
+
+        self.set_entity_limit(options.entity_limit)
+
+
+class ChunkGrid:
+    """ Stores the results of the chunks of a dimension by their global coordinates.
+
+    The grid is made of the arrays of the scanned region files, a block of
+    32x32 chunks for every region file, indexed by the region coordinates. So
+    it only takes memory for the region files that exist, a dimension can have
+    region files very far away from the rest.
+
+    The counts of the whole grid are kept as the region files are added. The
+    queries for an area only look at the region files that overlap it, and
+    count or list every row of chunks of a region file at once using slices of
+    its arrays. Used by RegionSet.
+
+    """
+
+    def __init__(self):
+        # (regionX, regionZ): ScannedRegionFile
+        self._regions = {}
+
+        # (regionX, regionZ): tuple with the counts of chunks of the region
+        # file when it was added, in the order of c.CHUNK_STATUSES
+        self._region_counts = {}
+
+        # Counters for all the chunks in the grid
+        self._counts = {}
+        for s in c.CHUNK_STATUSES:
+            self._counts[s] = 0
+
+    def __len__(self):
+        return len(self._regions)
+
+    def add(self, scanned_regionfile):
+        """ Adds the results of a region file to the grid.
+
+        Inputs:
+         - scanned_regionfile -- ScannedRegionFile to add. It replaces the
+                                 results of the same region file if they were
+                                 added before.
+
+        """
+
+        coords = scanned_regionfile.get_coords()
+        old_counts = self._region_counts.get(coords)
+        if old_counts is not None:
+            for s, n in zip(c.CHUNK_STATUSES, old_counts):
+                self._counts[s] -= n
+
+        counts = tuple(scanned_regionfile.count_chunks(s) for s in c.CHUNK_STATUSES)
+        for s, n in zip(c.CHUNK_STATUSES, counts):
+            self._counts[s] += n
+
+        self._regions[coords] = scanned_regionfile
+        self._region_counts[coords] = counts
+
+    def recount(self):
+        """ Counts again the chunks of all the region files in the grid.
+
+        Used when the results of the region files have been changed in place,
+        for example by set_entity_limit() or after fixing chunks.
+        """
+
+        for s in c.CHUNK_STATUSES:
+            self._counts[s] = 0
+        for coords, r in self._regions.items():
+            counts = tuple(r.count_chunks(s) for s in c.CHUNK_STATUSES)
+            for s, n in zip(c.CHUNK_STATUSES, counts):
+                self._counts[s] += n
+            self._region_counts[coords] = counts
+
+    def set_entity_limit(self, entity_limit):
+        """ Updates the status of all the chunks in the grid for a new entity limit.
+
+        Inputs:
+         - entity_limit -- Integer with the new entity limit
+
+        Return:
+         - changed -- Integer with the number of chunks that changed status.
+
+        See ScannedRegionFile.set_entity_limit(). The counts are updated at the end.
+
         """
 
-        for ck in list(self.keys()):
-            # for safety reasons use a temporary list to generate the
-            # new tuple
-            t = [0, 0]
-            if self[ck][c.TUPLE_STATUS] in (c.CHUNK_TOO_MANY_ENTITIES, c.CHUNK_OK):
-                # only touch the ok chunks and the too many entities chunk
-                if self[ck][c.TUPLE_NUM_ENTITIES] > options.entity_limit:
-                    # now it's a too many entities problem
-                    t[c.TUPLE_NUM_ENTITIES] = self[ck][c.TUPLE_NUM_ENTITIES]
-                    t[c.TUPLE_STATUS] = c.CHUNK_TOO_MANY_ENTITIES
+        changed = 0
+        for r in self._regions.values():
+            changed += r.set_entity_limit(entity_limit)
+        self.recount()
+        return changed
+
+    def count_chunks(self, status=None):
+        """ Returns the number of chunks in the grid with the given status.
+
+        Inputs:
+         - status -- Integer with the chunk status to count, see c.CHUNK_STATUSES.
+                     If None counts all the chunks.
 
-                elif self[c][c.TUPLE_NUM_ENTITIES] <= options.entity_limit:
-                    # the new limit says it's a normal chunk
-                    t[c.TUPLE_NUM_ENTITIES] = self[ck][c.TUPLE_NUM_ENTITIES]
-                    t[c.TUPLE_STATUS] = c.CHUNK_OK
+        """
 
-                self[ck] = tuple(t)
+        if status is None:
+            return sum(self._counts.values())
+        return self._counts[status]
+
+    def list_chunks(self, status=None):
+        """ Returns a list of all the chunks in the grid with the given status.
+
+        Inputs:
+         - status -- Integer with the chunk status to list, see c.CHUNK_STATUSES.
+                     If None lists all the chunks.
+
+        Return:
+         - l -- List with tuples like (global_coordinates, status_tuple), see
+                ScannedRegionFile.list_chunks(). Sorted by region file.
+
+        """
+
+        l = []
+        for coords in sorted(self._regions):
+            l.extend(self._regions[coords].list_chunks(status))
+        return l
+
+    def _get_regions_in_box(self, x1, z1, x2, z2):
+        """ Returns a sorted list with the coordinates of the region files in
+        the grid that overlap a box of chunks. """
+
+        rx1, rz1, rx2, rz2 = x1 >> 5, z1 >> 5, x2 >> 5, z2 >> 5
+        if (rx2 - rx1 + 1) * (rz2 - rz1 + 1) <= len(self._regions):
+            return [(rx, rz) for rx in range(rx1, rx2 + 1) for rz in range(rz1, rz2 + 1)
+                    if (rx, rz) in self._regions]
+        # A big box and a few region files
+        return sorted(k for k in self._regions
+                      if rx1 <= k[0] <= rx2 and rz1 <= k[1] <= rz2)
+
+    def _get_rows(self, x1, z1, x2, z2, get_span):
+        """ Yields the rows of chunks of an area in the arrays of the region files.
+
+        Inputs:
+         - x1, z1, x2, z2 -- Integers, the box of global chunk coordinates of the area
+         - get_span -- Function that takes a global X chunk coordinate and returns
+                       a tuple (z1, z2) with the Z coordinates of the area for
+                       that X, or None.
+
+        Yields tuples (scanned_regionfile, start, end), the slots from start to
+        end (not included) of the region file are in the area.
+
+        """
+
+        for coords in self._get_regions_in_box(x1, z1, x2, z2):
+            r = self._regions[coords]
+            if r._statuses is None:
+                continue
+            bx, bz = coords[0] * 32, coords[1] * 32
+            for x in range(max(x1, bx), min(x2, bx + 31) + 1):
+                span = get_span(x)
+                if span is None:
+                    continue
+                lz1 = max(span[0], bz) - bz
+                lz2 = min(span[1], bz + 31) - bz
+                if lz1 > lz2:
+                    continue
+                start = _chunk_slot(x - bx, 0)
+                yield r, start + lz1, start + lz2 + 1
+
+    def _count_rows(self, rows, status):
+        counter = 0
+        for r, start, end in rows:
+            row = r._statuses[start:end]
+            if status is None:
+                counter += len(row) - row.count(_NO_CHUNK)
+            else:
+                counter += row.count(status)
+        return counter
+
+    def _list_rows(self, rows, status):
+        l = []
+        for r, start, end in rows:
+            statuses = r._statuses
+            if status is not None and not statuses[start:end].count(status):
+                continue
+            for i in range(start, end):
+                s = statuses[i]
+                if s == _NO_CHUNK or (status is not None and s != status):
+                    continue
+                ck = divmod(i, 32)
+                l.append((r.get_global_chunk_coords(*ck), r[ck]))
+        return l
+
+    def _get_rectangle_rows(self, x1, z1, x2, z2):
+        x1, x2 = min(x1, x2), max(x1, x2)
+        z1, z2 = min(z1, z2), max(z1, z2)
+        return self._get_rows(x1, z1, x2, z2, lambda x: (z1, z2))
+
+    def _get_radius_rows(self, x, z, radius):
+        def get_span(cx):
+            d = radius * radius - (cx - x) * (cx - x)
+            if d < 0:
+                return None
+            dz = int(sqrt(d))
+            return z - dz, z + dz
+        return self._get_rows(x - radius, z - radius, x + radius, z + radius, get_span)
+
+    def count_chunks_in_rectangle(self, x1, z1, x2, z2, status=None):
+        """ Returns the number of chunks with the given status in a rectangle.
+
+        Inputs:
+         - x1, z1, x2, z2 -- Integers with the global chunk coordinates of two
+                             opposite corners of the rectangle, both included.
+         - status -- Integer with the chunk status to count, see c.CHUNK_STATUSES.
+                     If None counts all the chunks.
+
+        """
+
+        return self._count_rows(self._get_rectangle_rows(x1, z1, x2, z2), status)
+
+    def list_chunks_in_rectangle(self, x1, z1, x2, z2, status=None):
+        """ Returns a list of the chunks with the given status in a rectangle.
+
+        Inputs:
+         - x1, z1, x2, z2 -- Integers with the global chunk coordinates of two
+                             opposite corners of the rectangle, both included.
+         - status -- Integer with the chunk status to list, see c.CHUNK_STATUSES.
+                     If None lists all the chunks.
+
+        Return:
+         - l -- List with tuples like (global_coordinates, status_tuple), see
+                ScannedRegionFile.list_chunks()
+
+        """
+
+        return self._list_rows(self._get_rectangle_rows(x1, z1, x2, z2), status)
+
+    def count_chunks_in_radius(self, x, z, radius, status=None):
+        """ Returns the number of chunks with the given status in a circle.
+
+        Inputs:
+         - x, z -- Integers with the global chunk coordinates of the center
+         - radius -- Integer with the radius in chunks. A chunk is in the circle
+                     if the distance between its coordinates and the center is
+                     not bigger than the radius.
+         - status -- Integer with the chunk status to count, see c.CHUNK_STATUSES.
+                     If None counts all the chunks.
+
+        """
+
+        return self._count_rows(self._get_radius_rows(x, z, radius), status)
+
+    def list_chunks_in_radius(self, x, z, radius, status=None):
+        """ Returns a list of the chunks with the given status in a circle.
+
+        Inputs:
+         - x, z -- Integers with the global chunk coordinates of the center
+         - radius -- Integer with the radius in chunks, see count_chunks_in_radius()
+         - status -- Integer with the chunk status to list, see c.CHUNK_STATUSES.
+                     If None lists all the chunks.
+
+        Return:
+         - l -- List with tuples like (global_coordinates, status_tuple), see
+                ScannedRegionFile.list_chunks()
+
+        """
+
+        return self._list_rows(self._get_radius_rows(x, z, radius), status)
 
 
 class DataSet:
@@ -541,6 +1189,11 @@ class DataSet:
 
         return list(self._set.values())
 
+    def _get_files_to_scan(self):
+        """ Returns a list with the scanned files to send to the scan. """
+
+        return self._get_list()
+
     def __getitem__(self, key):
         return self._set[key]
 
@@ -601,10 +1254,11 @@ class DataFileSet(DataSet):
 
         self.title = title
         self.path = path
-        data_files_path = glob(join(path, "*.dat"))
 
-        for path in data_files_path:
-            d[path] = ScannedDataFile(path)
+        # The same files as glob("*.dat")
+        for entry in _scandir(path):
+            if entry.name.endswith('.dat') and not entry.name.startswith('.'):
+                d[entry.path] = ScannedDataFile(entry.path)
 
         # stores the counts of files
         self._counts = {}
@@ -627,9 +1281,36 @@ class DataFileSet(DataSet):
         assert isinstance(s, self._typevalue)
         self._counts[s.status] += 1
 
+    def _update_statuses(self, results):
+        """ Stores the results of a batch of scanned data files at once.
+
+        Inputs:
+         - results -- List of tuples (path, status)
+
+        Return:
+         - scanned_files -- List with the updated ScannedDataFile objects
+
+        Used by the AsyncScanner instead of _replace_in_data_structure() and
+        _update_counts() for every file. The files of the set are updated in place.
+        """
+
+        counts = self._counts
+        scanned_files = []
+        for path, status in results:
+            f = self._set[path]
+            f.status = status
+            counts[status] += 1
+            scanned_files.append(f)
+        return scanned_files
+
     def count_datafiles(self, status):
         pass
 
+    def get_name(self):
+        """ Return a string with a representative name for the data file set. """
+
+        return self.title.strip().rstrip(':')
+
     def summary(self):
         """ Return a summary of problems found in this set. """
 
@@ -660,35 +1341,84 @@ class RegionSet(DataSet):
 
         if regionset_path:
             self.path = regionset_path
-            self.region_list = glob(join(self.path, "r.*.*.mca"))
+            entries = find_region_files(self.path)
         else:
             self.path = None
-            self.region_list = region_list
-        self._set = {}
-        for path in self.region_list:
+            entries = [RegionFileEntry(path, None, None) for path in region_list]
+        self.region_list = [entry.path for entry in entries]
+
+        # The ScannedRegionFiles are created when they are needed, until then
+        # the values are RegionFileEntry objects. A world can have a lot of
+        # region files and most of them are only needed when their results
+        # arrive. See _set, __getitem__() and _get_files_to_scan().
+        self._regions = {}
+        self._lazy = False
+        self._folder = self._get_dim_type_string()
+        for entry in entries:
             try:
-                r = ScannedRegionFile(path, folder=self._get_dim_type_string())
-                self._set[r.get_coords()] = r
+                self._regions[get_region_coords(split(entry.path)[1])] = entry
+                self._lazy = True
 
             except InvalidFileName:
                 try :
                     region_type = c.REGION_TYPES_NAMES[self._get_region_type_directory()][0]
                 except:
                     region_type = "region (?)"
-                print("Warning: The file {0} is not a valid name for a {1} file. I'll skip it.".format(path, region_type))
+                print("Warning: The file {0} is not a valid name for a {1} file. I'll skip it.".format(entry.path, region_type))
 
         # region and chunk counters with all the data from the scan
         self._region_counters = {}
         for status in c.REGION_STATUSES:
             self._region_counters[status] = 0
 
-        self._chunk_counters = {}
-        for status in c.CHUNK_STATUSES:
-            self._chunk_counters[status] = 0
+        # results of the chunks of the scanned region files, see ChunkGrid
+        self._grid = ChunkGrid()
 
         # has this regionset been scanned?
         self.scanned = False
 
+    @property
+    def _set(self):
+        """ Dictionary with all the ScannedRegionFiles of the set, the keys are
+        the region coordinates. """
+
+        if self._lazy:
+            for coords, r in self._regions.items():
+                if isinstance(r, RegionFileEntry):
+                    self._regions[coords] = self._create_scanned_file(r)
+            self._lazy = False
+        return self._regions
+
+    @_set.setter
+    def _set(self, value):
+        self._regions = value
+        self._lazy = False
+
+    def _create_scanned_file(self, entry):
+        """ Returns a new ScannedRegionFile for a RegionFileEntry. """
+        r = ScannedRegionFile(entry.path, folder=self._folder)
+        r.file_size = entry.size
+        return r
+
+    def __getitem__(self, key):
+        r = self._regions[key]
+        if isinstance(r, RegionFileEntry):
+            r = self._regions[key] = self._create_scanned_file(r)
+        return r
+
+    def __len__(self):
+        return len(self._regions)
+
+    def _get_files_to_scan(self):
+        """ Returns a list with the ScannedRegionFiles to send to the scan.
+
+        The files without a ScannedRegionFile yet get a new one that is not
+        stored in the set, the result of the scan will be stored when it arrives.
+        """
+
+        return [self._create_scanned_file(r) if isinstance(r, RegionFileEntry) else r
+                for r in self._regions.values()]
+
     def get_name(self):
         """ Return a string with a representative name for the regionset
 
@@ -754,12 +1484,10 @@ class RegionSet(DataSet):
         assert isinstance(scanned_regionfile, ScannedRegionFile)
 
         self._region_counters[scanned_regionfile.status] += 1
-
-        for status in c.CHUNK_STATUSES:
-            self._chunk_counters[status] += scanned_regionfile.count_chunks(status)
+        self._grid.add(scanned_regionfile)
 
     def _replace_in_data_structure(self, data):
-        self._set[data.get_coords()] = data
+        self._regions[data.get_coords()] = data
 
     def __str__(self):
         text = "RegionSet: {0}\n".format(self.get_name())
@@ -844,14 +1572,97 @@ class RegionSet(DataSet):
 
         """
 
-        counter = 0
-        if status is None:
-            for s in c.CHUNK_STATUSES:
-                counter += self._chunk_counters[s]
-        else:
-            counter = self._chunk_counters[status]
+        return self._grid.count_chunks(status)
 
-        return counter
+    def get_sample_counts(self):
+        """ Returns the counts of chunks of a sampled scan.
+
+        Return:
+         - counts -- List [population, sampled, sampled_problems, exact, exact_problems]
+                     where population is the number of chunks with a sane header,
+                     sampled and sampled_problems are the chunks of them scanned and
+                     the ones with problems, and exact and exact_problems the chunks
+                     with a suspicious header, all of them scanned.
+
+        Only region files scanned with a sample are counted.
+
+        """
+
+        counts = [0, 0, 0, 0, 0]
+        for r in self._set.values():
+            if r.sample is None:
+                continue
+            population, sampled, sampled_problems = r.sample
+            problems = sum(r.count_chunks(s) for s in c.CHUNK_PROBLEMS)
+            counts[0] += population
+            counts[1] += sampled
+            counts[2] += sampled_problems
+            counts[3] += r.count_chunks() - sampled
+            counts[4] += problems - sampled_problems
+        return counts
+
+    def generate_sample_report(self):
+        """ Returns a human readable string with the estimate of a sampled scan. """
+        return generate_sample_report(self.get_sample_counts())
+
+    def get_entity_census(self):
+        """ Returns the entity census of all the scanned region files.
+
+        Return:
+         - census -- EntityCensus object with the census of all the region files,
+                     None if the scan didn't make a census. See ScanPool.
+
+        """
+
+        census = None
+        for r in self._grid._regions.values():
+            if r.census is not None:
+                if census is None:
+                    census = EntityCensus()
+                census.merge(r.census)
+        return census
+
+    def get_size_stats(self):
+        """ Returns the statistics of the chunk sizes of all the scanned region files.
+
+        Return:
+         - stats -- ChunkSizeStats object, see sizes.py
+
+        """
+
+        stats = ChunkSizeStats()
+        for r in self._grid._regions.values():
+            stats.merge(r.get_size_stats())
+        return stats
+
+    def get_sector_usage(self):
+        """ Returns the sector usage of all the scanned region files.
+
+        Return:
+         - usage -- SectorUsage object, see sizes.py
+
+        """
+
+        usage = SectorUsage()
+        for r in self._grid._regions.values():
+            if r.usage is not None:
+                usage.merge(r.usage)
+        return usage
+
+    def keep_shard(self, index, count):
+        """ Removes from the set all the region files not in the given shard.
+
+        Inputs:
+         - index -- Integer, the shard to keep, from 0 to count - 1
+         - count -- Integer, the number of shards
+
+        See get_region_shard(). Call it before scanning.
+
+        """
+
+        for coords in list(self._regions.keys()):
+            if get_region_shard(coords, count) != index:
+                del self._regions[coords]
 
     def list_chunks(self, status=None):
         """ Returns a list of all the chunk tuples with 'status'.
@@ -864,14 +1675,72 @@ class RegionSet(DataSet):
                  tuple is (number_of_entities, status). For more details see
                  ScannedRegionFile.list_chunks()
         
-        If status = None it returns all the chunk tuples.
+        If status = None it returns all the chunk tuples. The chunks are sorted
+        by region file.
         
         """
 
-        l = []
-        for r in list(self.keys()):
-            l.extend(self[r].list_chunks(status))
-        return l
+        return self._grid.list_chunks(status)
+
+    def count_chunks_in_rectangle(self, x1, z1, x2, z2, status=None):
+        """ Returns the number of chunks with the given status in a rectangle.
+
+        Inputs:
+         - x1, z1, x2, z2 -- Integers with the global chunk coordinates of two
+                             opposite corners of the rectangle, both included.
+         - status -- The chunk status to count. See c.CHUNK_STATUSES
+
+        If status is None counts all the chunks.
+
+        """
+
+        return self._grid.count_chunks_in_rectangle(x1, z1, x2, z2, status)
+
+    def list_chunks_in_rectangle(self, x1, z1, x2, z2, status=None):
+        """ Returns a list of the chunk tuples with the given status in a rectangle.
+
+        Inputs:
+         - x1, z1, x2, z2 -- Integers with the global chunk coordinates of two
+                             opposite corners of the rectangle, both included.
+         - status -- The chunk status to list. See c.CHUNK_STATUSES
+
+        Return:
+         - l -- List with tuples like (global_coordinates, status_tuple), see
+                list_chunks()
+
+        """
+
+        return self._grid.list_chunks_in_rectangle(x1, z1, x2, z2, status)
+
+    def count_chunks_in_radius(self, x, z, radius, status=None):
+        """ Returns the number of chunks with the given status in a circle.
+
+        Inputs:
+         - x, z -- Integers with the global chunk coordinates of the center
+         - radius -- Integer with the radius in chunks
+         - status -- The chunk status to count. See c.CHUNK_STATUSES
+
+        See ChunkGrid.count_chunks_in_radius().
+
+        """
+
+        return self._grid.count_chunks_in_radius(x, z, radius, status)
+
+    def list_chunks_in_radius(self, x, z, radius, status=None):
+        """ Returns a list of the chunk tuples with the given status in a circle.
+
+        Inputs:
+         - x, z -- Integers with the global chunk coordinates of the center
+         - radius -- Integer with the radius in chunks
+         - status -- The chunk status to list. See c.CHUNK_STATUSES
+
+        Return:
+         - l -- List with tuples like (global_coordinates, status_tuple), see
+                list_chunks()
+
+        """
+
+        return self._grid.list_chunks_in_radius(x, z, radius, status)
 
     def summary(self):
         """ Returns a string with a summary of the problematic chunks.
@@ -885,12 +1754,13 @@ class RegionSet(DataSet):
         """
 
         text = ""
-        for r in list(self.keys()):
-            if not self[r].has_problems:
+        for r in self._regions.values():
+            # The region files without a ScannedRegionFile haven't been scanned
+            if isinstance(r, RegionFileEntry) or not r.has_problems:
                 continue
-            text += "Region file: {0}\n".format(join(self._get_dim_type_string(),self[r].filename))
+            text += "Region file: {0}\n".format(join(self._get_dim_type_string(), r.filename))
 
-            text += self[r].summary()
+            text += r.summary()
             text += " +\n\n"
         return text
 
@@ -973,6 +1843,28 @@ class RegionSet(DataSet):
 
         return counter
 
+    def trim_problematic_chunks(self, status):
+        """ Empties the lists of all the chunks with the given problem.
+
+        Inputs:
+         - status -- Integer with the chunk status to trim. See TRIMMABLE_CHUNK_PROBLEMS
+                     in constants.py
+
+        Return:
+         - counter -- Integer with the number of items removed from the lists.
+        """
+
+        counter = 0
+        if self.count_chunks(status):
+            dim_name = self.get_name()
+            print('Trimming chunks in regionset \"{0}\":'.format(dim_name if dim_name else "selected region files"))
+            for r in self._grid._regions.values():
+                counter += r.trim_problematic_chunks(status)
+            self._grid.recount()
+            print("    Removed {0} items in this regionset.\n".format(counter))
+
+        return counter
+
     def remove_entities(self):
         """ Removes entities in chunks with the status TOO_MANY_ENTITIES. 
 
@@ -985,14 +1877,29 @@ class RegionSet(DataSet):
             counter += self._set[r].remove_entities()
         return counter
 
+    def set_entity_limit(self, entity_limit):
+        """ Updates the c.CHUNK_TOO_MANY_ENTITIES status of all the chunks in the RegionSet.
+
+        Inputs:
+         - entity_limit -- Integer with the new entity limit
+
+        Return:
+         - changed -- Integer with the number of chunks that changed status.
+
+        Only the scanned region files are updated, using the number of entities
+        stored by the scan. See ScannedRegionFile.set_entity_limit().
+
+        """
+
+        return self._grid.set_entity_limit(entity_limit)
+
     def rescan_entities(self, options):
         """ Updates the c.CHUNK_TOO_MANY_ENTITIES status of all the chunks in the RegionSet.
         
         This should be ran when the option entity limit is changed.
         """
 
-        for r in list(self.keys()):
-            self[r].rescan_entities(options)
+        self.set_entity_limit(options.entity_limit)
 
     def generate_report(self, standalone):
         """ Generates a report with the results of the scan.
@@ -1102,37 +2009,21 @@ class World:
         # list with RegionSets
         self.regionsets = []
 
-        self.regionsets.append(RegionSet(join(self.path, "region")))
-        for directory in glob(join(self.path, "DIM*/region")):
-            self.regionsets.append(RegionSet(directory, overworld=False))
-
-        self.regionsets.append(RegionSet(join(self.path, "poi")))
-        for directory in glob(join(self.path, "DIM*/poi")):
-            self.regionsets.append(RegionSet(directory, overworld=False))
-
-        self.regionsets.append(RegionSet(join(self.path, "entities")))
-        for directory in glob(join(self.path, "DIM*/entities")):
-            self.regionsets.append(RegionSet(directory, overworld=False))
-
-        # level.dat
-        # Let's scan level.dat here so we can extract the world name
-        level_dat_path = join(self.path, "level.dat")
-        if exists(level_dat_path):
-            try:
-                self.level_data = nbt.NBTFile(level_dat_path)["Data"]
-                self.name = self.level_data["LevelName"].value
-                self.scanned_level = ScannedDataFile(level_dat_path)
-                self.scanned_level.status = c.DATAFILE_OK
-            except Exception:
-                self.name = None
-                self.scanned_level = ScannedDataFile(level_dat_path)
-                self.scanned_level.status = c.DATAFILE_UNREADABLE
-        else:
-            self.level_file = None
-            self.level_data = None
-            self.name = None
-            self.scanned_level = ScannedDataFile(level_dat_path)
-            self.scanned_level.status = c.DATAFILE_UNREADABLE
+        # The same directories as glob("DIM*/region"), but reading the world
+        # directory only once
+        dim_directories = [entry.path for entry in _scandir(self.path)
+                           if entry.name.startswith("DIM")]
+        for region_type in ("region", "poi", "entities"):
+            self.regionsets.append(RegionSet(join(self.path, region_type)))
+            for dim_directory in dim_directories:
+                directory = join(dim_directory, region_type)
+                if exists(directory):
+                    self.regionsets.append(RegionSet(directory, overworld=False))
+
+        # level.dat is read the first time the name of the world or its
+        # status are needed, see _read_level_dat()
+        self._level_dat_path = join(self.path, "level.dat")
+        self._level = None
 
         # Player files
         self.datafilesets = []
@@ -1164,6 +2055,50 @@ class World:
         # Set in scan.py, used in interactive.py
         self.scanned = False
 
+    def _read_level_dat(self):
+        """ Reads the level.dat of the world, only the first time it's called.
+
+        Return:
+         - level -- Tuple (level_data, name, scanned_level). The level_data is the
+                    'Data' tag of level.dat, and scanned_level a ScannedDataFile
+                    with its status. The first two are None if it can't be read.
+
+        Parsing level.dat is not needed to find the files of the world, and most of
+        the times the world is only scanned. Doing it here keeps the creation of a
+        World cheap.
+
+        """
+
+        if self._level is None:
+            level_data = None
+            name = None
+            scanned_level = ScannedDataFile(self._level_dat_path)
+            scanned_level.status = c.DATAFILE_UNREADABLE
+            if exists(self._level_dat_path):
+                try:
+                    level_data = nbt.NBTFile(self._level_dat_path)["Data"]
+                    name = level_data["LevelName"].value
+                    scanned_level.status = c.DATAFILE_OK
+                except Exception:
+                    name = None
+            self._level = (level_data, name, scanned_level)
+        return self._level
+
+    @property
+    def level_data(self):
+        """ The 'Data' tag of level.dat, None if it can't be read. """
+        return self._read_level_dat()[0]
+
+    @property
+    def name(self):
+        """ Name of the world stored in level.dat, None if it can't be read. """
+        return self._read_level_dat()[1]
+
+    @property
+    def scanned_level(self):
+        """ ScannedDataFile with the status of level.dat. """
+        return self._read_level_dat()[2]
+
     def __str__(self):
         counters = self.get_number_regions()
         text = "World information:\n"
@@ -1320,6 +2255,83 @@ class World:
             counter += count
         return counter
 
+    def get_sample_counts(self):
+        """ Returns the counts of chunks of a sampled scan of all the region sets.
+
+        See RegionSet.get_sample_counts().
+        """
+
+        counts = [0, 0, 0, 0, 0]
+        for rs in self.regionsets:
+            counts = [a + b for a, b in zip(counts, rs.get_sample_counts())]
+        return counts
+
+    def generate_sample_report(self):
+        """ Returns a human readable string with the estimate of a sampled scan. """
+        return generate_sample_report(self.get_sample_counts())
+
+    def get_entity_census(self):
+        """ Returns the entity census of all the region sets of the world.
+
+        Return:
+         - census -- EntityCensus object, None if the scan didn't make a census.
+                     See RegionSet.get_entity_census().
+
+        """
+
+        census = None
+        for rs in self.regionsets:
+            rs_census = rs.get_entity_census()
+            if rs_census is not None:
+                if census is None:
+                    census = EntityCensus()
+                census.merge(rs_census)
+        return census
+
+    def get_size_stats(self):
+        """ Returns the statistics of the chunk sizes of all the region sets of the world.
+
+        Return:
+         - stats -- ChunkSizeStats object, see RegionSet.get_size_stats().
+
+        """
+
+        stats = ChunkSizeStats()
+        for rs in self.regionsets:
+            stats.merge(rs.get_size_stats())
+        return stats
+
+    def get_sector_usage(self):
+        """ Returns the sector usage of all the region sets of the world.
+
+        Return:
+         - usage -- SectorUsage object, see RegionSet.get_sector_usage().
+
+        """
+
+        usage = SectorUsage()
+        for rs in self.regionsets:
+            usage.merge(rs.get_sector_usage())
+        return usage
+
+    def keep_shard(self, index, count):
+        """ Removes from the world all the region files not in the given shard.
+
+        Inputs:
+         - index -- Integer, the shard to keep, from 0 to count - 1
+         - count -- Integer, the number of shards
+
+        The player and data files are small, they are only kept in the
+        first shard. See RegionSet.keep_shard().
+
+        """
+
+        for rs in self.regionsets:
+            rs.keep_shard(index, count)
+        if index != 0:
+            for ds in self.datafilesets:
+                ds._set.clear()
+
     def replace_problematic_chunks(self, backup_worlds, status, entity_limit, delete_entities):
         """ Replaces problematic chunks using backups.
         
@@ -1453,6 +2465,23 @@ class World:
             counter += regionset.fix_problematic_chunks(status)
         return counter
 
+    def trim_problematic_chunks(self, status):
+        """ Empties the lists of all the chunks with the given status.
+
+        Inputs:
+         - status -- Integer with the chunk status to trim. See TRIMMABLE_CHUNK_PROBLEMS
+                     in constants.py
+
+        Return:
+         - counter -- Integer with the number of items removed from the lists.
+
+        """
+
+        counter = 0
+        for regionset in self.regionsets:
+            counter += regionset.trim_problematic_chunks(status)
+        return counter
+
     def replace_problematic_regions(self, backup_worlds, status, entity_limit, delete_entities):
         """ Replaces problematic region files using backups.
         
@@ -1553,6 +2582,24 @@ class World:
             counter += regionset.remove_entities()
         return counter
 
+    def set_entity_limit(self, entity_limit):
+        """ Updates the CHUNK_TOO_MANY_ENTITIES status of all the chunks in the world.
+
+        Inputs:
+         - entity_limit -- Integer with the new entity limit
+
+        Return:
+         - changed -- Integer with the number of chunks that changed status.
+
+        See RegionSet.set_entity_limit().
+
+        """
+
+        changed = 0
+        for regionset in self.regionsets:
+            changed += regionset.set_entity_limit(entity_limit)
+        return changed
+
     def rescan_entities(self, options):
         """ Updates the CHUNK_TOO_MANY_ENTITIES status of all the chunks in the RegionSet.
         
@@ -1560,8 +2607,7 @@ class World:
 
         """
 
-        for regionset in self.regionsets:
-            regionset.rescan_entities(options)
+        self.set_entity_limit(options.entity_limit)
 
     def generate_report(self, standalone): 
         """ Generates a report with the results of the scan.
@@ -1657,6 +2703,80 @@ class World:
 
 
 
+def get_region_shard(coords, count):
+    """ Returns the shard a region file belongs to.
+
+    Inputs:
+     - coords -- Tuple with the region file coordinates
+     - count -- Integer, the number of shards
+
+    Return:
+     - index -- Integer from 0 to count - 1
+
+    It only depends on the coordinates, so different machines scanning the same
+    world with different shards never scan the same region file. The region files
+    with the same coordinates in all the dimensions and folders go to the same
+    shard. A CRC is used instead of the coordinates alone so the shards get the
+    same amount of region files no matter the shape of the world.
+
+    """
+
+    return zlib.crc32("{0}.{1}".format(*coords).encode()) % count
+
+
+def estimate_problem_rate(counts, z=1.96):
+    """ Estimates the proportion of chunks with problems from a sampled scan.
+
+    Inputs:
+     - counts -- List as returned by RegionSet.get_sample_counts()
+     - z -- Float, quantile of the normal distribution for the confidence wanted,
+            defaults to 1.96 (95% confidence)
+
+    Return:
+     - estimate, low, high -- Floats with the estimated proportion of chunks
+                              with problems and its confidence interval, or None
+                              if nothing has been sampled.
+
+    The chunks with a suspicious header are all scanned, so their problems are
+    known exactly. The rate of problems in the rest is estimated from the random
+    sample with a Wilson interval, narrowed with the finite population
+    correction. The sample is the same fraction of every region file, so all
+    of them weigh the same in the estimate.
+
+    """
+
+    population, sampled, sampled_problems, exact, exact_problems = counts
+    total = population + exact
+    if not total:
+        return None
+    rate = sampled_problems / sampled if sampled else 0.0
+    low, high = wilson_interval(sampled_problems, sampled, z)
+    # Finite population correction, a sample of all the chunks is exact
+    if population > 1:
+        fpc = sqrt((population - sampled) / (population - 1))
+        low, high = rate - (rate - low) * fpc, rate + (high - rate) * fpc
+    return tuple((exact_problems + r * population) / total for r in (rate, low, high))
+
+
+def generate_sample_report(counts):
+    """ Returns a human readable string with the estimate of a sampled scan.
+
+    Inputs:
+     - counts -- List as returned by RegionSet.get_sample_counts()
+
+    """
+
+    estimate = estimate_problem_rate(counts)
+    if estimate is None:
+        return "\nSampled scan: No chunks sampled."
+    population, sampled, _, exact, _ = counts
+    text = "\nSampled scan: {0} of {1} chunks with a sane header scanned, " \
+           "plus {2} with a suspicious header.\n".format(sampled, population, exact)
+    text += "Estimated chunks with problems: {0:.2%} (95% confidence interval: " \
+            "{1:.2%} - {2:.2%})".format(*estimate)
+    return text
+
+
 def parse_paths(args):
     """ Parse a list of paths to and returns World and a RegionSet objects.
     
@@ -1671,6 +2791,9 @@ def parse_paths(args):
     # windows shell doesn't parse wildcards, parse them here using glob
     expanded_args = []
     for arg in args:
+        if not any(w in arg for w in "*?["):
+            expanded_args.append(arg)
+            continue
         earg = glob(arg)
         # glob eats away any argument that doesn't match a file, keep those, they will be world folders
         if earg: expanded_args.extend(earg)
@@ -1784,6 +2907,70 @@ def delete_entities(region_file, x, z):
     return counter
 
 
+def _get_chunk_lists(chunk, tags):
+    """ Returns a list of tuples (compound, name) with the lists of a level chunk.
+
+    Inputs:
+     - chunk -- A level chunk, from the NBT module
+     - tags -- Tuple with the names of the lists in old and new chunks, see
+               CHUNK_PROBLEMS_TAGS in constants.py
+
+    Only the lists found in the chunk are returned.
+
+    """
+
+    if "DataVersion" in chunk and chunk["DataVersion"].value >= 2844: # Snapshot 21w43a (1.18)
+        compound, names = chunk, tags[1]
+    else:
+        compound, names = chunk['Level'], tags[0]
+    return [(compound, name) for name in names if name in compound]
+
+
+def count_chunk_lists(chunk, tags):
+    """ Returns the number of items in some lists of a level chunk.
+
+    Inputs:
+     - chunk -- A level chunk, from the NBT module
+     - tags -- Tuple with the names of the lists in old and new chunks, see
+               CHUNK_PROBLEMS_TAGS in constants.py
+
+    The lengths of the lists are the ones read with the chunk, the items
+    are not looked at.
+
+    """
+
+    return sum(len(compound[name]) for compound, name in _get_chunk_lists(chunk, tags))
+
+
+def trim_chunk_lists(region_file, x, z, tags):
+    """ Empties some lists of a chunk, like the block entities or the scheduled ticks.
+
+    Inputs:
+     - region_file -- RegionFile object where the chunk is stored
+     - x -- Integer, X local coordinate of the chunk in the region file
+     - z -- Integer, Z local coordinate of the chunk in the region file
+     - tags -- Tuple with the names of the lists in old and new chunks, see
+               CHUNK_PROBLEMS_TAGS in constants.py
+
+    Return:
+     - counter -- Integer with the number of removed items.
+
+    """
+
+    chunk = region_file.get_chunk(x, z)
+    if get_chunk_type(chunk) != c.LEVEL_DIR:
+        raise AssertionError("Unsupported chunk type in trim_chunk_lists().")
+
+    counter = 0
+    for compound, name in _get_chunk_lists(chunk, tags):
+        counter += len(compound[name])
+        compound[name] = TAG_List(name=name, type=nbt._TAG_End)
+
+    region_file.write_chunk(x, z, chunk)
+
+    return counter
+
+
 def _get_local_chunk_coords(chunkx, chunkz):
     """ Gives the chunk local coordinates from the global coordinates.
     
@@ -1895,24 +3082,6 @@ def get_chunk_data_coords(nbt_file):
     return coordX, coordZ
 
 
-def get_region_coords(filename):
-    """ Get and return a region file coordinates from path.
-    
-    Inputs:
-     - filename -- Filename or path of the region file.
-     
-    Return:
-     - coordX, coordZ -- X and z coordinates of the region file.
-
-    """
-
-    l = filename.split('.')
-    coordX = int(l[1])
-    coordZ = int(l[2])
-
-    return coordX, coordZ
-
-
 def get_global_chunk_coords(region_name, chunkX, chunkZ):
     """ Get and return a region file coordinates from path.
     